@@ -1,16 +1,70 @@
 # =================================================================
-# api/__init__.py - Registro de blueprints
+# api/__init__.py - Registro de blueprints, límites de subida y unidad de trabajo por petición
 # =================================================================
 
-from flask import Flask
+import sqlite3
+from typing import Dict, Optional
+from flask import Flask, Request, current_app, g, has_request_context, jsonify
+from models.database import DatabaseManager
 from api.personas import personas_bp
 from api.relaciones import relaciones_bp
 from api.grafo import grafo_bp
 from api.main import main_bp
+from api.analytics import analytics_bp
+from api.jobs import jobs_bp
+from api.importacion import importacion_bp
+from api.avatares import avatares_bp
 
 def register_blueprints(app: Flask) -> None:
     """Registrar todos los blueprints"""
     app.register_blueprint(main_bp)
+    app.register_blueprint(avatares_bp)
     app.register_blueprint(grafo_bp, url_prefix='/api')
     app.register_blueprint(personas_bp, url_prefix='/api')
-    app.register_blueprint(relaciones_bp, url_prefix='/api')
\ No newline at end of file
+    app.register_blueprint(relaciones_bp, url_prefix='/api')
+    app.register_blueprint(analytics_bp, url_prefix='/api')
+    app.register_blueprint(jobs_bp, url_prefix='/api')
+    app.register_blueprint(importacion_bp, url_prefix='/api')
+
+class UploadLimitRequest(Request):
+    """Petición con límite de cuerpo por endpoint
+
+    Werkzeug lo aplica al leer el cuerpo, antes de parsear el multipart y
+    también sin Content-Length (transferencia por trozos): lo que pasa del
+    límite corta la lectura con un 413.
+    """
+
+    @property
+    def max_content_length(self) -> Optional[int]:
+        limites = current_app.extensions.get('upload_limits', {})
+        if self.endpoint in limites:
+            return limites[self.endpoint]
+        return current_app.config['MAX_CONTENT_LENGTH']
+
+def init_upload_limits(app: Flask, limites: Dict[str, int]) -> None:
+    """Limitar el cuerpo de las peticiones de los endpoints indicados, en bytes"""
+    app.request_class = UploadLimitRequest
+    app.extensions['upload_limits'] = dict(limites)
+
+def init_unit_of_work(app: Flask, db_manager: DatabaseManager) -> None:
+    """Una unidad de trabajo por petición: se confirma si la respuesta no es un error"""
+    db_manager.unit_scope = lambda: g if has_request_context() else None
+    
+    @app.after_request
+    def finish_request_unit(response):
+        # Antes de enviar el cuerpo: las respuestas en streaming leen con su propia conexión
+        try:
+            unit = db_manager.finish_unit(commit=response.status_code < 400)
+        except sqlite3.Error as e:
+            print(f"❌ Error confirmando la petición: {e}")
+            response = jsonify({'error': f'Error interno: {str(e)}'})
+            response.status_code = 500
+            return response
+        if unit is not None:
+            response.headers['X-DB-Statements'] = str(unit.statements)
+        return response
+    
+    @app.teardown_request
+    def discard_request_unit(exc):
+        # Si la petición terminó con una excepción sin respuesta, lo pendiente se deshace
+        db_manager.finish_unit(commit=False)
@@ -0,0 +1,91 @@
+# =================================================================
+# api/analytics.py - API de analítica del grafo
+# =================================================================
+
+from flask import Blueprint, jsonify, request, current_app
+from services.analytics_service import get_analytics_service, METRICAS
+from services.community_service import get_community_service
+from services.graph_engine import get_graph_engine
+from services.graph_cache import notify_graph_change
+from services.jobs import get_job_manager, COMPLETADO
+
+analytics_bp = Blueprint('analytics', __name__)
+
+@analytics_bp.route('/analytics/centrality')
+def centralidad():
+    """Métricas de centralidad por persona (grado ponderado, PageRank, betweenness, clustering)"""
+    metricas = [m.strip() for m in request.args.get('metrics', ','.join(METRICAS)).split(',') if m.strip()]
+    invalidas = [m for m in metricas if m not in METRICAS]
+    if invalidas or not metricas:
+        return jsonify({'error': f'Métricas válidas: {", ".join(METRICAS)}'}), 400
+    
+    orden = request.args.get('sort', metricas[0])
+    if orden not in metricas:
+        return jsonify({'error': 'sort debe ser una de las métricas pedidas'}), 400
+    top = request.args.get('top', type=int)
+    if top is not None and top < 1:
+        return jsonify({'error': 'top debe ser un entero positivo'}), 400
+    
+    try:
+        resultado = get_analytics_service(current_app).get_metrics(metricas)
+        valores = resultado['metricas']
+        
+        nodos = [
+            {'id': int(persona_id), **{m: round(float(valores[m][i]), 6) for m in metricas}}
+            for i, persona_id in enumerate(resultado['node_ids'])
+        ]
+        nodos.sort(key=lambda nodo: nodo[orden], reverse=True)
+        if top is not None:
+            nodos = nodos[:top]
+        
+        return jsonify({
+            'version': resultado['version'],
+            'metrics': metricas,
+            'sort': orden,
+            'nodes': nodos
+        })
+        
+    except Exception as e:
+        print(f"❌ Error calculando centralidad: {e}")
+        return jsonify({'error': str(e)}), 500
+
+@analytics_bp.route('/analytics/communities', methods=['POST'])
+def detectar_comunidades():
+    """Lanzar la detección de comunidades en segundo plano"""
+    job = get_job_manager(current_app).submit('comunidades', get_community_service(current_app).detect)
+    respuesta = jsonify({'success': True, 'job': job.to_dict(include_result=False)})
+    respuesta.headers['Location'] = f'/api/jobs/{job.id}'
+    return respuesta, 202
+
+@analytics_bp.route('/analytics/communities/<job_id>/apply', methods=['POST'])
+def aplicar_comunidades(job_id):
+    """Aplicar como grupos una propuesta de comunidades ya calculada"""
+    job = get_job_manager(current_app).get(job_id)
+    if not job or job.tipo != 'comunidades':
+        return jsonify({'error': 'Trabajo no encontrado'}), 404
+    if job.estado != COMPLETADO:
+        return jsonify({'error': f'El trabajo está en estado {job.estado}'}), 409
+    
+    # Una propuesta calculada sobre otra versión del grafo puede estar desfasada
+    version_actual = get_graph_engine(current_app).snapshot().version
+    forzar = request.args.get('force', 'false').lower() == 'true'
+    if job.resultado['version'] != version_actual and not forzar:
+        return jsonify({
+            'error': 'El grafo ha cambiado desde la propuesta; recalcula o usa force=true',
+            'version': version_actual
+        }), 409
+    
+    try:
+        actualizados = get_community_service(current_app).apply(job.resultado)
+        if actualizados:
+            notify_graph_change(current_app)
+        
+        return jsonify({
+            'success': True,
+            'message': f'{actualizados} grupos actualizados exitosamente',
+            'actualizados': actualizados,
+            'modularity': job.resultado['modularity']
+        })
+    except Exception as e:
+        print(f"❌ Error aplicando comunidades: {e}")
+        return jsonify({'error': str(e)}), 500
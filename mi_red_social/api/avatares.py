@@ -0,0 +1,31 @@
+# =================================================================
+# api/avatares.py - Servir imágenes direccionadas por contenido
+# =================================================================
+
+import re
+from flask import Blueprint, abort, current_app, send_file
+from services.image_service import ImageService, AVATARS_URL
+
+avatares_bp = Blueprint('avatares', __name__)
+
+# <hash>.<ext> o <hash>_<tamaño>.webp: el nombre identifica el contenido
+NOMBRE_AVATAR = re.compile(r'^(?P<hash>[0-9a-f]{32})(?P<size>_\d+)?\.(?P<ext>[a-z]+)$')
+
+# Un año: el contenido de una URL no cambia nunca
+MAX_AGE_INMUTABLE = 365 * 24 * 3600
+
+@avatares_bp.route(f'/{AVATARS_URL}<nombre>')
+def servir_avatar(nombre):
+    """Servir un avatar con caché inmutable y ETag fuerte (el propio hash)"""
+    coincidencia = NOMBRE_AVATAR.match(nombre)
+    if not coincidencia:
+        abort(404)
+
+    ruta = ImageService(current_app.config).file_path(f'{AVATARS_URL}{nombre}')
+    if not ruta.is_file():
+        abort(404)
+
+    response = send_file(ruta, etag=nombre.rsplit('.', 1)[0], max_age=MAX_AGE_INMUTABLE)
+    response.cache_control.public = True
+    response.cache_control.immutable = True
+    return response
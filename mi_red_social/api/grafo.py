@@ -2,39 +2,281 @@
 # api/grafo.py - API del grafo
 # =================================================================
 
-from flask import Blueprint, jsonify, request, current_app
-from models.database import DatabaseManager
+from flask import Blueprint, Response, jsonify, request, current_app, stream_with_context
+from models.database import get_db_manager
 from models.persona import PersonaRepository
 from models.relacion import RelacionRepository
 from services.graph_service import GraphService
+from services.image_service import ImageService
+from services.graph_cache import get_graph_cache, notify_graph_change
+from services.graph_events import get_graph_events
+from services.analytics_service import get_analytics_service, METRICAS
+from services.path_service import get_path_service, MODOS
+from services.layout_service import get_layout_service, MODOS as MODOS_LAYOUT
+from services.jobs import get_job_manager
+from services.sprite_service import get_sprite_service
+from services.export_service import ExportBusyError, get_export_service, FORMATOS as FORMATOS_EXPORT
 
 grafo_bp = Blueprint('grafo', __name__)
 
-def get_graph_service():
+def get_graph_service(avatar_size=None):
     """Factory para obtener el servicio de grafo"""
-    db_manager = DatabaseManager(current_app.config['DATABASE_PATH'])
+    db_manager = get_db_manager(current_app)
     persona_repo = PersonaRepository(db_manager)
     relacion_repo = RelacionRepository(db_manager)
-    return GraphService(persona_repo, relacion_repo)
+    return GraphService(persona_repo, relacion_repo, ImageService(current_app.config), avatar_size)
+
+def get_avatar_size():
+    """Tamaño derivado para ?avatar=<px> (lado en pantalla según el zoom); None sin parámetro"""
+    pixels = request.args.get('avatar', type=int)
+    if pixels is None:
+        return None
+    if pixels < 1:
+        raise ValueError('avatar debe ser un número de píxeles positivo')
+    return ImageService(current_app.config).pick_size(pixels)
 
 @grafo_bp.route('/grafo')
 def api_grafo():
     """API que devuelve los datos del grafo en formato JSON"""
     try:
-        graph_service = get_graph_service()
-        resultado = graph_service.get_graph_data()
+        # Avatares del tamaño que pinta el cliente con su zoom actual
+        try:
+            avatar_size = get_avatar_size()
+        except ValueError as e:
+            return jsonify({'error': str(e), 'nodes': [], 'edges': []}), 400
         
-        print(f"🔍 API devolviendo: {len(resultado['nodes'])} nodos, {len(resultado['edges'])} conexiones")
-        return jsonify(resultado)
+        # Modo viewport: solo lo que cae dentro del rectángulo visible
+        bbox = request.args.get('bbox', '').strip()
+        if bbox:
+            try:
+                x1, y1, x2, y2 = (float(v) for v in bbox.split(','))
+            except ValueError:
+                return jsonify({'error': 'bbox debe ser x1,y1,x2,y2', 'nodes': [], 'edges': []}), 400
+            return jsonify(get_graph_service(avatar_size).get_viewport_data(x1, y1, x2, y2))
+        
+        # Tamaño de nodo según una métrica de centralidad
+        size_by = request.args.get('size_by', '').strip()
+        if size_by and size_by not in METRICAS:
+            return jsonify({'error': f'size_by debe ser uno de: {", ".join(METRICAS)}', 'nodes': [], 'edges': []}), 400
+        
+        graph_cache = get_graph_cache(current_app)
+        forzar = request.args.get('cache', '').lower() == 'false'
+        
+        def construir_payload() -> bytes:
+            node_sizes = None
+            if size_by:
+                valores = get_analytics_service(current_app).get_node_values(size_by)
+                node_sizes = GraphService.scale_sizes(valores)
+            service = get_graph_service(avatar_size)
+            if current_app.config['GRAFO_JSON_SQL'] and 'json' in get_db_manager(current_app).features:
+                # Camino rápido: los bytes salen de SQLite tal cual, sin objetos intermedios
+                body = service.get_graph_json(node_sizes)
+                print(f"🔍 API devolviendo grafo generado en SQLite ({len(body)} bytes)")
+                return body
+            resultado = service.get_graph_data(node_sizes)
+            print(f"🔍 API devolviendo: {len(resultado['nodes'])} nodos, {len(resultado['edges'])} conexiones")
+            return current_app.json.dumps(resultado).encode('utf-8')
+        
+        variante = f"{size_by}|{avatar_size}" if avatar_size else size_by
+        payload = graph_cache.get_or_build(construir_payload, force=forzar, variant=variante)
+        
+        response = Response(payload.body, mimetype='application/json')
+        response.set_etag(payload.etag)
+        response.headers['Cache-Control'] = 'no-cache'
+        response.headers['X-Graph-Version'] = str(payload.version)
+        return response.make_conditional(request)
         
     except Exception as e:
         print(f"❌ Error en API: {e}")
         return jsonify({'error': str(e), 'nodes': [], 'edges': []}), 500
 
+@grafo_bp.route('/grafo/ego/<int:persona_id>')
+def api_grafo_ego(persona_id):
+    """Subgrafo con una persona y todos sus contactos a k saltos"""
+    max_depth = current_app.config['GRAFO_EGO_MAX_DEPTH']
+    depth = request.args.get('depth', 1, type=int)
+    min_fortaleza = request.args.get('min_fortaleza', 0, type=int)
+    
+    if depth < 1 or depth > max_depth:
+        return jsonify({'error': f'depth debe estar entre 1 y {max_depth}'}), 400
+    try:
+        avatar_size = get_avatar_size()
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    try:
+        resultado = get_graph_service(avatar_size).get_ego_network(
+            persona_id, depth, min_fortaleza, current_app.config['GRAFO_EGO_MAX_NODOS']
+        )
+        if resultado is None:
+            return jsonify({'error': 'Persona no encontrada'}), 404
+        return jsonify(resultado)
+        
+    except Exception as e:
+        print(f"❌ Error en ego-network: {e}")
+        return jsonify({'error': str(e)}), 500
+
+@grafo_bp.route('/grafo/path')
+def api_grafo_path():
+    """Camino entre dos personas (por saltos o por fortaleza) y subgrafo a resaltar"""
+    origen = request.args.get('from', type=int)
+    destino = request.args.get('to', type=int)
+    modo = request.args.get('mode', 'hops')
+    
+    if origen is None or destino is None:
+        return jsonify({'error': 'Parámetros from y to requeridos'}), 400
+    if modo not in MODOS:
+        return jsonify({'error': f'mode debe ser uno de: {", ".join(MODOS)}'}), 400
+    
+    try:
+        resultado = get_path_service(current_app).find_path(origen, destino, modo)
+        if resultado is None:
+            return jsonify({'error': 'Persona no encontrada'}), 404
+        
+        resultado.update(get_graph_service().get_subgraph(resultado['path'], resultado['edge_ids']))
+        return jsonify(resultado)
+        
+    except Exception as e:
+        print(f"❌ Error buscando camino: {e}")
+        return jsonify({'error': str(e)}), 500
+
+@grafo_bp.route('/grafo/layout', methods=['POST'])
+def api_grafo_layout():
+    """Calcular en segundo plano el layout del grafo y guardar las posiciones"""
+    modo = request.args.get('mode', 'incremental')
+    if modo not in MODOS_LAYOUT:
+        return jsonify({'error': f'mode debe ser uno de: {", ".join(MODOS_LAYOUT)}'}), 400
+    
+    app = current_app._get_current_object()
+    layout = get_layout_service(app)
+    
+    def calcular_y_guardar():
+        resultado = layout.compute(modo)
+        resultado['guardados'] = layout.apply(resultado)
+        if resultado['guardados']:
+            notify_graph_change(app)
+        # Las posiciones ya están en la base de datos; el trabajo solo informa del resumen
+        resultado.pop('posiciones')
+        return resultado
+    
+    job = get_job_manager(app).submit('layout', calcular_y_guardar)
+    respuesta = jsonify({'success': True, 'job': job.to_dict(include_result=False)})
+    respuesta.headers['Location'] = f'/api/jobs/{job.id}'
+    return respuesta, 202
+
+@grafo_bp.route('/grafo/sprites')
+def api_grafo_sprites():
+    """Atlas de avatares: hojas con todas las imágenes y posición de cada persona"""
+    sprites = get_sprite_service(current_app)
+    size = request.args.get('size', sprites.sizes[-1], type=int)
+    if size not in sprites.sizes:
+        return jsonify({'error': f'size debe ser uno de: {", ".join(map(str, sprites.sizes))}'}), 400
+    
+    try:
+        graph_cache = get_graph_cache(current_app)
+        
+        def construir_mapa() -> bytes:
+            mapa = sprites.refresh(size)
+            return current_app.json.dumps(mapa).encode('utf-8')
+        
+        # Solo se recalcula cuando cambia la versión del grafo
+        payload = graph_cache.get_or_build(construir_mapa, variant=f'sprites|{size}')
+        
+        response = Response(payload.body, mimetype='application/json')
+        response.set_etag(payload.etag)
+        response.headers['Cache-Control'] = 'no-cache'
+        response.headers['X-Graph-Version'] = str(payload.version)
+        return response.make_conditional(request)
+        
+    except Exception as e:
+        print(f"❌ Error generando el atlas: {e}")
+        return jsonify({'error': str(e)}), 500
+
+@grafo_bp.route('/grafo/sprites/<int:size>/<int:hoja>.webp')
+def api_grafo_sprite_sheet(size, hoja):
+    """Imagen de una hoja del atlas (inmutable si se pide con su versión ?v=)"""
+    resultado = get_sprite_service(current_app).get_sheet(size, hoja)
+    if resultado is None:
+        return jsonify({'error': 'Hoja no encontrada'}), 404
+    
+    body, etag = resultado
+    response = Response(body, mimetype='image/webp')
+    response.set_etag(etag)
+    if request.args.get('v') == etag:
+        response.headers['Cache-Control'] = 'public, max-age=31536000, immutable'
+    else:
+        response.headers['Cache-Control'] = 'no-cache'
+    return response.make_conditional(request)
+
+@grafo_bp.route('/grafo/export')
+def api_grafo_export():
+    """Exportar el grafo completo en streaming (ndjson, graphml o edgelist)"""
+    formato = request.args.get('format', 'ndjson')
+    if formato not in FORMATOS_EXPORT:
+        return jsonify({'error': f'format debe ser uno de: {", ".join(FORMATOS_EXPORT)}'}), 400
+    
+    gzip_param = request.args.get('gzip')
+    if gzip_param is None:
+        comprimir = 'gzip' in request.headers.get('Accept-Encoding', '')
+    else:
+        comprimir = gzip_param.lower() == 'true'
+    
+    mimetype, extension = FORMATOS_EXPORT[formato]
+    try:
+        descarga = get_export_service(current_app).export(formato, comprimir)
+    except ExportBusyError as e:
+        return jsonify({'error': str(e)}), 503, {'Retry-After': '5'}
+    # Sin Content-Length: el servidor lo envía con transferencia por trozos
+    response = Response(stream_with_context(descarga), mimetype=mimetype)
+    response.headers['Content-Disposition'] = f'attachment; filename=red_social.{extension}'
+    if comprimir:
+        response.headers['Content-Encoding'] = 'gzip'
+        response.headers['Vary'] = 'Accept-Encoding'
+    return response
+
+@grafo_bp.route('/grafo/changes')
+def api_grafo_changes():
+    """Feed incremental: nodos y aristas modificados desde una versión"""
+    since = request.args.get('since', type=int)
+    if since is None:
+        return jsonify({'error': 'Parámetro since requerido'}), 400
+    
+    try:
+        cambios = get_graph_service().get_changes(since)
+        if cambios['resync']:
+            return jsonify(cambios), 410
+        return jsonify(cambios)
+        
+    except Exception as e:
+        print(f"❌ Error en feed de cambios: {e}")
+        return jsonify({'error': str(e)}), 500
+
+@grafo_bp.route('/grafo/eventos')
+def api_grafo_eventos():
+    """Canal Server-Sent Events con los cambios del grafo en vivo"""
+    broker = get_graph_events(current_app)
+    
+    # EventSource envía Last-Event-ID al reconectar; el query param permite la primera conexión
+    last_event_id = request.headers.get('Last-Event-ID') or request.args.get('last_event_id')
+    try:
+        last_event_id = int(last_event_id) if last_event_id else None
+    except ValueError:
+        return jsonify({'error': 'Last-Event-ID inválido'}), 400
+    
+    subscription = broker.subscribe()
+    if subscription is None:
+        return jsonify({'error': 'Demasiados clientes conectados'}), 503
+    
+    response = Response(stream_with_context(broker.stream(subscription, last_event_id)),
+                        mimetype='text/event-stream')
+    response.headers['Cache-Control'] = 'no-cache'
+    response.headers['X-Accel-Buffering'] = 'no'
+    return response
+
 @grafo_bp.route('/posiciones', methods=['GET', 'POST'])
 def posiciones():
     """Obtener/guardar posiciones de los nodos"""
-    db_manager = DatabaseManager(current_app.config['DATABASE_PATH'])
+    db_manager = get_db_manager(current_app)
     persona_repo = PersonaRepository(db_manager)
     
     try:
@@ -86,6 +328,7 @@ def posiciones():
         
         if valid_positions:
             guardadas = persona_repo.update_positions(valid_positions)
+            notify_graph_change(current_app)
             return jsonify({'success': True, 'guardadas': guardadas})
         else:
             return jsonify({'error': 'No hay posiciones válidas para guardar'}), 400
@@ -96,7 +339,7 @@ def posiciones():
 @grafo_bp.route('/grupos', methods=['GET', 'POST'])
 def grupos():
     """Obtener/actualizar grupos de personas"""
-    db_manager = DatabaseManager(current_app.config['DATABASE_PATH'])
+    db_manager = get_db_manager(current_app)
     persona_repo = PersonaRepository(db_manager)
     
     try:
@@ -120,6 +363,7 @@ def grupos():
             return jsonify({'error': 'Updates debe ser una lista'}), 400
         
         actualizados = persona_repo.update_groups(updates)
+        notify_graph_change(current_app)
         
         return jsonify({
             'success': True,
@@ -139,7 +383,7 @@ def obtener_grupos_personas():
 def obtener_imagenes():
             """Obtener todas las URLs de imágenes"""
             try:
-                db_manager = DatabaseManager(current_app.config['DATABASE_PATH'])
+                db_manager = get_db_manager(current_app)
                 persona_repo = PersonaRepository(db_manager)
                 personas = persona_repo.get_all()
                 
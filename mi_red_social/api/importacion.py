@@ -0,0 +1,48 @@
+# =================================================================
+# api/importacion.py - API de importación masiva
+# =================================================================
+
+from flask import Blueprint, jsonify, request, current_app
+from models.database import get_db_manager
+from models.persona import PersonaRepository
+from models.relacion import RelacionRepository
+from services.import_service import ImportService, ENTIDADES, FORMATOS
+from services.graph_cache import notify_graph_change
+
+importacion_bp = Blueprint('importacion', __name__)
+
+def get_import_service() -> ImportService:
+    """Obtener servicio de importación"""
+    # Fuera de la unidad de la petición: la importación confirma por trozos
+    db_manager = get_db_manager(current_app).detached()
+    return ImportService(
+        PersonaRepository(db_manager),
+        RelacionRepository(db_manager),
+        chunk_size=current_app.config['IMPORT_CHUNK_SIZE'],
+        max_errors=current_app.config['IMPORT_MAX_ERRORES']
+    )
+
+@importacion_bp.route('/importar/<entidad>', methods=['POST'])
+def importar(entidad):
+    """Importar personas o relaciones desde CSV/JSONL (fichero 'archivo' o cuerpo crudo)"""
+    if entidad not in ENTIDADES:
+        return jsonify({'error': f'Entidad debe ser una de: {", ".join(ENTIDADES)}'}), 400
+    
+    archivo = request.files.get('archivo')
+    nombre = archivo.filename if archivo else None
+    formato = ImportService.detect_format(nombre, request.args.get('format'))
+    if not formato:
+        return jsonify({'error': f'Formato debe ser uno de: {", ".join(FORMATOS)}'}), 400
+    
+    # Sin multipart se lee el cuerpo en streaming, sin cargarlo en memoria
+    stream = archivo.stream if archivo else request.stream
+    
+    try:
+        informe = get_import_service().import_stream(entidad, stream, formato)
+        if informe['insertadas']:
+            notify_graph_change(current_app)
+        
+        return jsonify({'success': informe['num_errores'] == 0, **informe})
+    except Exception as e:
+        print(f"❌ Error importando {entidad}: {e}")
+        return jsonify({'error': str(e)}), 500
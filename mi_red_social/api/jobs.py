@@ -0,0 +1,22 @@
+# =================================================================
+# api/jobs.py - API de trabajos en segundo plano
+# =================================================================
+
+from flask import Blueprint, jsonify, request, current_app
+from services.jobs import get_job_manager
+
+jobs_bp = Blueprint('jobs', __name__)
+
+@jobs_bp.route('/jobs')
+def listar_jobs():
+    """Trabajos recientes (opcionalmente filtrados por tipo)"""
+    jobs = get_job_manager(current_app).list(request.args.get('tipo'))
+    return jsonify({'jobs': [job.to_dict(include_result=False) for job in jobs]})
+
+@jobs_bp.route('/jobs/<job_id>')
+def obtener_job(job_id):
+    """Estado y resultado de un trabajo"""
+    job = get_job_manager(current_app).get(job_id)
+    if not job:
+        return jsonify({'error': 'Trabajo no encontrado'}), 404
+    return jsonify(job.to_dict())
@@ -2,18 +2,23 @@
 # api/main.py - Rutas principales (páginas web)
 # =================================================================
 
-from flask import Blueprint, render_template, current_app
-from models.database import DatabaseManager
+from flask import Blueprint, render_template, request, current_app
+from models.database import get_db_manager
 from models.persona import PersonaRepository
 from models.relacion import RelacionRepository
 from services.data_service import DataService
 from services.image_service import ImageService
+from services.graph_cache import get_graph_cache
+from services.graph_events import get_graph_events
+from services.graph_engine import get_graph_engine
+from services.jobs import get_job_manager
+from services.image_pipeline import get_image_pipeline
 
 main_bp = Blueprint('main', __name__)
 
 def get_services():
     """Factory para obtener servicios configurados"""
-    db_manager = DatabaseManager(current_app.config['DATABASE_PATH'])
+    db_manager = get_db_manager(current_app)
     persona_repo = PersonaRepository(db_manager)
     relacion_repo = RelacionRepository(db_manager)
     image_service = ImageService(current_app.config)
@@ -32,12 +37,72 @@ def admin():
     data_service, _, _, _, _ = get_services()
     admin_data = data_service.get_admin_data()
     
-    return render_template('admin.html', 
-                         personas=admin_data['personas'], 
-                         relaciones=admin_data['relaciones'])
+    return render_template('admin.html', **admin_data)
+
+@main_bp.route('/admin/personas')
+def admin_personas():
+    """Filas de personas del panel (página bajo demanda)"""
+    data_service, _, _, _, _ = get_services()
+    try:
+        page = data_service.get_personas_page(
+            cursor=request.args.get('cursor'),
+            limit=request.args.get('limit', 50, type=int),
+            grupo=request.args.get('grupo') or None,
+            prefijo=request.args.get('prefijo') or None
+        )
+    except ValueError as e:
+        return str(e), 400
+    
+    html = render_template('_admin_filas_personas.html', personas=page['personas'])
+    return html, 200, {'X-Next-Cursor': page['next_cursor'] or ''}
+
+@main_bp.route('/admin/relaciones')
+def admin_relaciones():
+    """Filas de relaciones del panel (página bajo demanda)"""
+    data_service, _, _, _, _ = get_services()
+    try:
+        page = data_service.get_relaciones_page(
+            cursor=request.args.get('cursor'),
+            limit=request.args.get('limit', 50, type=int),
+            tipo=request.args.get('tipo') or None,
+            fortaleza_min=request.args.get('fortaleza_min', type=int),
+            fortaleza_max=request.args.get('fortaleza_max', type=int)
+        )
+    except ValueError as e:
+        return str(e), 400
+    
+    html = render_template('_admin_filas_relaciones.html', relaciones=page['relaciones'])
+    return html, 200, {'X-Next-Cursor': page['next_cursor'] or ''}
 
 @main_bp.route('/debug')
 def debug():
     """Endpoint de debug"""
     data_service, _, _, _, _ = get_services()
-    return data_service.get_debug_info()
\ No newline at end of file
+    return data_service.get_debug_info(limit=request.args.get('limit', 50, type=int))
+@main_bp.route('/debug/pool')
+def debug_pool():
+    """Estadísticas del pool de conexiones SQLite"""
+    return get_db_manager(current_app).pool_stats()
+
+@main_bp.route('/debug/cache')
+def debug_cache():
+    """Estadísticas de la caché del grafo"""
+    return get_graph_cache(current_app).stats()
+
+@main_bp.route('/debug/eventos')
+def debug_eventos():
+    """Estadísticas del canal de eventos SSE"""
+    return get_graph_events(current_app).stats()
+
+@main_bp.route('/debug/motor')
+def debug_motor():
+    """Estadísticas del motor de grafo en memoria"""
+    return get_graph_engine(current_app).stats()
+
+@main_bp.route('/debug/jobs')
+def debug_jobs():
+    """Estadísticas de los trabajos en segundo plano"""
+    return {
+        **get_job_manager(current_app).stats(),
+        'imagenes': get_image_pipeline(current_app).stats()
+    }
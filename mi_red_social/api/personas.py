@@ -2,19 +2,28 @@
 # api/personas.py - API de personas
 # =================================================================
 
+import json
+import os
 from flask import Blueprint, request, jsonify, redirect, url_for, flash, current_app
 from werkzeug.datastructures import FileStorage
-from models.database import DatabaseManager
+from werkzeug.exceptions import RequestEntityTooLarge
+from models.database import get_db_manager
 from models.persona import PersonaRepository
 from models.relacion import RelacionRepository
 from services.data_service import DataService
 from services.image_service import ImageService
+from services.graph_cache import notify_graph_change
+from services.image_pipeline import get_image_pipeline, PipelineFullError
+from services.avatar_store import AvatarStore
+from services.avatar_batch import AvatarBatchService
+from services.jobs import get_job_manager
+from services.image_gc import run_image_sweep
 
 personas_bp = Blueprint('personas', __name__)
 
 def get_persona_services():
     """Factory para obtener servicios de personas"""
-    db_manager = DatabaseManager(current_app.config['DATABASE_PATH'])
+    db_manager = get_db_manager(current_app)
     persona_repo = PersonaRepository(db_manager)
     relacion_repo = RelacionRepository(db_manager)
     image_service = ImageService(current_app.config)
@@ -22,6 +31,25 @@ def get_persona_services():
     
     return data_service, persona_repo, image_service
 
+@personas_bp.route('/personas', methods=['GET'])
+def listar_personas():
+    """Listar personas paginadas por cursor, con filtros por grupo y prefijo"""
+    data_service, _, _ = get_persona_services()
+    
+    try:
+        page = data_service.get_personas_page(
+            cursor=request.args.get('cursor'),
+            limit=request.args.get('limit', 50, type=int),
+            grupo=request.args.get('grupo') or None,
+            prefijo=request.args.get('prefijo') or None
+        )
+        return jsonify(page)
+        
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        return jsonify({'error': f'Error interno: {str(e)}'}), 500
+
 @personas_bp.route('/personas', methods=['POST'])
 def agregar_persona():
     """Crear nueva persona"""
@@ -36,6 +64,8 @@ def agregar_persona():
     }
     
     success, message, persona_id = data_service.create_persona_with_validation(form_data)
+    if success:
+        notify_graph_change(current_app)
     
     # Determinar tipo de respuesta
     is_json_request = request.is_json or 'application/json' in request.headers.get('Accept', '')
@@ -63,6 +93,8 @@ def eliminar_persona(persona_id):
     data_service, _, _ = get_persona_services()
     
     success, message = data_service.delete_persona_with_cleanup(persona_id)
+    if success:
+        notify_graph_change(current_app)
     
     if success:
         flash(f'✅ {message}')
@@ -73,7 +105,7 @@ def eliminar_persona(persona_id):
 
 @personas_bp.route('/personas/<int:persona_id>/imagen', methods=['POST'])
 def subir_imagen(persona_id):
-    """Subir imagen para una persona"""
+    """Aceptar una imagen para una persona y procesarla en segundo plano"""
     data_service, persona_repo, image_service = get_persona_services()
     
     try:
@@ -82,32 +114,106 @@ def subir_imagen(persona_id):
         if not persona:
             return jsonify({'error': 'Persona no encontrada'}), 404
         
-        # Verificar archivo
-        if 'imagen' not in request.files:
+        # Verificar archivo (UploadLimitRequest corta el cuerpo al pasar de max_request_size)
+        try:
+            file = request.files.get('imagen')
+        except RequestEntityTooLarge:
+            return jsonify({'error': image_service.too_large_message()}), 413
+        if file is None:
             return jsonify({'error': 'No se envió ningún archivo'}), 400
-        
-        file = request.files['imagen']
         if file.filename == '':
             return jsonify({'error': 'No se seleccionó ningún archivo'}), 400
         
-        # Eliminar imagen anterior si existe
-        if persona.imagen_url:
-            image_service.delete_image(persona.imagen_url)
-        
-        # Guardar nueva imagen
-        image_path, error = image_service.save_image(file, persona_id)
+        # Validar y guardar la subida tal cual; Pillow trabaja fuera de la petición
+        temporal, image_path, error = image_service.stage_upload(file)
         if error:
-            return jsonify({'error': error}), 400
+            return jsonify({'error': error}), 413 if error == image_service.too_large_message() else 400
         
-        # Actualizar base de datos
-        persona_repo.update_image(persona_id, image_path)
+        app = current_app._get_current_object()
+        avatar_store = AvatarStore(image_service, persona_repo)
         
-        return jsonify({
+        # Misma imagen ya procesada (para esta u otra persona): se enlaza sin reprocesar
+        asignada = avatar_store.assign_stored(persona_id, image_path)
+        if asignada is not None:
+            os.remove(temporal)
+            if not asignada:
+                return jsonify({'error': 'Persona no encontrada'}), 404
+            notify_graph_change(app)
+            return jsonify({
+                'success': True,
+                'message': 'Imagen subida exitosamente',
+                'imagen_url': image_path,
+                'persona_id': persona_id,
+                'deduplicada': True
+            })
+        
+        def actualizar_persona(imagen_url):
+            # La imagen anterior se libera solo cuando la nueva ya está guardada
+            if not avatar_store.assign(persona_id, imagen_url):
+                avatar_store.release(imagen_url)
+                return {'persona_id': persona_id, 'imagen_url': None, 'descartada': True}
+            notify_graph_change(app)
+            return {'persona_id': persona_id, 'imagen_url': imagen_url}
+        
+        try:
+            job = get_image_pipeline(app).submit(
+                'imagen', temporal, image_path, actualizar_persona, clave=persona_id
+            )
+        except PipelineFullError as e:
+            os.remove(temporal)
+            return jsonify({'error': str(e)}), 503, {'Retry-After': '5'}
+        
+        respuesta = jsonify({
             'success': True,
-            'message': 'Imagen subida exitosamente',
-            'imagen_url': image_path,
-            'persona_id': persona_id
+            'message': 'Imagen recibida, procesándose',
+            'persona_id': persona_id,
+            'job': job.to_dict(include_result=False)
         })
+        respuesta.headers['Location'] = f'/api/jobs/{job.id}'
+        return respuesta, 202
+        
+    except Exception as e:
+        return jsonify({'error': f'Error interno: {str(e)}'}), 500
+
+@personas_bp.route('/personas/imagenes', methods=['POST'])
+def subir_imagenes_lote():
+    """Asignar avatares a muchas personas desde un ZIP o varios ficheros (en segundo plano)"""
+    _, persona_repo, image_service = get_persona_services()
+    
+    try:
+        archivo = request.files.get('archivo')
+        imagenes = [f for f in request.files.getlist('imagenes') if f.filename]
+        if archivo is None and not imagenes:
+            return jsonify({'error': 'Envía un ZIP en "archivo" o imágenes en "imagenes"'}), 400
+        
+        # Mapa opcional {fichero: id o nombre}; por defecto manda el nombre del fichero
+        try:
+            mapa = json.loads(request.form.get('mapa') or '{}')
+        except ValueError:
+            return jsonify({'error': 'mapa debe ser un objeto JSON'}), 400
+        if not isinstance(mapa, dict):
+            return jsonify({'error': 'mapa debe ser un objeto JSON'}), 400
+        
+        app = current_app._get_current_object()
+        lote = AvatarBatchService(
+            image_service, persona_repo, get_image_pipeline(app),
+            max_items=app.config['IMAGE_BATCH_MAX_ITEMS'],
+            max_size=app.config['IMAGE_BATCH_MAX_SIZE']
+        )
+        temporal, error = lote.stage(archivo, imagenes)
+        if error:
+            return jsonify({'error': error}), 400
+        
+        def procesar_lote():
+            informe = lote.run(temporal, mapa)
+            if informe['actualizadas']:
+                notify_graph_change(app)
+            return informe
+        
+        job = get_job_manager(app).submit('imagenes_lote', procesar_lote)
+        respuesta = jsonify({'success': True, 'job': job.to_dict(include_result=False)})
+        respuesta.headers['Location'] = f'/api/jobs/{job.id}'
+        return respuesta, 202
         
     except Exception as e:
         return jsonify({'error': f'Error interno: {str(e)}'}), 500
@@ -122,12 +228,9 @@ def eliminar_imagen(persona_id):
         if not persona:
             return jsonify({'error': 'Persona no encontrada'}), 404
         
-        # Eliminar archivo de imagen
-        if persona.imagen_url:
-            image_service.delete_image(persona.imagen_url)
-        
-        # Actualizar base de datos
-        persona_repo.update_image(persona_id, None)
+        # Quitar la imagen (sus ficheros se borran si nadie más la usa)
+        AvatarStore(image_service, persona_repo).assign(persona_id, None)
+        notify_graph_change(current_app)
         
         return jsonify({
             'success': True,
@@ -138,6 +241,20 @@ def eliminar_imagen(persona_id):
     except Exception as e:
         return jsonify({'error': f'Error interno: {str(e)}'}), 500
 
+@personas_bp.route('/imagenes/gc', methods=['POST'])
+def limpiar_imagenes():
+    """Lanzar el barrido de imágenes huérfanas (?dry_run=true solo informa)"""
+    try:
+        app = current_app._get_current_object()
+        dry_run = request.args.get('dry_run', 'false').lower() == 'true'
+        job = get_job_manager(app).submit('imagenes_gc', lambda: run_image_sweep(app, dry_run))
+        respuesta = jsonify({'success': True, 'job': job.to_dict(include_result=False)})
+        respuesta.headers['Location'] = f'/api/jobs/{job.id}'
+        return respuesta, 202
+        
+    except Exception as e:
+        return jsonify({'error': f'Error interno: {str(e)}'}), 500
+
 @personas_bp.route('/imagenes', methods=['GET'])
 def obtener_imagenes():
     """Obtener todas las URLs de imágenes"""
@@ -2,18 +2,19 @@
 # api/relaciones.py - API de relaciones
 # =================================================================
 
-from flask import Blueprint, request, redirect, url_for, flash, current_app
-from models.database import DatabaseManager
+from flask import Blueprint, request, jsonify, redirect, url_for, flash, current_app
+from models.database import get_db_manager
 from models.persona import PersonaRepository
 from models.relacion import RelacionRepository
 from services.data_service import DataService
 from services.image_service import ImageService
+from services.graph_cache import notify_graph_change
 
 relaciones_bp = Blueprint('relaciones', __name__)
 
 def get_relacion_services():
     """Factory para obtener servicios de relaciones"""
-    db_manager = DatabaseManager(current_app.config['DATABASE_PATH'])
+    db_manager = get_db_manager(current_app)
     persona_repo = PersonaRepository(db_manager)
     relacion_repo = RelacionRepository(db_manager)
     image_service = ImageService(current_app.config)
@@ -21,6 +22,26 @@ def get_relacion_services():
     
     return data_service, relacion_repo
 
+@relaciones_bp.route('/relaciones', methods=['GET'])
+def listar_relaciones():
+    """Listar relaciones paginadas por cursor, con filtros por tipo y fortaleza"""
+    data_service, _ = get_relacion_services()
+    
+    try:
+        page = data_service.get_relaciones_page(
+            cursor=request.args.get('cursor'),
+            limit=request.args.get('limit', 50, type=int),
+            tipo=request.args.get('tipo') or None,
+            fortaleza_min=request.args.get('fortaleza_min', type=int),
+            fortaleza_max=request.args.get('fortaleza_max', type=int)
+        )
+        return jsonify(page)
+        
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        return jsonify({'error': f'Error interno: {str(e)}'}), 500
+
 @relaciones_bp.route('/relaciones', methods=['POST'])
 def agregar_relacion():
     """Crear nueva relación"""
@@ -35,6 +56,8 @@ def agregar_relacion():
     }
     
     success, message = data_service.create_relacion_with_validation(form_data)
+    if success:
+        notify_graph_change(current_app)
     
     if success:
         flash(f'✅ {message}')
@@ -51,6 +74,7 @@ def eliminar_relacion(relacion_id):
     try:
         success = relacion_repo.delete(relacion_id)
         if success:
+            notify_graph_change(current_app)
             flash('✅ Relación eliminada exitosamente')
         else:
             flash('❌ Relación no encontrada')
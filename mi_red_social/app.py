@@ -4,9 +4,25 @@
 
 from flask import Flask
 from config import Config
-from models.database import init_db, create_images_directory
-from api import register_blueprints
-import os
+from models.database import DatabaseManager, create_images_directory
+from models.migrations import migrate
+from services.graph_cache import GraphCache
+from services.graph_events import GraphEventBroker
+from services.graph_engine import GraphEngine
+from services.analytics_service import AnalyticsService
+from services.path_service import PathService
+from services.community_service import CommunityService
+from services.layout_service import LayoutService
+from services.jobs import JobManager
+from services.image_pipeline import ImagePipeline
+from services.image_service import ImageService
+from services.avatar_store import AvatarStore
+from services.sprite_service import SpriteAtlasService
+from services.image_gc import SweepScheduler, run_image_sweep
+from services.export_service import ExportService
+from models.persona import PersonaRepository
+from api import register_blueprints, init_unit_of_work, init_upload_limits
+from cli import register_commands
 from pathlib import Path
 
 def create_app(config_class=Config):
@@ -22,9 +38,74 @@ def create_app(config_class=Config):
     
     app.config.from_object(config_class)
     
-    # Inicializar base de datos
-    if not os.path.exists(app.config['DATABASE_PATH']):
-        init_db(app.config['DATABASE_PATH'])
+    # Pool de conexiones compartido por toda la aplicación
+    db_manager = DatabaseManager.from_config(app.config)
+    app.extensions['db_manager'] = db_manager
+    
+    # Migraciones versionadas: crean o actualizan el esquema conservando los datos
+    migrate(db_manager)
+    
+    # Las sentencias de cada petición comparten conexión y se confirman juntas al final
+    if app.config['DB_UNIT_OF_WORK']:
+        init_unit_of_work(app, db_manager)
+    
+    # Caché versionada del payload del grafo
+    app.extensions['graph_cache'] = GraphCache()
+    
+    # Motor de grafo en memoria, cargado una vez y sincronizado con el log
+    graph_engine = GraphEngine(db_manager.detached())
+    graph_engine.load()
+    app.extensions['graph_engine'] = graph_engine
+    app.extensions['paths'] = PathService(graph_engine)
+    app.extensions['analytics'] = AnalyticsService(
+        graph_engine, betweenness_samples=app.config['ANALYTICS_BETWEENNESS_MUESTRAS']
+    )
+    
+    # Trabajos pesados (comunidades, layout...) fuera de los hilos de petición
+    app.extensions['jobs'] = JobManager(max_workers=app.config['JOBS_MAX_WORKERS'])
+    app.extensions['communities'] = CommunityService(
+        graph_engine, PersonaRepository(db_manager), max_workers=app.config['COMMUNITY_WORKERS']
+    )
+    app.extensions['layout'] = LayoutService(
+        graph_engine, PersonaRepository(db_manager),
+        iterations=app.config['LAYOUT_ITERACIONES'],
+        distance=app.config['LAYOUT_DISTANCIA']
+    )
+    
+    # Exportaciones en streaming, limitadas para no agotar el pool de conexiones
+    app.extensions['export'] = ExportService(
+        db_manager.detached(), max_concurrentes=app.config['EXPORT_MAX_CONCURRENTES']
+    )
+    
+    # Procesado de avatares en un pool de procesos con cola acotada
+    avatar_store = AvatarStore(ImageService(app.config), PersonaRepository(db_manager))
+    app.extensions['images'] = ImagePipeline(
+        app.config, app.extensions['jobs'],
+        max_workers=app.config['IMAGE_WORKERS'],
+        queue_size=app.config['IMAGE_QUEUE_SIZE'],
+        release=avatar_store.release
+    )
+    
+    # Atlas de avatares, actualizado de forma incremental por versión del grafo
+    app.extensions['sprites'] = SpriteAtlasService(
+        PersonaRepository(db_manager), ImageService(app.config),
+        sizes=app.config['SPRITE_SIZES'], sheet_px=app.config['SPRITE_SHEET_PX']
+    )
+    
+    # Barrido periódico de imágenes huérfanas y referencias rotas
+    app.extensions['images_gc'] = SweepScheduler(
+        app.extensions['jobs'], lambda: run_image_sweep(app),
+        interval_seconds=app.config['IMAGE_GC_INTERVAL_SECONDS']
+    )
+    
+    # Canal SSE de cambios del grafo
+    app.extensions['graph_events'] = GraphEventBroker(
+        db_manager.detached(),
+        queue_size=app.config['SSE_QUEUE_SIZE'],
+        heartbeat_seconds=app.config['SSE_HEARTBEAT_SECONDS'],
+        max_clients=app.config['SSE_MAX_CLIENTS'],
+        retry_ms=app.config['SSE_RETRY_MS']
+    )
     
     # Crear directorio de imágenes
     create_images_directory(app.config['IMAGES_FOLDER'])
@@ -32,6 +113,15 @@ def create_app(config_class=Config):
     # Registrar blueprints
     register_blueprints(app)
     
+    # La subida de un avatar se corta al pasar del límite, antes de parsear el multipart
+    init_upload_limits(app, {'personas.subir_imagen': ImageService(app.config).max_request_size})
+    
+    # Comandos de consola (flask importar ...)
+    register_commands(app)
+    
+    # Primer barrido tras un intervalo, con la aplicación ya montada
+    app.extensions['images_gc'].start()
+    
     return app
 
 if __name__ == '__main__':
@@ -0,0 +1,82 @@
+# =================================================================
+# cli.py - Comandos de línea de órdenes (flask ...)
+# =================================================================
+
+import os
+import tempfile
+import click
+from flask import Flask
+from models.database import DatabaseManager, get_db_manager
+from models.migrations import migrate
+from models.persona import PersonaRepository
+from models.relacion import RelacionRepository
+from services.import_service import ImportService, ENTIDADES, FORMATOS
+from services.graph_cache import notify_graph_change
+from services.image_gc import run_image_sweep
+from services.graph_benchmark import seed_synthetic_graph, benchmark_graph_payload
+
+def register_commands(app: Flask) -> None:
+    """Registrar los comandos de la aplicación"""
+
+    @app.cli.command('importar')
+    @click.argument('entidad', type=click.Choice(ENTIDADES))
+    @click.argument('fichero', type=click.File('rb'))
+    @click.option('--format', 'formato', type=click.Choice(FORMATOS), default=None,
+                  help='Formato del fichero (por defecto, según la extensión)')
+    @click.option('--chunk-size', type=int, default=None, help='Filas por transacción')
+    def importar(entidad, fichero, formato, chunk_size):
+        """Importar personas o relaciones desde un fichero CSV o JSONL"""
+        formato = ImportService.detect_format(fichero.name, formato)
+        if not formato:
+            raise click.UsageError(f'No se puede deducir el formato; usa --format ({", ".join(FORMATOS)})')
+        
+        db_manager = get_db_manager(app)
+        service = ImportService(
+            PersonaRepository(db_manager),
+            RelacionRepository(db_manager),
+            chunk_size=chunk_size or app.config['IMPORT_CHUNK_SIZE'],
+            max_errors=app.config['IMPORT_MAX_ERRORES']
+        )
+        informe = service.import_stream(entidad, fichero, formato)
+        if informe['insertadas']:
+            notify_graph_change(app)
+        
+        click.echo(f"✅ {informe['insertadas']} {entidad} importadas de {informe['procesadas']} filas "
+                   f"en {informe['duracion']}s ({informe['filas_por_segundo']} filas/s)")
+        for error in informe['errores']:
+            click.echo(f"❌ Fila {error['fila']}: {error['error']}", err=True)
+        if informe['num_errores'] > len(informe['errores']):
+            click.echo(f"... y {informe['num_errores'] - len(informe['errores'])} errores más", err=True)
+    
+    @app.cli.command('limpiar-imagenes')
+    @click.option('--dry-run', is_flag=True, help='Solo informar, sin borrar ni modificar nada')
+    def limpiar_imagenes(dry_run):
+        """Borrar imágenes huérfanas, quitar referencias rotas y mover las antiguas al almacén"""
+        informe = run_image_sweep(app, dry_run)
+        prefijo = '🔍 (simulación) ' if dry_run else '✅ '
+        click.echo(f"{prefijo}{informe['huerfanos']} huérfanas, {informe['bytes_liberados']} bytes liberados, "
+                   f"{informe['referencias_rotas']} referencias rotas, {informe['migrados']} migradas "
+                   f"de {informe['escaneados']} ficheros en {informe['duracion']}s")
+    
+    @app.cli.command('bench-grafo')
+    @click.option('--personas', type=int, default=10000, show_default=True)
+    @click.option('--relaciones', type=int, default=30000, show_default=True)
+    @click.option('--repeticiones', type=int, default=5, show_default=True)
+    def bench_grafo(personas, relaciones, repeticiones):
+        """Comparar el payload de /api/grafo en Python y en SQLite sobre una red sintética"""
+        with tempfile.TemporaryDirectory() as carpeta:
+            # Base temporal: no toca los datos de la aplicación
+            db_manager = DatabaseManager(os.path.join(carpeta, 'bench.db'))
+            migrate(db_manager)
+            if 'json' not in db_manager.features:
+                raise click.ClickException('Este SQLite no tiene funciones JSON')
+            seed_synthetic_graph(db_manager, personas, relaciones)
+            resultado = benchmark_graph_payload(db_manager, app.json.dumps, repeticiones)
+            db_manager.close()
+        
+        click.echo(f"📊 {resultado['nodos']} nodos, {resultado['aristas']} aristas, {repeticiones} repeticiones")
+        for camino in ('python', 'sqlite'):
+            datos = resultado[camino]
+            click.echo(f"   {camino:<7} mediana {datos['mediana_ms']} ms, mínimo {datos['min_ms']} ms, {datos['bytes']} bytes")
+        click.echo(f"{'✅' if resultado['iguales'] else '❌'} Mismo contenido: {resultado['iguales']}; "
+                   f"SQLite {resultado['aceleracion']}x más rápido")
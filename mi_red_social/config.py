@@ -15,11 +15,60 @@ class Config:
     BASE_DIR = Path(__file__).parent
     DATABASE_PATH = BASE_DIR / 'red_social.db'
     
+    # Pool de conexiones SQLite
+    DB_POOL_SIZE = 8
+    DB_CACHE_SIZE_KB = 16 * 1024  # 16MB de caché de páginas por conexión
+    DB_MMAP_SIZE = 128 * 1024 * 1024  # 128MB mapeados en memoria
+    DB_STATEMENT_CACHE = 256  # Sentencias preparadas por conexión
+    DB_BUSY_TIMEOUT_MS = 5000
+    DB_UNIT_OF_WORK = True  # Una conexión y una transacción por petición
+    
+    # Subgrafos de vecindad (ego-network)
+    GRAFO_EGO_MAX_DEPTH = 4
+    GRAFO_EGO_MAX_NODOS = 1000
+    GRAFO_JSON_SQL = True  # Payload de /api/grafo montado por SQLite (si tiene JSON1)
+    
+    # Analítica de centralidad
+    ANALYTICS_BETWEENNESS_MUESTRAS = 64  # Orígenes muestreados para betweenness aproximada
+    
+    # Trabajos en segundo plano
+    JOBS_MAX_WORKERS = 2
+    COMMUNITY_WORKERS = 1  # Procesos para Louvain (Python puro: fuera del GIL de las peticiones)
+    
+    # Importación masiva
+    IMPORT_CHUNK_SIZE = 2000  # Filas por transacción
+    IMPORT_MAX_ERRORES = 1000  # Errores de fila detallados en el informe
+    
+    # Exportación en streaming
+    EXPORT_MAX_CONCURRENTES = 2  # Descargas simultáneas (cada una retiene una conexión del pool)
+    
+    # Layout calculado en el servidor
+    LAYOUT_ITERACIONES = 100
+    LAYOUT_DISTANCIA = 150.0  # Longitud ideal de una relación, en píxeles
+    
+    # Canal de eventos en vivo (SSE)
+    SSE_QUEUE_SIZE = 256  # Eventos pendientes por cliente antes de desconectarlo
+    SSE_HEARTBEAT_SECONDS = 15
+    SSE_MAX_CLIENTS = 200
+    SSE_RETRY_MS = 3000
+    
     # Imágenes
     ALLOWED_EXTENSIONS = {'png', 'jpg', 'jpeg', 'gif', 'webp'}
     MAX_FILE_SIZE = 5 * 1024 * 1024  # 5MB
-    IMAGE_SIZE = (150, 150)
+    IMAGE_MAX_PIXELS = 40_000_000  # Rechaza bombas de descompresión antes de decodificar
+    IMAGE_SIZE = (150, 150)  # Imagen de respaldo, en el formato subido
+    IMAGE_SIZES = (32, 64, 150, 300)  # Derivadas WebP según el zoom del grafo
+    IMAGE_WEBP_QUALITY = 80
     IMAGES_FOLDER = BASE_DIR / 'static' / 'images' / 'users'
+    SPRITE_SIZES = (32, 64)  # Tamaños servidos como atlas (vistas alejadas)
+    SPRITE_SHEET_PX = 2048  # Lado de cada hoja del atlas
+    IMAGE_BATCH_MAX_SIZE = 200 * 1024 * 1024  # ZIP de avatares por lotes
+    IMAGE_BATCH_MAX_ITEMS = 1000
+    IMAGE_WORKERS = 2  # Procesos que decodifican y redimensionan avatares
+    IMAGE_QUEUE_SIZE = 32  # Imágenes pendientes antes de responder 503
+    IMAGE_GC_INTERVAL_SECONDS = 6 * 3600  # Barrido de imágenes huérfanas (0 lo desactiva)
+    IMAGE_GC_GRACE_SECONDS = 3600  # No se tocan ficheros más recientes (subidas en curso)
+    IMAGE_GC_LOTE = 1000  # Personas leídas por consulta durante el barrido
     
     # Configuraciones de Flask
     JSON_AS_ASCII = False
@@ -36,4 +85,5 @@ class ProductionConfig(Config):
 class TestingConfig(Config):
     """Configuración para testing"""
     TESTING = True
-    DATABASE_PATH = ':memory:'
\ No newline at end of file
+    DATABASE_PATH = ':memory:'
+    IMAGE_GC_INTERVAL_SECONDS = 0
\ No newline at end of file
@@ -0,0 +1,87 @@
+# =================================================================
+# models/cambio.py - Registro de cambios del grafo
+# =================================================================
+
+import sqlite3
+from typing import Optional, List, Dict, Iterable, Tuple
+from models.database import DatabaseManager
+
+# Entidades registradas en el log
+ENTIDAD_PERSONA = 'persona'
+ENTIDAD_RELACION = 'relacion'
+
+class ChangeLogRepository:
+    """Repositorio del log de cambios usado por el feed incremental del grafo"""
+
+    # Entradas que se conservan tras compactar y cada cuántas se compacta
+    RETENCION = 10000
+    COMPACTAR_CADA = 500
+
+    def __init__(self, db_manager: DatabaseManager):
+        self.db = db_manager
+
+    def record(self, conn: sqlite3.Connection, entidad: str, ids: Iterable[int], operacion: str) -> None:
+        """Registrar cambios dentro de la transacción de la escritura"""
+        params = [(entidad, int(entidad_id), operacion) for entidad_id in ids]
+        if not params:
+            return
+
+        conn.executemany(
+            'INSERT INTO cambios_grafo (entidad, entidad_id, operacion) VALUES (?, ?, ?)',
+            params
+        )
+
+        # Compactar al cruzar un múltiplo de COMPACTAR_CADA
+        latest = conn.execute('SELECT MAX(seq) FROM cambios_grafo').fetchone()[0]
+        if latest // self.COMPACTAR_CADA != (latest - len(params)) // self.COMPACTAR_CADA:
+            self.compact(conn, latest)
+
+    def compact(self, conn: sqlite3.Connection, latest: int) -> int:
+        """Eliminar las entradas más antiguas que la ventana de retención"""
+        cursor = conn.execute('DELETE FROM cambios_grafo WHERE seq <= ?', (latest - self.RETENCION,))
+        return cursor.rowcount
+
+    def latest_version(self) -> int:
+        """Última versión registrada (0 si nunca hubo cambios)"""
+        row = self.db.execute_single(
+            "SELECT seq FROM sqlite_sequence WHERE name = 'cambios_grafo'"
+        )
+        return row['seq'] if row else 0
+
+    def oldest_available(self) -> Optional[int]:
+        """Primera versión que sigue en el log"""
+        row = self.db.execute_single('SELECT MIN(seq) AS seq FROM cambios_grafo')
+        return row['seq'] if row else None
+
+    def is_too_old(self, since: int, latest: int) -> bool:
+        """Comprobar si un cliente necesita resincronizar el grafo completo"""
+        if since > latest or since < 0:
+            return True
+        if since == latest:
+            return False
+        oldest = self.oldest_available()
+        return oldest is None or since < oldest - 1
+
+    def get_changed_ids(self, since: int, until: int) -> Dict[str, List[int]]:
+        """Obtener las entidades modificadas en el rango (since, until]"""
+        rows = self.db.execute_query('''
+            SELECT DISTINCT entidad, entidad_id
+            FROM cambios_grafo
+            WHERE seq > ? AND seq <= ?
+        ''', (since, until))
+
+        cambios = {ENTIDAD_PERSONA: [], ENTIDAD_RELACION: []}
+        for row in rows:
+            cambios.setdefault(row['entidad'], []).append(row['entidad_id'])
+        return cambios
+
+    def get_entries(self, since: int, until: int, limit: int = 500) -> List[Tuple[int, str, int, str]]:
+        """Obtener entradas del log en orden, posteriores a una versión"""
+        rows = self.db.execute_query('''
+            SELECT seq, entidad, entidad_id, operacion
+            FROM cambios_grafo
+            WHERE seq > ? AND seq <= ?
+            ORDER BY seq
+            LIMIT ?
+        ''', (since, until, limit))
+        return [(row['seq'], row['entidad'], row['entidad_id'], row['operacion']) for row in rows]
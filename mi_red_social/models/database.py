@@ -3,31 +3,408 @@
 # =================================================================
 
 import sqlite3
+import queue
+import threading
 from pathlib import Path
 from contextlib import contextmanager
-from typing import Optional, List, Dict, Any
+from typing import Optional, List, Dict, Any, Callable
+
+class ConnectionPool:
+    """Pool acotado y thread-safe de conexiones SQLite persistentes"""
+    
+    def __init__(self, db_path: str, max_size: int = 8, cache_size_kb: int = 16384,
+                 mmap_size: int = 134217728, statement_cache: int = 256,
+                 busy_timeout_ms: int = 5000, acquire_timeout: float = 30.0):
+        self.db_path = str(db_path)
+        self.max_size = max_size
+        self.cache_size_kb = cache_size_kb
+        self.mmap_size = mmap_size
+        self.statement_cache = statement_cache
+        self.busy_timeout_ms = busy_timeout_ms
+        self.acquire_timeout = acquire_timeout
+        
+        # Las bases en memoria se comparten entre conexiones del mismo pool
+        self.is_memory = self.db_path == ':memory:'
+        self._uri = f"file:red_social_mem_{id(self)}?mode=memory&cache=shared" if self.is_memory else None
+        
+        self._idle = queue.LifoQueue()
+        self._lock = threading.Lock()
+        self._created = 0
+        self._in_use = 0
+        self._closed = False
+        self._stats = {'acquired': 0, 'reused': 0, 'waits': 0, 'timeouts': 0, 'rollbacks': 0}
+    
+    def _connect(self) -> sqlite3.Connection:
+        """Abrir una conexión nueva con los pragmas de rendimiento"""
+        if self.is_memory:
+            conn = sqlite3.connect(self._uri, uri=True, check_same_thread=False,
+                                   cached_statements=self.statement_cache)
+        else:
+            conn = sqlite3.connect(self.db_path, check_same_thread=False,
+                                   timeout=self.busy_timeout_ms / 1000,
+                                   cached_statements=self.statement_cache)
+        conn.row_factory = sqlite3.Row
+        
+        if not self.is_memory:
+            conn.execute('PRAGMA journal_mode = WAL')
+            conn.execute('PRAGMA synchronous = NORMAL')
+            conn.execute(f'PRAGMA mmap_size = {int(self.mmap_size)}')
+        conn.execute(f'PRAGMA cache_size = {-int(self.cache_size_kb)}')
+        conn.execute(f'PRAGMA busy_timeout = {int(self.busy_timeout_ms)}')
+        conn.execute('PRAGMA temp_store = MEMORY')
+        conn.execute('PRAGMA foreign_keys = ON')
+        return conn
+    
+    def acquire(self) -> sqlite3.Connection:
+        """Tomar una conexión del pool (abriéndola si aún hay hueco)"""
+        if self._closed:
+            raise sqlite3.ProgrammingError("El pool de conexiones está cerrado")
+        
+        try:
+            conn = self._idle.get_nowait()
+            reused = True
+        except queue.Empty:
+            conn = None
+            reused = False
+            with self._lock:
+                can_create = self._created < self.max_size
+                if can_create:
+                    self._created += 1
+            
+            if can_create:
+                try:
+                    conn = self._connect()
+                except Exception:
+                    with self._lock:
+                        self._created -= 1
+                    raise
+            else:
+                with self._lock:
+                    self._stats['waits'] += 1
+                try:
+                    conn = self._idle.get(timeout=self.acquire_timeout)
+                    reused = True
+                except queue.Empty:
+                    with self._lock:
+                        self._stats['timeouts'] += 1
+                    raise sqlite3.OperationalError("Tiempo de espera agotado esperando una conexión libre")
+        
+        with self._lock:
+            self._in_use += 1
+            self._stats['acquired'] += 1
+            if reused:
+                self._stats['reused'] += 1
+        return conn
+    
+    def release(self, conn: sqlite3.Connection) -> None:
+        """Devolver una conexión al pool descartando transacciones abiertas"""
+        try:
+            if conn.in_transaction:
+                conn.rollback()
+                with self._lock:
+                    self._stats['rollbacks'] += 1
+        except sqlite3.Error:
+            # Conexión inservible: se descarta y se libera su hueco
+            conn.close()
+            with self._lock:
+                self._in_use -= 1
+                self._created -= 1
+            return
+        
+        with self._lock:
+            self._in_use -= 1
+        
+        if self._closed:
+            conn.close()
+        else:
+            self._idle.put(conn)
+    
+    def close(self) -> None:
+        """Cerrar todas las conexiones libres del pool"""
+        self._closed = True
+        while True:
+            try:
+                conn = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            conn.close()
+            with self._lock:
+                self._created -= 1
+    
+    def stats(self) -> Dict[str, Any]:
+        """Estadísticas del pool para monitorización"""
+        with self._lock:
+            return {
+                'db_path': self.db_path,
+                'max_size': self.max_size,
+                'open': self._created,
+                'in_use': self._in_use,
+                'idle': self._idle.qsize(),
+                **self._stats
+            }
+
+class UnitOfWork:
+    """Una conexión y una transacción compartidas por todas las sentencias de una petición
+    
+    La conexión se toma del pool con la primera sentencia y la transacción se
+    confirma una sola vez al final; los bloques transaction() internos pasan a
+    ser SAVEPOINTs, de modo que un fallo deshace solo su bloque.
+    
+    La transacción empieza diferida y solo toma el bloqueo de escritura en el
+    primer bloque de escritura: las lecturas (y las subidas que se reciben
+    mientras tanto) no bloquean a los demás escritores.
+    """
+    
+    def __init__(self, pool: ConnectionPool):
+        self.pool = pool
+        self.conn: Optional[sqlite3.Connection] = None
+        self.statements = 0
+        self.closed = False
+        self.writing = False
+        self._changes = 0
+        self._savepoints = 0
+        self._on_commit: List[tuple] = []
+    
+    def connection(self, write: bool = False) -> sqlite3.Connection:
+        """Conexión de la unidad con la transacción abierta (con write, con el bloqueo de escritura)"""
+        if self.conn is None:
+            self.conn = self.pool.acquire()
+            self.conn.set_trace_callback(self._trace)
+        if write and not self.writing:
+            self._upgrade()
+        elif not self.conn.in_transaction:
+            self.conn.execute('BEGIN')
+            self._changes = self.conn.total_changes
+        return self.conn
+    
+    def _upgrade(self) -> None:
+        # Si la transacción ya escribió, ya tiene el bloqueo; si solo leyó, se cierra y se
+        # reabre con BEGIN IMMEDIATE: una lectura seguida de escritura no puede fallar
+        # por instantánea desfasada
+        if self.conn.in_transaction and self.conn.total_changes != self._changes:
+            self.writing = True
+            return
+        if self.conn.in_transaction:
+            self.conn.commit()
+        self.conn.execute('BEGIN IMMEDIATE')
+        self.writing = True
+    
+    def _trace(self, sql: str) -> None:
+        # Solo sentencias de la aplicación: ni triggers (llegan como comentarios) ni control de transacción
+        if not sql.startswith(('--', 'BEGIN', 'SAVEPOINT', 'RELEASE', 'ROLLBACK', 'COMMIT')):
+            self.statements += 1
+    
+    def savepoint(self) -> str:
+        self._savepoints += 1
+        return f'uow_{self._savepoints}'
+    
+    def on_commit(self, callback: Callable, *args) -> None:
+        """Ejecutar callback(*args) tras confirmar (una sola vez aunque se pida varias)"""
+        if (callback, args) not in self._on_commit:
+            self._on_commit.append((callback, args))
+    
+    def commit(self) -> None:
+        """Confirmar lo pendiente; la unidad sigue abierta para más sentencias"""
+        if self.conn is not None and self.conn.in_transaction:
+            self.conn.commit()
+        self.writing = False
+        self._run_on_commit()
+    
+    def _run_on_commit(self) -> None:
+        pendientes, self._on_commit = self._on_commit, []
+        for callback, args in pendientes:
+            callback(*args)
+    
+    def finish(self, commit: bool) -> None:
+        """Confirmar o deshacer y devolver la conexión; los avisos se lanzan ya sin unidad"""
+        try:
+            if self.conn is not None and self.conn.in_transaction:
+                if commit:
+                    self.conn.commit()
+                else:
+                    self.conn.rollback()
+        finally:
+            self.close()
+        if commit:
+            self._run_on_commit()
+        self._on_commit = []
+    
+    def close(self) -> None:
+        """Devolver la conexión al pool (descarta lo no confirmado)"""
+        self.closed = True
+        if self.conn is not None:
+            self.conn.set_trace_callback(None)
+            self.pool.release(self.conn)
+            self.conn = None
 
 class DatabaseManager:
     """Gestor centralizado de base de datos"""
     
-    def __init__(self, db_path: str):
+    def __init__(self, db_path: str, pool: Optional[ConnectionPool] = None,
+                 unit_scope: Optional[Callable[[], Any]] = None, **pool_options):
         self.db_path = db_path
+        self.pool = pool or ConnectionPool(db_path, **pool_options)
+        # Capacidades opcionales de SQLite detectadas al migrar (p. ej. 'rtree')
+        self.features = set()
+        # Con unit_scope, las sentencias de cada ámbito (p. ej. la petición) comparten una
+        # UnitOfWork guardada como atributo db_unit del objeto que devuelve (None fuera de él)
+        self.unit_scope = unit_scope
+        self._unit_stats = {'unidades': 0, 'sentencias': 0, 'confirmadas': 0, 'deshechas': 0}
+        self._unit_lock = threading.Lock()
+    
+    @classmethod
+    def from_config(cls, config: Dict[str, Any]) -> 'DatabaseManager':
+        """Crear gestor con el pool configurado desde la configuración de Flask"""
+        return cls(
+            config['DATABASE_PATH'],
+            max_size=config.get('DB_POOL_SIZE', 8),
+            cache_size_kb=config.get('DB_CACHE_SIZE_KB', 16384),
+            mmap_size=config.get('DB_MMAP_SIZE', 134217728),
+            statement_cache=config.get('DB_STATEMENT_CACHE', 256),
+            busy_timeout_ms=config.get('DB_BUSY_TIMEOUT_MS', 5000)
+        )
+    
+    def detached(self) -> 'DatabaseManager':
+        """Gestor sobre el mismo pool que nunca se une a la unidad de la petición
+        
+        Para quien mantiene estado entre peticiones (motor de grafo, SSE) o
+        gestiona sus propias transacciones (importación, exportación).
+        """
+        manager = DatabaseManager(self.db_path, pool=self.pool)
+        manager.features = self.features
+        return manager
+    
+    def _scope(self) -> Any:
+        return self.unit_scope() if self.unit_scope is not None else None
+    
+    def current_unit(self) -> Optional[UnitOfWork]:
+        """Unidad de trabajo del ámbito en curso (se crea con la primera sentencia)"""
+        scope = self._scope()
+        if scope is None:
+            return None
+        unit = getattr(scope, 'db_unit', None)
+        if unit is None:
+            unit = scope.db_unit = UnitOfWork(self.pool)
+        return None if unit.closed or unit.pool is not self.pool else unit
+    
+    def finish_unit(self, commit: bool) -> Optional[UnitOfWork]:
+        """Confirmar o deshacer la unidad del ámbito y devolver su conexión al pool"""
+        unit = getattr(self._scope(), 'db_unit', None)
+        if unit is None or unit.closed or unit.pool is not self.pool:
+            return None
+        try:
+            unit.finish(commit)
+        except Exception:
+            commit = False
+            raise
+        finally:
+            with self._unit_lock:
+                self._unit_stats['unidades'] += 1
+                self._unit_stats['sentencias'] += unit.statements
+                self._unit_stats['confirmadas' if commit else 'deshechas'] += 1
+        return unit
+    
+    @contextmanager
+    def commit_point(self):
+        """Bloque que empieza con una instantánea nueva y deja sus escrituras confirmadas
+        
+        Dentro de una unidad de trabajo confirma lo pendiente al entrar y al
+        salir; fuera de ella cada sentencia ya se confirma por sí sola.
+        """
+        unit = self.current_unit()
+        if unit is not None:
+            unit.commit()
+        yield
+        if unit is not None:
+            unit.commit()
     
     @contextmanager
     def get_connection(self):
         """Context manager para conexiones a la base de datos"""
-        conn = sqlite3.connect(self.db_path)
-        conn.row_factory = sqlite3.Row
+        unit = self.current_unit()
+        if unit is not None:
+            yield unit.connection()
+            return
+        conn = self.pool.acquire()
         try:
             yield conn
         finally:
-            conn.close()
+            self.pool.release(conn)
+    
+    @contextmanager
+    def transaction(self, immediate: bool = False):
+        """Context manager que agrupa varias sentencias en una única transacción
+        
+        Con immediate=True se toma el bloqueo de escritura al empezar, de modo
+        que las lecturas de la transacción no pueden quedar desfasadas. Dentro
+        de una unidad de trabajo es un SAVEPOINT que se confirma con la petición,
+        y el bloqueo de escritura se toma al entrar en el primero.
+        """
+        unit = self.current_unit()
+        if unit is not None:
+            conn = unit.connection(write=True)
+            nombre = unit.savepoint()
+            conn.execute(f'SAVEPOINT {nombre}')
+            try:
+                yield conn
+                conn.execute(f'RELEASE {nombre}')
+            except Exception:
+                conn.execute(f'ROLLBACK TO {nombre}')
+                conn.execute(f'RELEASE {nombre}')
+                raise
+            return
+    
+        with self.get_connection() as conn:
+            try:
+                if immediate:
+                    conn.execute('BEGIN IMMEDIATE')
+                yield conn
+                conn.commit()
+            except Exception:
+                conn.rollback()
+                raise
+    
+    def database_exists(self) -> bool:
+        """Comprobar si la base de datos ya fue creada"""
+        if self.pool.is_memory:
+            row = self.execute_single(
+                "SELECT name FROM sqlite_master WHERE type = 'table' AND name = 'personas'"
+            )
+            return row is not None
+        return Path(self.db_path).exists()
+    
+    def pool_stats(self) -> Dict[str, Any]:
+        """Estadísticas del pool de conexiones y de las unidades de trabajo"""
+        with self._unit_lock:
+            unidades = dict(self._unit_stats)
+        return {**self.pool.stats(), 'unidades_de_trabajo': unidades}
+    
+    def close(self) -> None:
+        """Cerrar el pool de conexiones"""
+        self.pool.close()
     
     def execute_query(self, query: str, params: tuple = ()) -> List[sqlite3.Row]:
         """Ejecutar consulta SELECT"""
         with self.get_connection() as conn:
             return conn.execute(query, params).fetchall()
     
+    def execute_records(self, query: str, params: tuple, from_rows: Callable[[List[tuple], dict], list],
+                        lote: int = 1000) -> list:
+        """Ejecutar un SELECT construyendo registros lote a lote desde tuplas
+        
+        Nunca están todas las filas en memoria a la vez, y el diccionario de
+        textos compartido entre lotes hace que los valores repetidos sean un
+        único objeto.
+        """
+        registros, textos = [], {}
+        with self.get_connection() as conn:
+            cursor = tuple_cursor(conn).execute(query, params)
+            while True:
+                rows = cursor.fetchmany(lote)
+                if not rows:
+                    return registros
+                registros.extend(from_rows(rows, textos))
+    
     def execute_single(self, query: str, params: tuple = ()) -> Optional[sqlite3.Row]:
         """Ejecutar consulta que devuelve un solo resultado"""
         with self.get_connection() as conn:
@@ -35,105 +412,32 @@ class DatabaseManager:
     
     def execute_insert(self, query: str, params: tuple = ()) -> int:
         """Ejecutar INSERT y devolver el ID generado"""
-        with self.get_connection() as conn:
+        with self.transaction() as conn:
             cursor = conn.cursor()
             cursor.execute(query, params)
-            conn.commit()
             return cursor.lastrowid
     
     def execute_update(self, query: str, params: tuple = ()) -> int:
         """Ejecutar UPDATE/DELETE y devolver filas afectadas"""
-        with self.get_connection() as conn:
+        with self.transaction() as conn:
             cursor = conn.cursor()
             cursor.execute(query, params)
-            conn.commit()
             return cursor.rowcount
     
     def execute_many(self, query: str, params_list: List[tuple]) -> None:
         """Ejecutar múltiples operaciones"""
-        with self.get_connection() as conn:
+        with self.transaction() as conn:
             conn.executemany(query, params_list)
-            conn.commit()
 
-def init_db(db_path: str) -> None:
-    """Inicializar la base de datos con las tablas necesarias"""
-    print("🔧 Inicializando base de datos empresarial...")
-    
-    # Eliminar archivo de base de datos si existe (solo para desarrollo)
-    if Path(db_path).exists():
-        Path(db_path).unlink()
-        print("🗑️ Base de datos anterior eliminada")
-    
-    db_manager = DatabaseManager(db_path)
-    
-    with db_manager.get_connection() as conn:
-        cursor = conn.cursor()
-        
-        # Tabla de personas
-        cursor.execute('''
-            CREATE TABLE personas (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                nombre TEXT NOT NULL UNIQUE,
-                icono TEXT DEFAULT 'user',
-                grupo TEXT DEFAULT 'contactos',
-                color TEXT DEFAULT '#3b82f6',
-                descripcion TEXT,
-                posicion_x REAL,
-                posicion_y REAL,
-                imagen_url TEXT,
-                fecha_creacion TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-            )
-        ''')
-        
-        # Tabla de relaciones
-        cursor.execute('''
-            CREATE TABLE relaciones (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                persona1_id INTEGER,
-                persona2_id INTEGER,
-                tipo TEXT DEFAULT 'profesional',
-                fortaleza INTEGER DEFAULT 5,
-                contexto TEXT,
-                fecha_creacion TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                FOREIGN KEY (persona1_id) REFERENCES personas (id),
-                FOREIGN KEY (persona2_id) REFERENCES personas (id),
-                UNIQUE(persona1_id, persona2_id)
-            )
-        ''')
-        
-        # Datos iniciales
-        personas_iniciales = [
-            ('Usuario Principal', 'target', 'centro', '#1e3a8a', 'Centro de la red organizacional'),
-            ('Ana García', 'family', 'equipo_directo', '#10b981', 'Gerente de Proyectos - Equipo directo'),
-            ('Carlos Mendez', 'briefcase', 'departamento', '#3b82f6', 'Desarrollador Senior - Mismo departamento'),
-            ('María López', 'academic', 'colaboradores', '#f59e0b', 'Analista de Datos - Colaboradora frecuente'),
-            ('David Rodríguez', 'briefcase', 'otros_departamentos', '#ef4444', 'Especialista en Marketing - Otros departamentos'),
-            ('Laura Fernández', 'home', 'externos', '#8b5cf6', 'Consultora Externa - Proveedora de servicios')
-        ]
-        
-        cursor.executemany(
-            'INSERT INTO personas (nombre, icono, grupo, color, descripcion) VALUES (?, ?, ?, ?, ?)',
-            personas_iniciales
-        )
-        
-        relaciones_iniciales = [
-            (1, 2, 'supervision_directa', 9, 'Relación supervisor-colaborador directo'),
-            (1, 3, 'colaboracion_estrecha', 7, 'Trabajo conjunto en proyectos principales'),
-            (1, 4, 'colaboracion_regular', 8, 'Intercambio frecuente de información'),
-            (1, 5, 'colaboracion_interdepartamental', 6, 'Coordinación entre departamentos'),
-            (1, 6, 'relacion_externa', 8, 'Proveedor de servicios estratégico'),
-            (2, 4, 'colaboracion_proyecto', 7, 'Trabajo conjunto en análisis de datos'),
-            (3, 5, 'coordinacion_ocasional', 4, 'Coordinación esporádica en campañas')
-        ]
-        
-        cursor.executemany(
-            'INSERT INTO relaciones (persona1_id, persona2_id, tipo, fortaleza, contexto) VALUES (?, ?, ?, ?, ?)',
-            relaciones_iniciales
-        )
-        
-        conn.commit()
-    
-    print("✅ Base de datos inicializada con datos profesionales")
+def tuple_cursor(conn: sqlite3.Connection) -> sqlite3.Cursor:
+    """Cursor que devuelve tuplas aunque la conexión use sqlite3.Row"""
+    cursor = conn.cursor()
+    cursor.row_factory = None
+    return cursor
+
+def get_db_manager(app) -> DatabaseManager:
+    """Obtener el gestor de base de datos compartido por la aplicación"""
+    return app.extensions['db_manager']
 
 def create_images_directory(images_folder: Path) -> None:
     """Crear directorio de imágenes si no existe"""
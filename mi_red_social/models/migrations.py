@@ -0,0 +1,268 @@
+# =================================================================
+# models/migrations.py - Migraciones versionadas del esquema
+# =================================================================
+
+import sqlite3
+from typing import Callable, List, Tuple
+from models.database import DatabaseManager
+
+# La versión aplicada se guarda en PRAGMA user_version. Cada migración debe ser
+# idempotente: las bases creadas antes de este sistema parten de la versión 0
+# pero ya pueden tener parte del esquema.
+
+def _esquema_inicial(conn: sqlite3.Connection) -> None:
+    """Tablas base y datos iniciales (solo si la base está vacía)"""
+    existe = conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'personas'"
+    ).fetchone()
+    if existe:
+        return
+
+    print("🔧 Inicializando base de datos empresarial...")
+    conn.execute('''
+        CREATE TABLE personas (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            nombre TEXT NOT NULL UNIQUE,
+            icono TEXT DEFAULT 'user',
+            grupo TEXT DEFAULT 'contactos',
+            color TEXT DEFAULT '#3b82f6',
+            descripcion TEXT,
+            posicion_x REAL,
+            posicion_y REAL,
+            imagen_url TEXT,
+            fecha_creacion TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+    conn.execute('''
+        CREATE TABLE relaciones (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            persona1_id INTEGER,
+            persona2_id INTEGER,
+            tipo TEXT DEFAULT 'profesional',
+            fortaleza INTEGER DEFAULT 5,
+            contexto TEXT,
+            fecha_creacion TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (persona1_id) REFERENCES personas (id),
+            FOREIGN KEY (persona2_id) REFERENCES personas (id),
+            UNIQUE(persona1_id, persona2_id)
+        )
+    ''')
+
+    personas_iniciales = [
+        ('Usuario Principal', 'target', 'centro', '#1e3a8a', 'Centro de la red organizacional'),
+        ('Ana García', 'family', 'equipo_directo', '#10b981', 'Gerente de Proyectos - Equipo directo'),
+        ('Carlos Mendez', 'briefcase', 'departamento', '#3b82f6', 'Desarrollador Senior - Mismo departamento'),
+        ('María López', 'academic', 'colaboradores', '#f59e0b', 'Analista de Datos - Colaboradora frecuente'),
+        ('David Rodríguez', 'briefcase', 'otros_departamentos', '#ef4444', 'Especialista en Marketing - Otros departamentos'),
+        ('Laura Fernández', 'home', 'externos', '#8b5cf6', 'Consultora Externa - Proveedora de servicios')
+    ]
+    conn.executemany(
+        'INSERT INTO personas (nombre, icono, grupo, color, descripcion) VALUES (?, ?, ?, ?, ?)',
+        personas_iniciales
+    )
+
+    relaciones_iniciales = [
+        (1, 2, 'supervision_directa', 9, 'Relación supervisor-colaborador directo'),
+        (1, 3, 'colaboracion_estrecha', 7, 'Trabajo conjunto en proyectos principales'),
+        (1, 4, 'colaboracion_regular', 8, 'Intercambio frecuente de información'),
+        (1, 5, 'colaboracion_interdepartamental', 6, 'Coordinación entre departamentos'),
+        (1, 6, 'relacion_externa', 8, 'Proveedor de servicios estratégico'),
+        (2, 4, 'colaboracion_proyecto', 7, 'Trabajo conjunto en análisis de datos'),
+        (3, 5, 'coordinacion_ocasional', 4, 'Coordinación esporádica en campañas')
+    ]
+    conn.executemany(
+        'INSERT INTO relaciones (persona1_id, persona2_id, tipo, fortaleza, contexto) VALUES (?, ?, ?, ?, ?)',
+        relaciones_iniciales
+    )
+    print("✅ Base de datos inicializada con datos profesionales")
+
+def _log_de_cambios(conn: sqlite3.Connection) -> None:
+    """Log de cambios del grafo (feed incremental, SSE y motor en memoria)"""
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS cambios_grafo (
+            seq INTEGER PRIMARY KEY AUTOINCREMENT,
+            entidad TEXT NOT NULL,
+            entidad_id INTEGER NOT NULL,
+            operacion TEXT NOT NULL,
+            fecha TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+
+def _posicion_fija(conn: sqlite3.Connection) -> None:
+    """Posiciones calculadas por el layout del servidor (vis.js no les aplica física)"""
+    columnas = {row[1] for row in conn.execute('PRAGMA table_info(personas)')}
+    if 'posicion_fija' not in columnas:
+        conn.execute('ALTER TABLE personas ADD COLUMN posicion_fija INTEGER DEFAULT 0')
+
+def _indices_relaciones(conn: sqlite3.Connection) -> None:
+    """Índices de adyacencia no dirigida (cubren vecinos y fortaleza) y de listados"""
+    conn.execute('''
+        CREATE INDEX IF NOT EXISTS idx_relaciones_persona1
+        ON relaciones (persona1_id, persona2_id, fortaleza)
+    ''')
+    conn.execute('''
+        CREATE INDEX IF NOT EXISTS idx_relaciones_persona2
+        ON relaciones (persona2_id, persona1_id, fortaleza)
+    ''')
+    # Listado paginado: ORDER BY fecha_creacion DESC, id DESC (con y sin filtro por tipo)
+    conn.execute('''
+        CREATE INDEX IF NOT EXISTS idx_relaciones_fecha
+        ON relaciones (fecha_creacion, id)
+    ''')
+    conn.execute('''
+        CREATE INDEX IF NOT EXISTS idx_relaciones_tipo_fecha
+        ON relaciones (tipo, fecha_creacion, id)
+    ''')
+
+def _indices_personas(conn: sqlite3.Connection) -> None:
+    """Filtro por grupo ordenado por nombre (ORDER BY nombre ya usa el índice UNIQUE)"""
+    conn.execute('''
+        CREATE INDEX IF NOT EXISTS idx_personas_grupo_nombre
+        ON personas (grupo, nombre)
+    ''')
+
+def _relaciones_on_delete_cascade(conn: sqlite3.Connection) -> None:
+    """Reconstruir relaciones con claves foráneas ON DELETE CASCADE"""
+    sql = conn.execute(
+        "SELECT sql FROM sqlite_master WHERE type = 'table' AND name = 'relaciones'"
+    ).fetchone()[0]
+    if 'ON DELETE CASCADE' in sql.upper():
+        return
+
+    conn.execute('''
+        CREATE TABLE relaciones_nueva (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            persona1_id INTEGER NOT NULL,
+            persona2_id INTEGER NOT NULL,
+            tipo TEXT DEFAULT 'profesional',
+            fortaleza INTEGER DEFAULT 5,
+            contexto TEXT,
+            fecha_creacion TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (persona1_id) REFERENCES personas (id) ON DELETE CASCADE,
+            FOREIGN KEY (persona2_id) REFERENCES personas (id) ON DELETE CASCADE,
+            UNIQUE(persona1_id, persona2_id)
+        )
+    ''')
+
+    # Las relaciones huérfanas (persona ya borrada) no sobreviven a la migración
+    conn.execute('''
+        INSERT INTO relaciones_nueva (id, persona1_id, persona2_id, tipo, fortaleza, contexto, fecha_creacion)
+        SELECT id, persona1_id, persona2_id, tipo, fortaleza, contexto, fecha_creacion
+        FROM relaciones
+        WHERE persona1_id IN (SELECT id FROM personas)
+          AND persona2_id IN (SELECT id FROM personas)
+    ''')
+    huerfanas = [row[0] for row in conn.execute(
+        'SELECT id FROM relaciones WHERE id NOT IN (SELECT id FROM relaciones_nueva)'
+    )]
+
+    # Conservar el contador AUTOINCREMENT para no reutilizar ids ya publicados
+    secuencia = conn.execute("SELECT seq FROM sqlite_sequence WHERE name = 'relaciones'").fetchone()
+    conn.execute('DROP TABLE relaciones')
+    conn.execute('ALTER TABLE relaciones_nueva RENAME TO relaciones')
+    if secuencia:
+        conn.execute("UPDATE sqlite_sequence SET seq = MAX(seq, ?) WHERE name = 'relaciones'", (secuencia[0],))
+        conn.execute('''
+            INSERT INTO sqlite_sequence (name, seq)
+            SELECT 'relaciones', ? WHERE NOT EXISTS (SELECT 1 FROM sqlite_sequence WHERE name = 'relaciones')
+        ''', (secuencia[0],))
+
+    _indices_relaciones(conn)
+    if conn.execute('PRAGMA foreign_key_check(relaciones)').fetchone():
+        raise sqlite3.IntegrityError('Quedan relaciones con claves foráneas rotas')
+    if huerfanas:
+        conn.executemany(
+            "INSERT INTO cambios_grafo (entidad, entidad_id, operacion) VALUES ('relacion', ?, 'eliminar')",
+            [(relacion_id,) for relacion_id in huerfanas]
+        )
+        print(f"🗑️ {len(huerfanas)} relaciones huérfanas eliminadas")
+
+def _indice_espacial(conn: sqlite3.Connection) -> None:
+    """Índice espacial de posiciones (si SQLite se compiló con R*Tree)"""
+    try:
+        conn.execute('''
+            CREATE VIRTUAL TABLE IF NOT EXISTS personas_rtree
+            USING rtree(id, min_x, max_x, min_y, max_y)
+        ''')
+    except sqlite3.OperationalError as e:
+        print(f"⚠️ R*Tree no disponible, consultas por área sin índice espacial: {e}")
+        return
+    conn.execute('''
+        INSERT INTO personas_rtree (id, min_x, max_x, min_y, max_y)
+        SELECT id, posicion_x, posicion_x, posicion_y, posicion_y
+        FROM personas
+        WHERE posicion_x IS NOT NULL AND posicion_y IS NOT NULL
+          AND id NOT IN (SELECT id FROM personas_rtree)
+    ''')
+
+def _indice_imagenes(conn: sqlite3.Connection) -> None:
+    """Recuento de referencias a cada imagen del almacén por contenido"""
+    conn.execute('''
+        CREATE INDEX IF NOT EXISTS idx_personas_imagen
+        ON personas (imagen_url) WHERE imagen_url IS NOT NULL
+    ''')
+
+# (versión, descripción, función). Solo se añaden al final; nunca se reordenan.
+MIGRACIONES: List[Tuple[int, str, Callable[[sqlite3.Connection], None]]] = [
+    (1, 'esquema inicial', _esquema_inicial),
+    (2, 'log de cambios del grafo', _log_de_cambios),
+    (3, 'personas.posicion_fija', _posicion_fija),
+    (4, 'índices de relaciones', _indices_relaciones),
+    (5, 'índices de personas', _indices_personas),
+    (6, 'relaciones con ON DELETE CASCADE', _relaciones_on_delete_cascade),
+    (7, 'índice espacial R*Tree', _indice_espacial),
+    (8, 'índice de referencias a imágenes', _indice_imagenes),
+]
+
+def schema_version(db_manager: DatabaseManager) -> int:
+    """Versión de esquema aplicada"""
+    return db_manager.execute_single('PRAGMA user_version')[0]
+
+def migrate(db_manager: DatabaseManager) -> List[int]:
+    """Aplicar las migraciones pendientes, cada una en su propia transacción"""
+    aplicadas = []
+    with db_manager.get_connection() as conn:
+        actual = conn.execute('PRAGMA user_version').fetchone()[0]
+        pendientes = [m for m in MIGRACIONES if m[0] > actual]
+
+        # Las reconstrucciones de tablas requieren las claves foráneas desactivadas
+        # (el PRAGMA no tiene efecto dentro de una transacción)
+        conn.execute('PRAGMA foreign_keys = OFF')
+        try:
+            for version, descripcion, aplicar in pendientes:
+                conn.execute('BEGIN IMMEDIATE')
+                try:
+                    aplicar(conn)
+                    conn.execute(f'PRAGMA user_version = {int(version)}')
+                    conn.commit()
+                except Exception:
+                    conn.rollback()
+                    print(f"❌ Error en la migración {version} ({descripcion})")
+                    raise
+                aplicadas.append(version)
+                print(f"✅ Migración {version} aplicada: {descripcion}")
+        finally:
+            conn.execute('PRAGMA foreign_keys = ON')
+
+        # Estadísticas para el planificador tras cambiar índices
+        if aplicadas:
+            conn.execute('ANALYZE')
+            conn.commit()
+
+        if conn.execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'personas_rtree'"
+        ).fetchone():
+            db_manager.features.add('rtree')
+
+        # JSON1 viene de serie desde SQLite 3.38, pero puede faltar en compilaciones antiguas;
+        # el payload SQL del grafo usa además IIF (3.32) y AS MATERIALIZED (3.35)
+        try:
+            conn.execute("""
+                WITH t(k, v) AS MATERIALIZED (SELECT key, value FROM json_each('{"a": 1}'))
+                SELECT json_group_array(json_patch('{}', json_object(k, IIF(v > 0, v, NULL)))) FROM t
+            """).fetchone()
+            db_manager.features.add('json')
+        except sqlite3.OperationalError:
+            pass
+
+    return aplicadas
@@ -2,13 +2,17 @@
 # models/persona.py - Modelo Persona
 # =================================================================
 
-from dataclasses import dataclass
-from typing import Optional, List, Dict, Any
-from models.database import DatabaseManager
+import sqlite3
+from dataclasses import dataclass, fields
+from typing import Optional, List, Dict, Any, Iterator
+from models.database import DatabaseManager, tuple_cursor
+from models.registro import slotted, columnas
+from models.cambio import ChangeLogRepository, ENTIDAD_PERSONA
 
+@slotted
 @dataclass
 class Persona:
-    """Modelo de datos para Persona"""
+    """Modelo de datos para Persona (con __slots__: sin diccionario por instancia)"""
     id: Optional[int] = None
     nombre: str = ""
     icono: str = "user"
@@ -19,6 +23,7 @@ class Persona:
     posicion_y: Optional[float] = None
     imagen_url: Optional[str] = None
     fecha_creacion: Optional[str] = None
+    posicion_fija: bool = False
     
     def to_dict(self) -> Dict[str, Any]:
         """Convertir a diccionario"""
@@ -32,81 +37,275 @@ class Persona:
             'posicion_x': self.posicion_x,
             'posicion_y': self.posicion_y,
             'imagen_url': self.imagen_url,
-            'fecha_creacion': self.fecha_creacion
+            'fecha_creacion': self.fecha_creacion,
+            'posicion_fija': self.posicion_fija
         }
     
     @classmethod
     def from_row(cls, row: Any) -> 'Persona':
-        """Crear instancia desde fila de base de datos"""
-        return cls(
-            id=row['id'] if row else None,
-            nombre=row['nombre'] if row else "",
-            icono=row['icono'] if row else "user",
-            grupo=row['grupo'] if row else "contactos",
-            color=row['color'] if row else "#3b82f6",
-            descripcion=row['descripcion'] if row else "",
-            posicion_x=row['posicion_x'] if row and row['posicion_x'] is not None else None,
-            posicion_y=row['posicion_y'] if row and row['posicion_y'] is not None else None,
-            imagen_url=row['imagen_url'] if row else None,
-            fecha_creacion=row['fecha_creacion'] if row else None
-        )
+        """Crear instancia desde una fila (tupla o sqlite3.Row) con las columnas en orden COLUMNAS_PERSONA"""
+        return cls(*row[:10], bool(row[10]))
+    
+    @classmethod
+    def from_rows(cls, rows: List[tuple], textos: Optional[dict] = None) -> List['Persona']:
+        """Crear muchas instancias de golpe (textos: cadenas ya vistas, para compartir las repetidas)"""
+        # icono, grupo, color, imagen y fecha se repiten mucho: se guarda una sola copia de cada valor
+        texto = (textos if textos is not None else {}).setdefault
+        return [cls(id_, nombre, texto(icono, icono), texto(grupo, grupo), texto(color, color), descripcion,
+                    x, y, texto(imagen, imagen), texto(fecha, fecha), bool(fija))
+                for id_, nombre, icono, grupo, color, descripcion, x, y, imagen, fecha, fija in rows]
+
+# Orden posicional de las columnas: coincide con el de los campos de Persona
+COLUMNAS_PERSONA = tuple(f.name for f in fields(Persona))
+SELECT_PERSONA = columnas(COLUMNAS_PERSONA)
+SELECT_PERSONA_P = columnas(COLUMNAS_PERSONA, 'p')
 
 class PersonaRepository:
     """Repositorio para operaciones con Personas"""
     
+    # Máximo de parámetros por consulta IN (límite de SQLite)
+    LOTE_IDS = 900
+    
     def __init__(self, db_manager: DatabaseManager):
         self.db = db_manager
+        self.changelog = ChangeLogRepository(db_manager)
     
     def get_all(self) -> List[Persona]:
         """Obtener todas las personas"""
-        rows = self.db.execute_query('SELECT * FROM personas ORDER BY nombre')
-        return [Persona.from_row(row) for row in rows]
+        return self.db.execute_records(f'SELECT {SELECT_PERSONA} FROM personas ORDER BY nombre', (),
+                                       Persona.from_rows)
+    
+    def iter_all(self, conn: sqlite3.Connection, lote: int = 1000) -> Iterator[Persona]:
+        """Recorrer todas las personas por id leyendo del cursor en lotes"""
+        cursor = tuple_cursor(conn).execute(f'SELECT {SELECT_PERSONA} FROM personas ORDER BY id')
+        while True:
+            rows = cursor.fetchmany(lote)
+            if not rows:
+                return
+            yield from Persona.from_rows(rows)
+    
+    def get_page(self, after: Optional[str] = None, limit: int = 50,
+                 grupo: Optional[str] = None, prefijo: Optional[str] = None) -> List[Persona]:
+        """Obtener una página de personas ordenadas por nombre (paginación por cursor)"""
+        where, params = self._filtros(grupo, prefijo)
+        if after is not None:
+            where.append('nombre > ?')
+            params.append(after)
+        
+        sql = f'SELECT {SELECT_PERSONA} FROM personas'
+        if where:
+            sql += ' WHERE ' + ' AND '.join(where)
+        sql += ' ORDER BY nombre LIMIT ?'
+        params.append(limit)
+        
+        return self.db.execute_records(sql, tuple(params), Persona.from_rows)
+    
+    def count(self, grupo: Optional[str] = None, prefijo: Optional[str] = None) -> int:
+        """Contar personas que cumplen los filtros"""
+        where, params = self._filtros(grupo, prefijo)
+        sql = 'SELECT COUNT(*) FROM personas'
+        if where:
+            sql += ' WHERE ' + ' AND '.join(where)
+        return self.db.execute_single(sql, tuple(params))[0]
+    
+    def _filtros(self, grupo: Optional[str], prefijo: Optional[str]):
+        """Construir las condiciones WHERE comunes de listados"""
+        where, params = [], []
+        if grupo:
+            where.append('grupo = ?')
+            params.append(grupo)
+        if prefijo:
+            # Rango sobre el índice único de nombre en lugar de LIKE
+            where.append('nombre >= ? AND nombre < ?')
+            params.extend([prefijo, prefijo + '\U0010ffff'])
+        return where, params
+    
+    def get_in_bbox(self, x1: float, y1: float, x2: float, y2: float) -> List[Persona]:
+        """Obtener las personas cuya posición cae dentro del rectángulo"""
+        if 'rtree' in self.db.features:
+            # El R*Tree guarda float32 redondeando hacia fuera: se refina con las columnas reales
+            return self.db.execute_records(f'''
+                SELECT {SELECT_PERSONA_P} FROM personas_rtree t
+                JOIN personas p ON p.id = t.id
+                WHERE t.min_x <= ? AND t.max_x >= ? AND t.min_y <= ? AND t.max_y >= ?
+                  AND p.posicion_x BETWEEN ? AND ? AND p.posicion_y BETWEEN ? AND ?
+            ''', (x2, x1, y2, y1, x1, x2, y1, y2), Persona.from_rows)
+        return self.db.execute_records(f'''
+            SELECT {SELECT_PERSONA} FROM personas
+            WHERE posicion_x BETWEEN ? AND ? AND posicion_y BETWEEN ? AND ?
+        ''', (x1, x2, y1, y2), Persona.from_rows)
     
     def get_by_id(self, persona_id: int) -> Optional[Persona]:
         """Obtener persona por ID"""
-        row = self.db.execute_single('SELECT * FROM personas WHERE id = ?', (persona_id,))
+        row = self.db.execute_single(f'SELECT {SELECT_PERSONA} FROM personas WHERE id = ?', (persona_id,))
         return Persona.from_row(row) if row else None
     
+    def get_by_ids(self, persona_ids: List[int]) -> List[Persona]:
+        """Obtener varias personas por ID en lotes"""
+        personas = []
+        for i in range(0, len(persona_ids), self.LOTE_IDS):
+            lote = persona_ids[i:i + self.LOTE_IDS]
+            placeholders = ','.join('?' * len(lote))
+            personas.extend(self.db.execute_records(
+                f'SELECT {SELECT_PERSONA} FROM personas WHERE id IN ({placeholders})', tuple(lote),
+                Persona.from_rows
+            ))
+        return personas
+    
     def create(self, persona: Persona) -> int:
         """Crear nueva persona"""
-        return self.db.execute_insert('''
-            INSERT INTO personas (nombre, icono, grupo, color, descripcion)
-            VALUES (?, ?, ?, ?, ?)
-        ''', (persona.nombre, persona.icono, persona.grupo, persona.color, persona.descripcion))
+        with self.db.transaction() as conn:
+            cursor = conn.execute('''
+                INSERT INTO personas (nombre, icono, grupo, color, descripcion)
+                VALUES (?, ?, ?, ?, ?)
+            ''', (persona.nombre, persona.icono, persona.grupo, persona.color, persona.descripcion))
+            self.changelog.record(conn, ENTIDAD_PERSONA, [cursor.lastrowid], 'crear')
+            return cursor.lastrowid
+    
+    def get_ids_by_names(self, nombres: List[str]) -> Dict[str, int]:
+        """Resolver nombres a ids en lotes (los que no existen no aparecen)"""
+        ids = {}
+        for i in range(0, len(nombres), self.LOTE_IDS):
+            lote = nombres[i:i + self.LOTE_IDS]
+            placeholders = ','.join('?' * len(lote))
+            rows = self.db.execute_query(
+                f'SELECT id, nombre FROM personas WHERE nombre IN ({placeholders})', tuple(lote)
+            )
+            ids.update((row['nombre'], row['id']) for row in rows)
+        return ids
+    
+    def create_many(self, personas: List[Persona]) -> Dict[str, int]:
+        """Crear varias personas en una transacción; devuelve nombre -> id de las insertadas
+        
+        Las que chocan con un nombre existente se ignoran y no aparecen en el resultado.
+        """
+        params = [(p.nombre, p.icono, p.grupo, p.color, p.descripcion) for p in personas]
+        with self.db.transaction(immediate=True) as conn:
+            # Con el bloqueo de escritura tomado, todo id por encima del máximo es nuestro
+            ultimo = conn.execute('SELECT COALESCE(MAX(id), 0) FROM personas').fetchone()[0]
+            conn.executemany('''
+                INSERT OR IGNORE INTO personas (nombre, icono, grupo, color, descripcion)
+                VALUES (?, ?, ?, ?, ?)
+            ''', params)
+            creadas = {row[1]: row[0] for row in conn.execute(
+                'SELECT id, nombre FROM personas WHERE id > ?', (ultimo,)
+            )}
+            self.changelog.record(conn, ENTIDAD_PERSONA, creadas.values(), 'crear')
+        return creadas
     
     def update(self, persona: Persona) -> bool:
         """Actualizar persona"""
-        affected = self.db.execute_update('''
-            UPDATE personas 
-            SET nombre = ?, icono = ?, grupo = ?, color = ?, descripcion = ?, 
-                posicion_x = ?, posicion_y = ?, imagen_url = ?
-            WHERE id = ?
-        ''', (persona.nombre, persona.icono, persona.grupo, persona.color, 
-              persona.descripcion, persona.posicion_x, persona.posicion_y, 
-              persona.imagen_url, persona.id))
+        with self.db.transaction() as conn:
+            affected = conn.execute('''
+                UPDATE personas 
+                SET nombre = ?, icono = ?, grupo = ?, color = ?, descripcion = ?, 
+                    posicion_x = ?, posicion_y = ?, imagen_url = ?
+                WHERE id = ?
+            ''', (persona.nombre, persona.icono, persona.grupo, persona.color, 
+                  persona.descripcion, persona.posicion_x, persona.posicion_y, 
+                  persona.imagen_url, persona.id)).rowcount
+            if affected:
+                if persona.posicion_x is not None and persona.posicion_y is not None:
+                    self._index_positions(conn, [(persona.posicion_x, persona.posicion_y, persona.id)])
+                else:
+                    self._unindex(conn, [persona.id])
+                self.changelog.record(conn, ENTIDAD_PERSONA, [persona.id], 'actualizar')
         return affected > 0
     
     def delete(self, persona_id: int) -> bool:
         """Eliminar persona"""
-        affected = self.db.execute_update('DELETE FROM personas WHERE id = ?', (persona_id,))
+        with self.db.transaction() as conn:
+            affected = conn.execute('DELETE FROM personas WHERE id = ?', (persona_id,)).rowcount
+            if affected:
+                self._unindex(conn, [persona_id])
+                self.changelog.record(conn, ENTIDAD_PERSONA, [persona_id], 'eliminar')
         return affected > 0
     
-    def update_positions(self, positions: Dict[int, Dict[str, float]]) -> int:
-        """Actualizar posiciones de múltiples personas"""
+    def update_positions(self, positions: Dict[int, Dict[str, float]], fija: Optional[bool] = None) -> int:
+        """Actualizar posiciones de múltiples personas (fija marca las calculadas por el layout)"""
         params = [(pos['x'], pos['y'], node_id) for node_id, pos in positions.items()]
-        self.db.execute_many('UPDATE personas SET posicion_x = ?, posicion_y = ? WHERE id = ?', params)
+        with self.db.transaction() as conn:
+            if fija is None:
+                conn.executemany('UPDATE personas SET posicion_x = ?, posicion_y = ? WHERE id = ?', params)
+            else:
+                conn.executemany(
+                    'UPDATE personas SET posicion_x = ?, posicion_y = ?, posicion_fija = ? WHERE id = ?',
+                    [(x, y, int(fija), node_id) for x, y, node_id in params]
+                )
+            self._index_positions(conn, params)
+            self.changelog.record(conn, ENTIDAD_PERSONA, positions.keys(), 'posicion')
         return len(params)
     
     def update_groups(self, updates: List[Dict[str, Any]]) -> int:
         """Actualizar grupos de múltiples personas"""
         params = [(update['grupo'], update['id']) for update in updates if 'id' in update]
-        self.db.execute_many('UPDATE personas SET grupo = ? WHERE id = ?', params)
+        with self.db.transaction() as conn:
+            conn.executemany('UPDATE personas SET grupo = ? WHERE id = ?', params)
+            self.changelog.record(conn, ENTIDAD_PERSONA, [persona_id for _, persona_id in params], 'grupo')
         return len(params)
     
     def update_image(self, persona_id: int, image_url: Optional[str]) -> bool:
         """Actualizar imagen de persona"""
-        affected = self.db.execute_update(
-            'UPDATE personas SET imagen_url = ? WHERE id = ?',
-            (image_url, persona_id)
+        with self.db.transaction() as conn:
+            affected = conn.execute(
+                'UPDATE personas SET imagen_url = ? WHERE id = ?',
+                (image_url, persona_id)
+            ).rowcount
+            if affected:
+                self.changelog.record(conn, ENTIDAD_PERSONA, [persona_id], 'imagen')
+        return affected > 0
+    
+    def update_images(self, images: Dict[int, Optional[str]]) -> int:
+        """Actualizar la imagen de varias personas en una sola transacción"""
+        params = [(image_url, persona_id) for persona_id, image_url in images.items()]
+        with self.db.transaction() as conn:
+            conn.executemany('UPDATE personas SET imagen_url = ? WHERE id = ?', params)
+            self.changelog.record(conn, ENTIDAD_PERSONA, images.keys(), 'imagen')
+        return len(params)
+    
+    def clear_images(self, images: Dict[int, str]) -> int:
+        """Quitar la imagen a las personas que aún tienen la URL indicada (las cambiadas se respetan)"""
+        with self.db.transaction() as conn:
+            ids = [persona_id for persona_id, image_url in images.items()
+                   if conn.execute('UPDATE personas SET imagen_url = NULL WHERE id = ? AND imagen_url = ?',
+                                   (persona_id, image_url)).rowcount]
+            self.changelog.record(conn, ENTIDAD_PERSONA, ids, 'imagen')
+        return len(ids)
+    
+    def get_image_refs(self, after_id: int = 0, limit: int = -1) -> List[tuple]:
+        """(id, imagen_url) de las personas con imagen, por id (limit=-1 para todas)"""
+        rows = self.db.execute_query(
+            'SELECT id, imagen_url FROM personas WHERE imagen_url IS NOT NULL AND id > ? ORDER BY id LIMIT ?',
+            (after_id, limit)
         )
-        return affected > 0
\ No newline at end of file
+        return [(row[0], row[1]) for row in rows]
+    
+    def rename_image(self, old_url: str, new_url: str) -> int:
+        """Cambiar la URL de una imagen en todas las personas que la usan"""
+        with self.db.transaction() as conn:
+            ids = [row[0] for row in conn.execute('SELECT id FROM personas WHERE imagen_url = ?', (old_url,))]
+            conn.execute('UPDATE personas SET imagen_url = ? WHERE imagen_url = ?', (new_url, old_url))
+            self.changelog.record(conn, ENTIDAD_PERSONA, ids, 'imagen')
+        return len(ids)
+    
+    def count_image_refs(self, image_url: str) -> int:
+        """Número de personas que usan una imagen (contador de referencias del almacén)"""
+        return self.db.execute_single(
+            'SELECT COUNT(*) FROM personas WHERE imagen_url = ?', (image_url,)
+        )[0]
+    
+    def _index_positions(self, conn, params: List[tuple]) -> None:
+        """Mantener el R*Tree sincronizado con las posiciones (x, y, id)"""
+        if 'rtree' not in self.db.features:
+            return
+        # Solo se indexan ids que existen en personas
+        conn.executemany('''
+            INSERT OR REPLACE INTO personas_rtree (id, min_x, max_x, min_y, max_y)
+            SELECT id, posicion_x, posicion_x, posicion_y, posicion_y FROM personas WHERE id = ?
+        ''', [(node_id,) for _, _, node_id in params])
+    
+    def _unindex(self, conn, persona_ids: List[int]) -> None:
+        """Quitar personas del R*Tree"""
+        if 'rtree' not in self.db.features:
+            return
+        conn.executemany('DELETE FROM personas_rtree WHERE id = ?', [(pid,) for pid in persona_ids])
@@ -0,0 +1,21 @@
+# =================================================================
+# models/registro.py - Registros compactos para lecturas masivas
+# =================================================================
+
+from dataclasses import fields
+from typing import Type, TypeVar
+
+T = TypeVar('T')
+
+def slotted(cls: Type[T]) -> Type[T]:
+    """Rehacer una dataclass con __slots__ (dataclass(slots=True) solo existe desde Python 3.10)"""
+    campos = tuple(f.name for f in fields(cls))
+    # Los valores por defecto ya están en el __init__ generado: fuera de la clase chocarían con los slots
+    namespace = {k: v for k, v in cls.__dict__.items() if k not in campos + ('__dict__', '__weakref__')}
+    namespace['__slots__'] = campos
+    return type(cls)(cls.__name__, cls.__bases__, namespace)
+
+def columnas(nombres: tuple, alias: str = '') -> str:
+    """Lista de columnas para un SELECT en el orden del modelo (con prefijo de tabla opcional)"""
+    prefijo = f'{alias}.' if alias else ''
+    return ', '.join(prefijo + nombre for nombre in nombres)
@@ -2,13 +2,17 @@
 # models/relacion.py - Modelo Relación
 # =================================================================
 
-from dataclasses import dataclass
-from typing import Optional, List, Dict, Any
-from models.database import DatabaseManager
+import sqlite3
+from dataclasses import dataclass, fields
+from typing import Optional, List, Dict, Any, Tuple, Iterator
+from models.database import DatabaseManager, tuple_cursor
+from models.registro import slotted, columnas
+from models.cambio import ChangeLogRepository, ENTIDAD_RELACION
 
+@slotted
 @dataclass
 class Relacion:
-    """Modelo de datos para Relación"""
+    """Modelo de datos para Relación (con __slots__: sin diccionario por instancia)"""
     id: Optional[int] = None
     persona1_id: int = 0
     persona2_id: int = 0
@@ -35,58 +39,220 @@ class Relacion:
     
     @classmethod
     def from_row(cls, row: Any) -> 'Relacion':
-        """Crear instancia desde fila de base de datos"""
-        return cls(
-            id=row['id'],
-            persona1_id=row['persona1_id'],
-            persona2_id=row['persona2_id'],
-            tipo=row['tipo'],
-            fortaleza=row['fortaleza'],
-            contexto=row['contexto'],
-            fecha_creacion=row['fecha_creacion'],
-            persona1_nombre=row.get('persona1_nombre'),
-            persona2_nombre=row.get('persona2_nombre')
-        )
+        """Crear instancia desde una fila (tupla o sqlite3.Row) en orden COLUMNAS_RELACION, con o sin nombres"""
+        return cls(*row)
+    
+    @classmethod
+    def from_rows(cls, rows: List[tuple], textos: Optional[dict] = None) -> List['Relacion']:
+        """Crear muchas instancias de golpe (textos: cadenas ya vistas, para compartir las repetidas)"""
+        # tipo, contexto, fecha y nombres se repiten mucho: se guarda una sola copia de cada valor
+        texto = (textos if textos is not None else {}).setdefault
+        if rows and len(rows[0]) == len(COLUMNAS_RELACION):
+            return [cls(id_, p1, p2, texto(tipo, tipo), fortaleza, texto(contexto, contexto), texto(fecha, fecha))
+                    for id_, p1, p2, tipo, fortaleza, contexto, fecha in rows]
+        return [cls(id_, p1, p2, texto(tipo, tipo), fortaleza, texto(contexto, contexto), texto(fecha, fecha),
+                    texto(nombre1, nombre1), texto(nombre2, nombre2))
+                for id_, p1, p2, tipo, fortaleza, contexto, fecha, nombre1, nombre2 in rows]
+
+# Orden posicional de las columnas de la tabla; los nombres de persona van detrás con el JOIN
+COLUMNAS_RELACION = tuple(f.name for f in fields(Relacion) if not f.name.endswith('_nombre'))
+SELECT_RELACION = columnas(COLUMNAS_RELACION)
+SELECT_RELACION_CON_NOMBRES = columnas(COLUMNAS_RELACION, 'r') + ', p1.nombre, p2.nombre'
 
 class RelacionRepository:
     """Repositorio para operaciones con Relaciones"""
     
+    # Máximo de parámetros por consulta IN (límite de SQLite)
+    LOTE_IDS = 900
+    
     def __init__(self, db_manager: DatabaseManager):
         self.db = db_manager
+        self.changelog = ChangeLogRepository(db_manager)
     
     def get_all_with_names(self) -> List[Relacion]:
         """Obtener todas las relaciones con nombres de personas"""
-        rows = self.db.execute_query('''
-            SELECT r.*, p1.nombre as persona1_nombre, p2.nombre as persona2_nombre
+        return self.db.execute_records(f'''
+            SELECT {SELECT_RELACION_CON_NOMBRES}
             FROM relaciones r
             JOIN personas p1 ON r.persona1_id = p1.id
             JOIN personas p2 ON r.persona2_id = p2.id
             ORDER BY r.fecha_creacion DESC
-        ''')
-        return [Relacion.from_row(row) for row in rows]
+        ''', (), Relacion.from_rows)
+    
+    def iter_all(self, conn: sqlite3.Connection, lote: int = 1000) -> Iterator[Relacion]:
+        """Recorrer todas las relaciones por id leyendo del cursor en lotes"""
+        cursor = tuple_cursor(conn).execute(f'SELECT {SELECT_RELACION} FROM relaciones ORDER BY id')
+        while True:
+            rows = cursor.fetchmany(lote)
+            if not rows:
+                return
+            yield from Relacion.from_rows(rows)
+    
+    def get_page_with_names(self, after: Optional[Tuple[str, int]] = None, limit: int = 50,
+                            tipo: Optional[str] = None, fortaleza_min: Optional[int] = None,
+                            fortaleza_max: Optional[int] = None) -> List[Relacion]:
+        """Obtener una página de relaciones, las más recientes primero (paginación por cursor)"""
+        where, params = self._filtros(tipo, fortaleza_min, fortaleza_max)
+        if after is not None:
+            where.append('(r.fecha_creacion, r.id) < (?, ?)')
+            params.extend(after)
+        
+        sql = f'''
+            SELECT {SELECT_RELACION_CON_NOMBRES}
+            FROM relaciones r
+            JOIN personas p1 ON r.persona1_id = p1.id
+            JOIN personas p2 ON r.persona2_id = p2.id
+        '''
+        if where:
+            sql += ' WHERE ' + ' AND '.join(where)
+        sql += ' ORDER BY r.fecha_creacion DESC, r.id DESC LIMIT ?'
+        params.append(limit)
+        
+        return self.db.execute_records(sql, tuple(params), Relacion.from_rows)
+    
+    def count(self, tipo: Optional[str] = None, fortaleza_min: Optional[int] = None,
+              fortaleza_max: Optional[int] = None) -> int:
+        """Contar relaciones que cumplen los filtros"""
+        where, params = self._filtros(tipo, fortaleza_min, fortaleza_max)
+        sql = 'SELECT COUNT(*) FROM relaciones r'
+        if where:
+            sql += ' WHERE ' + ' AND '.join(where)
+        return self.db.execute_single(sql, tuple(params))[0]
+    
+    def _filtros(self, tipo: Optional[str], fortaleza_min: Optional[int], fortaleza_max: Optional[int]):
+        """Construir las condiciones WHERE comunes de listados"""
+        where, params = [], []
+        if tipo:
+            where.append('r.tipo = ?')
+            params.append(tipo)
+        if fortaleza_min is not None:
+            where.append('r.fortaleza >= ?')
+            params.append(fortaleza_min)
+        if fortaleza_max is not None:
+            where.append('r.fortaleza <= ?')
+            params.append(fortaleza_max)
+        return where, params
+    
+    def get_by_ids_with_names(self, relacion_ids: List[int]) -> List[Relacion]:
+        """Obtener varias relaciones por ID con nombres de personas"""
+        relaciones = []
+        for i in range(0, len(relacion_ids), self.LOTE_IDS):
+            lote = relacion_ids[i:i + self.LOTE_IDS]
+            placeholders = ','.join('?' * len(lote))
+            relaciones.extend(self.db.execute_records(f'''
+                SELECT {SELECT_RELACION_CON_NOMBRES}
+                FROM relaciones r
+                JOIN personas p1 ON r.persona1_id = p1.id
+                JOIN personas p2 ON r.persona2_id = p2.id
+                WHERE r.id IN ({placeholders})
+            ''', tuple(lote), Relacion.from_rows))
+        return relaciones
+    
+    def get_by_personas_with_names(self, persona_ids: List[int]) -> List[Relacion]:
+        """Obtener las relaciones que tocan a cualquiera de las personas indicadas"""
+        relaciones = {}
+        # Cada lote se enlaza dos veces (una por rama del UNION)
+        for i in range(0, len(persona_ids), self.LOTE_IDS // 2):
+            lote = persona_ids[i:i + self.LOTE_IDS // 2]
+            placeholders = ','.join('?' * len(lote))
+            # UNION en lugar de OR para que cada rama use su índice
+            encontradas = self.db.execute_records(f'''
+                SELECT {SELECT_RELACION_CON_NOMBRES}
+                FROM relaciones r
+                JOIN personas p1 ON r.persona1_id = p1.id
+                JOIN personas p2 ON r.persona2_id = p2.id
+                WHERE r.persona1_id IN ({placeholders})
+                UNION
+                SELECT {SELECT_RELACION_CON_NOMBRES}
+                FROM relaciones r
+                JOIN personas p1 ON r.persona1_id = p1.id
+                JOIN personas p2 ON r.persona2_id = p2.id
+                WHERE r.persona2_id IN ({placeholders})
+            ''', tuple(lote) * 2, Relacion.from_rows)
+            for relacion in encontradas:
+                relaciones[relacion.id] = relacion
+        return list(relaciones.values())
+    
+    def get_adjacent(self, persona_ids: List[int], min_fortaleza: int = 0) -> List[Tuple[int, int, int]]:
+        """Obtener (relacion_id, persona_id, vecino_id) en ambos sentidos usando solo índices"""
+        adyacentes = []
+        # Cada lote se enlaza dos veces (una por rama del UNION ALL)
+        for i in range(0, len(persona_ids), self.LOTE_IDS // 2):
+            lote = persona_ids[i:i + self.LOTE_IDS // 2]
+            placeholders = ','.join('?' * len(lote))
+            rows = self.db.execute_query(f'''
+                SELECT id, persona1_id, persona2_id FROM relaciones
+                WHERE persona1_id IN ({placeholders}) AND fortaleza >= ?
+                UNION ALL
+                SELECT id, persona2_id, persona1_id FROM relaciones
+                WHERE persona2_id IN ({placeholders}) AND fortaleza >= ?
+            ''', tuple(lote) + (min_fortaleza,) + tuple(lote) + (min_fortaleza,))
+            adyacentes.extend((row[0], row[1], row[2]) for row in rows)
+        return adyacentes
     
     def get_by_id(self, relacion_id: int) -> Optional[Relacion]:
         """Obtener relación por ID"""
-        row = self.db.execute_single('SELECT * FROM relaciones WHERE id = ?', (relacion_id,))
+        row = self.db.execute_single(f'SELECT {SELECT_RELACION} FROM relaciones WHERE id = ?', (relacion_id,))
         return Relacion.from_row(row) if row else None
     
     def create(self, relacion: Relacion) -> int:
         """Crear nueva relación"""
-        return self.db.execute_insert('''
-            INSERT INTO relaciones (persona1_id, persona2_id, tipo, fortaleza, contexto)
-            VALUES (?, ?, ?, ?, ?)
-        ''', (relacion.persona1_id, relacion.persona2_id, relacion.tipo, 
-              relacion.fortaleza, relacion.contexto))
+        with self.db.transaction() as conn:
+            cursor = conn.execute('''
+                INSERT INTO relaciones (persona1_id, persona2_id, tipo, fortaleza, contexto)
+                VALUES (?, ?, ?, ?, ?)
+            ''', (relacion.persona1_id, relacion.persona2_id, relacion.tipo, 
+                  relacion.fortaleza, relacion.contexto))
+            self.changelog.record(conn, ENTIDAD_RELACION, [cursor.lastrowid], 'crear')
+            return cursor.lastrowid
+    
+    def get_existing_pairs(self, pares: List[Tuple[int, int]]) -> set:
+        """Pares (persona1_id, persona2_id) que ya tienen relación, en cualquier sentido"""
+        existentes = set()
+        personas = sorted({pid for par in pares for pid in par})
+        for i in range(0, len(personas), self.LOTE_IDS // 2):
+            lote = personas[i:i + self.LOTE_IDS // 2]
+            placeholders = ','.join('?' * len(lote))
+            rows = self.db.execute_query(f'''
+                SELECT persona1_id, persona2_id FROM relaciones WHERE persona1_id IN ({placeholders})
+                UNION ALL
+                SELECT persona2_id, persona1_id FROM relaciones WHERE persona2_id IN ({placeholders})
+            ''', tuple(lote) * 2)
+            existentes.update((row[0], row[1]) for row in rows)
+        return {par for par in pares if par in existentes}
+    
+    def create_many(self, relaciones: List[Relacion]) -> int:
+        """Crear varias relaciones en una transacción (las duplicadas se ignoran)"""
+        params = [(r.persona1_id, r.persona2_id, r.tipo, r.fortaleza, r.contexto) for r in relaciones]
+        with self.db.transaction(immediate=True) as conn:
+            # Con el bloqueo de escritura tomado, todo id por encima del máximo es nuestro
+            ultimo = conn.execute('SELECT COALESCE(MAX(id), 0) FROM relaciones').fetchone()[0]
+            conn.executemany('''
+                INSERT OR IGNORE INTO relaciones (persona1_id, persona2_id, tipo, fortaleza, contexto)
+                VALUES (?, ?, ?, ?, ?)
+            ''', params)
+            creadas = [row[0] for row in conn.execute('SELECT id FROM relaciones WHERE id > ?', (ultimo,))]
+            self.changelog.record(conn, ENTIDAD_RELACION, creadas, 'crear')
+        return len(creadas)
     
     def delete(self, relacion_id: int) -> bool:
         """Eliminar relación"""
-        affected = self.db.execute_update('DELETE FROM relaciones WHERE id = ?', (relacion_id,))
+        with self.db.transaction() as conn:
+            affected = conn.execute('DELETE FROM relaciones WHERE id = ?', (relacion_id,)).rowcount
+            if affected:
+                self.changelog.record(conn, ENTIDAD_RELACION, [relacion_id], 'eliminar')
         return affected > 0
     
     def delete_by_persona(self, persona_id: int) -> int:
         """Eliminar todas las relaciones de una persona"""
-        affected = self.db.execute_update(
-            'DELETE FROM relaciones WHERE persona1_id = ? OR persona2_id = ?',
-            (persona_id, persona_id)
-        )
-        return affected
\ No newline at end of file
+        with self.db.transaction() as conn:
+            ids = [row['id'] for row in conn.execute(
+                'SELECT id FROM relaciones WHERE persona1_id = ? OR persona2_id = ?',
+                (persona_id, persona_id)
+            )]
+            affected = conn.execute(
+                'DELETE FROM relaciones WHERE persona1_id = ? OR persona2_id = ?',
+                (persona_id, persona_id)
+            ).rowcount
+            self.changelog.record(conn, ENTIDAD_RELACION, ids, 'eliminar')
+        return affected
@@ -0,0 +1,172 @@
+# =================================================================
+# services/analytics_service.py - Métricas de centralidad del grafo
+# =================================================================
+
+import threading
+from typing import Dict, List, Any, Optional
+import numpy as np
+from services.graph_engine import GraphEngine, GraphSnapshot
+
+METRICAS = ('degree', 'pagerank', 'betweenness', 'clustering')
+
+class AnalyticsService:
+    """Centralidades vectorizadas sobre el snapshot CSR, cacheadas por versión"""
+
+    # Cuñas (caminos de dos aristas) evaluadas a la vez al contar triángulos
+    CUNAS_POR_LOTE = 4_000_000
+
+    def __init__(self, engine: GraphEngine, betweenness_samples: int = 64,
+                 damping: float = 0.85, tolerance: float = 1e-8, max_iter: int = 100):
+        self.engine = engine
+        self.betweenness_samples = betweenness_samples
+        self.damping = damping
+        self.tolerance = tolerance
+        self.max_iter = max_iter
+        self._lock = threading.Lock()
+        self._cache: Dict[str, Any] = {'version': None, 'metricas': {}}
+
+    def get_metrics(self, nombres: Optional[List[str]] = None) -> Dict[str, Any]:
+        """Calcular (o reutilizar) las métricas pedidas para la versión actual"""
+        nombres = list(nombres or METRICAS)
+        snapshot = self.engine.snapshot()
+
+        with self._lock:
+            if self._cache['version'] != snapshot.version:
+                self._cache = {'version': snapshot.version, 'metricas': {}}
+            cache = self._cache['metricas']
+
+            for nombre in nombres:
+                if nombre not in cache:
+                    cache[nombre] = getattr(self, f'_{nombre}')(snapshot)
+
+            return {
+                'version': snapshot.version,
+                'node_ids': snapshot.node_ids,
+                'metricas': {nombre: cache[nombre] for nombre in nombres}
+            }
+
+    def get_node_values(self, nombre: str) -> Dict[int, float]:
+        """Valores de una métrica indexados por persona.id"""
+        resultado = self.get_metrics([nombre])
+        valores = resultado['metricas'][nombre]
+        return {int(pid): float(v) for pid, v in zip(resultado['node_ids'], valores)}
+
+    def _degree(self, snapshot: GraphSnapshot) -> np.ndarray:
+        """Grado ponderado por fortaleza"""
+        return np.bincount(snapshot.sources(), weights=snapshot.weights, minlength=snapshot.num_nodes)
+
+    def _pagerank(self, snapshot: GraphSnapshot) -> np.ndarray:
+        """PageRank por iteración de potencias con transiciones ponderadas por fortaleza"""
+        n = snapshot.num_nodes
+        if n == 0:
+            return np.empty(0)
+
+        src = snapshot.sources()
+        dst = snapshot.indices
+        fuerza = np.bincount(src, weights=snapshot.weights, minlength=n)
+        colgantes = fuerza == 0
+        # Probabilidad de transición de cada entrada de adyacencia
+        with np.errstate(divide='ignore', invalid='ignore'):
+            prob = np.where(fuerza[src] > 0, snapshot.weights / fuerza[src], 0.0)
+
+        rank = np.full(n, 1.0 / n)
+        for _ in range(self.max_iter):
+            masa_colgante = rank[colgantes].sum()
+            nuevo = np.bincount(dst, weights=prob * rank[src], minlength=n)
+            nuevo = self.damping * (nuevo + masa_colgante / n) + (1.0 - self.damping) / n
+            delta = np.abs(nuevo - rank).sum()
+            rank = nuevo
+            if delta < self.tolerance:
+                break
+        return rank
+
+    def _betweenness(self, snapshot: GraphSnapshot) -> np.ndarray:
+        """Betweenness aproximada (Brandes por saltos sobre una muestra de orígenes)"""
+        n = snapshot.num_nodes
+        bc = np.zeros(n)
+        if n < 3:
+            return bc
+
+        k = min(n, self.betweenness_samples)
+        # Semilla fija por versión: resultados estables mientras el grafo no cambie
+        rng = np.random.default_rng(snapshot.version)
+        origenes = rng.choice(n, size=k, replace=False) if k < n else np.arange(n)
+
+        for s in origenes:
+            dist = np.full(n, -1, dtype=np.int64)
+            sigma = np.zeros(n)
+            dist[s], sigma[s] = 0, 1.0
+            frontera = np.array([s], dtype=np.int64)
+            niveles = []
+
+            # Fase hacia delante: BFS por niveles contando caminos mínimos
+            nivel = 0
+            while len(frontera):
+                padres, vecinos, _, _ = snapshot.gather(frontera)
+                nuevos = vecinos[dist[vecinos] == -1]
+                dist[nuevos] = nivel + 1
+                en_dag = dist[vecinos] == nivel + 1
+                padres, vecinos = padres[en_dag], vecinos[en_dag]
+                np.add.at(sigma, vecinos, sigma[padres])
+                niveles.append((padres, vecinos))
+                frontera = np.unique(vecinos)
+                nivel += 1
+
+            # Fase hacia atrás: acumulación de dependencias
+            delta = np.zeros(n)
+            for padres, vecinos in reversed(niveles):
+                np.add.at(delta, padres, sigma[padres] / sigma[vecinos] * (1.0 + delta[vecinos]))
+            delta[s] = 0.0
+            bc += delta
+
+        # No dirigido (cada par se cuenta dos veces) y escalado por la muestra
+        return bc * (n / k) / 2.0
+
+    def _clustering(self, snapshot: GraphSnapshot) -> np.ndarray:
+        """Coeficiente de clustering local (sin pesos) contando triángulos por intersección de aristas"""
+        n = snapshot.num_nodes
+        resultado = np.zeros(n)
+        src = snapshot.sources().astype(np.int64)
+        dst = snapshot.indices.astype(np.int64)
+
+        # Aristas simples: sin bucles ni relaciones repetidas entre el mismo par
+        validas = src != dst
+        claves = np.unique(src[validas] * n + dst[validas])
+        u, v = claves // n, claves % n
+        grado = np.bincount(u, minlength=n)
+        # Cada arista se orienta hacia el extremo de mayor (grado, índice): el grado de salida queda acotado
+        rango = np.empty(n, dtype=np.int64)
+        rango[np.lexsort((np.arange(n), grado))] = np.arange(n)
+        hacia = rango[u] < rango[v]
+        u, v = u[hacia], v[hacia]
+        if len(u) == 0:
+            return resultado
+        salidas = np.bincount(u, minlength=n)
+        offsets = np.concatenate(([0], np.cumsum(salidas)))
+        orientadas = u * n + v  # ya ordenadas: vienen de np.unique
+
+        # Cuñas u→v→w por lotes; el triángulo existe si también está la arista u→w
+        triangulos = np.zeros(n)
+        paso = max(1, self.CUNAS_POR_LOTE // int(salidas.max()))
+        for inicio in range(0, len(u), paso):
+            a, b = u[inicio:inicio + paso], v[inicio:inicio + paso]
+            cuenta = salidas[b]
+            total = int(cuenta.sum())
+            if total == 0:
+                continue
+            pos = np.repeat(offsets[b] - np.cumsum(cuenta) + cuenta, cuenta) + np.arange(total)
+            w = v[pos]
+            a, b = np.repeat(a, cuenta), np.repeat(b, cuenta)
+            buscadas = a * n + w
+            k = np.minimum(np.searchsorted(orientadas, buscadas), len(orientadas) - 1)
+            cerradas = orientadas[k] == buscadas
+            for vertice in (a, b, w):
+                triangulos += np.bincount(vertice[cerradas], minlength=n)
+
+        with np.errstate(divide='ignore', invalid='ignore'):
+            resultado = np.where(grado > 1, 2.0 * triangulos / (grado * (grado - 1.0)), 0.0)
+        return resultado
+
+def get_analytics_service(app) -> AnalyticsService:
+    """Obtener el servicio de analítica de la aplicación"""
+    return app.extensions['analytics']
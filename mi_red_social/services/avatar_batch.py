@@ -0,0 +1,182 @@
+# =================================================================
+# services/avatar_batch.py - Subida de avatares por lotes (ZIP)
+# =================================================================
+
+import hashlib
+import io
+import os
+import tempfile
+import time
+import zipfile
+from pathlib import PurePosixPath
+from typing import Dict, List, Any, Optional, Iterator, Tuple
+from werkzeug.datastructures import FileStorage
+from models.persona import PersonaRepository
+from services.image_service import ImageService
+from services.image_pipeline import ImagePipeline
+from services.avatar_store import AvatarStore
+
+class AvatarBatchService:
+    """Asigna avatares a muchas personas desde un ZIP (o varios ficheros)
+
+    Cada entrada se asocia a una persona por su nombre de fichero (<id>.jpg o
+    <nombre>.png) o por el mapa explícito {fichero: id o nombre}. Las entradas
+    se leen del ZIP en memoria, sin extraerlo, y se procesan en el pool de
+    imágenes; al final todas las personas se actualizan en una transacción.
+    """
+
+    def __init__(self, image_service: ImageService, persona_repo: PersonaRepository,
+                 pipeline: ImagePipeline, max_items: int = 1000, max_size: int = 200 * 1024 * 1024):
+        self.image_service = image_service
+        self.persona_repo = persona_repo
+        self.pipeline = pipeline
+        self.store = AvatarStore(image_service, persona_repo)
+        self.max_items = max_items
+        self.max_size = max_size
+
+    def stage(self, archivo: Optional[FileStorage], imagenes: List[FileStorage]) -> Tuple[Optional[str], Optional[str]]:
+        """Guardar el lote en un ZIP temporal para procesarlo fuera de la petición: (ruta, error)"""
+        fd, temporal = tempfile.mkstemp(prefix='lote_', suffix='.zip')
+        try:
+            with os.fdopen(fd, 'wb') as destino:
+                if archivo is not None:
+                    copiados = 0
+                    for bloque in iter(lambda: archivo.stream.read(64 * 1024), b''):
+                        copiados += len(bloque)
+                        if copiados > self.max_size:
+                            raise ValueError(f'Lote demasiado grande. Máximo {self.max_size // (1024 * 1024)}MB')
+                        destino.write(bloque)
+                else:
+                    # Varios ficheros sueltos: se empaquetan sin comprimir para un único camino
+                    if len(imagenes) > self.max_items:
+                        raise ValueError(f'Demasiadas imágenes. Máximo {self.max_items}')
+                    with zipfile.ZipFile(destino, 'w', zipfile.ZIP_STORED) as zf:
+                        for imagen in imagenes:
+                            zf.writestr(os.path.basename(imagen.filename or ''),
+                                        imagen.stream.read(self.image_service.max_file_size + 1))
+
+            if not zipfile.is_zipfile(temporal):
+                raise ValueError('El archivo no es un ZIP válido')
+            return temporal, None
+        except ValueError as e:
+            os.remove(temporal)
+            return None, str(e)
+
+    def run(self, zip_path: str, mapa: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        """Procesar el lote y devolver el informe por entrada"""
+        inicio = time.time()
+        try:
+            with zipfile.ZipFile(zip_path) as zf:
+                items, asignables = self._plan(zf, mapa or {})
+                asignaciones, resultados = self._process(zf, asignables)
+        finally:
+            os.remove(zip_path)
+
+        # Una sola transacción para todas las personas del lote
+        asignaciones = {pid: url for pid, url in asignaciones.items() if not resultados.get(url)}
+        aplicadas = self.store.assign_many(asignaciones) if asignaciones else {}
+        for item in items:
+            if item['estado'] != 'pendiente':
+                continue
+            error = resultados.get(item['imagen_url'])
+            if error:
+                item.update(estado='error', error=error, imagen_url=None)
+            elif not aplicadas.get(item['persona_id']):
+                item.update(estado='error', error='La persona ya no existe', imagen_url=None)
+            else:
+                item['estado'] = 'ok'
+        # Las imágenes procesadas que no llegaron a asignarse no deben quedarse en disco
+        for imagen_url in set(asignaciones.values()) - {i['imagen_url'] for i in items if i['estado'] == 'ok'}:
+            self.store.release(imagen_url)
+
+        duracion = time.time() - inicio
+        return {
+            'procesadas': len(items),
+            'actualizadas': sum(1 for i in items if i['estado'] == 'ok'),
+            'deduplicadas': sum(1 for i in items if i['estado'] == 'ok' and i.get('deduplicada')),
+            'num_errores': sum(1 for i in items if i['estado'] == 'error'),
+            'items': items,
+            'duracion': round(duracion, 3)
+        }
+
+    def _plan(self, zf: zipfile.ZipFile, mapa: Dict[str, Any]) -> Tuple[List[Dict[str, Any]], Dict[str, List[Any]]]:
+        """Resolver la persona de cada entrada y validar tamaños antes de descomprimir nada"""
+        entradas = [info for info in zf.infolist() if self._is_image_entry(info)]
+        items: List[Dict[str, Any]] = []
+        if len(entradas) > self.max_items:
+            return [{'archivo': None, 'estado': 'error',
+                     'error': f'Demasiadas imágenes en el lote. Máximo {self.max_items}'}], {}
+
+        referencias = {info.filename: mapa.get(info.filename, mapa.get(PurePosixPath(info.filename).name,
+                                                                       PurePosixPath(info.filename).stem))
+                       for info in entradas}
+        ids = self._resolve(list(referencias.values()))
+
+        asignables: Dict[str, List[Any]] = {}
+        vistas = set()
+        for info in entradas:
+            item = {'archivo': info.filename, 'persona_id': ids.get(str(referencias[info.filename]).strip()),
+                    'estado': 'pendiente', 'imagen_url': None}
+            items.append(item)
+            if not self.image_service.is_allowed_file(info.filename):
+                item.update(estado='error', error='Tipo de archivo no permitido')
+            elif item['persona_id'] is None:
+                item.update(estado='error', error=f'No existe la persona "{referencias[info.filename]}"')
+            elif item['persona_id'] in vistas:
+                item.update(estado='error', error='Persona repetida en el lote')
+            elif info.file_size > self.image_service.max_file_size:
+                item.update(estado='error', error=self.image_service.too_large_message())
+            else:
+                vistas.add(item['persona_id'])
+                asignables[info.filename] = [info, item]
+        return items, asignables
+
+    def _process(self, zf: zipfile.ZipFile, asignables: Dict[str, List[Any]]
+                 ) -> Tuple[Dict[int, str], Dict[str, Optional[str]]]:
+        """Leer, deduplicar y procesar las entradas válidas; devuelve persona -> URL y URL -> error"""
+        asignaciones: Dict[int, str] = {}
+        resultados: Dict[str, Optional[str]] = {}
+
+        def pendientes() -> Iterator[Tuple[str, bytes, str]]:
+            for info, item in asignables.values():
+                # read acotado: el tamaño declarado en el ZIP podría mentir
+                datos = zf.open(info).read(self.image_service.max_file_size + 1)
+                error = (self.image_service.too_large_message()
+                         if len(datos) > self.image_service.max_file_size
+                         else self.image_service.inspect(io.BytesIO(datos)))
+                if error:
+                    item.update(estado='error', error=error)
+                    continue
+                url = self.image_service.content_url(
+                    hashlib.sha256(datos).hexdigest(), self.image_service.file_extension(info.filename)
+                )
+                item['imagen_url'] = url
+                asignaciones[item['persona_id']] = url
+                if url in resultados:
+                    # Mismo contenido que otra entrada del lote: se procesa una vez
+                    continue
+                if self.image_service.exists(url):
+                    item['deduplicada'] = True
+                    resultados[url] = None
+                    continue
+                resultados[url] = None
+                yield url, datos, url
+
+        for url, _, error in self.pipeline.process_batch(pendientes()):
+            resultados[url] = error
+        return asignaciones, resultados
+
+    @staticmethod
+    def _is_image_entry(info: zipfile.ZipInfo) -> bool:
+        """Ignorar directorios y metadatos de macOS u ocultos"""
+        nombre = PurePosixPath(info.filename)
+        return not info.is_dir() and not nombre.name.startswith('.') and '__MACOSX' not in nombre.parts
+
+    def _resolve(self, referencias: List[Any]) -> Dict[str, int]:
+        """Referencia (id numérico o nombre) -> id de persona existente"""
+        textos = {str(ref).strip() for ref in referencias if ref is not None}
+        numericos = {texto: int(texto) for texto in textos if texto.isdigit()}
+        existentes = {p.id for p in self.persona_repo.get_by_ids(list(set(numericos.values())))}
+        resueltos = {texto: pid for texto, pid in numericos.items() if pid in existentes}
+        resueltos.update(self.persona_repo.get_ids_by_names(list(textos - numericos.keys())))
+        return resueltos
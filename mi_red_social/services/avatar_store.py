@@ -0,0 +1,73 @@
+# =================================================================
+# services/avatar_store.py - Almacén de avatares direccionado por contenido
+# =================================================================
+
+import threading
+from contextlib import contextmanager
+from typing import Dict, Optional
+from models.persona import PersonaRepository
+from services.image_service import ImageService
+
+# Serializa asignar y liberar: una imagen no puede borrarse mientras otra
+# petición la está enlazando a una persona (compartido por todas las instancias)
+_REFERENCIAS = threading.Lock()
+
+@contextmanager
+def _referencias(persona_repo: PersonaRepository):
+    """Bloqueo de referencias con lecturas frescas y escrituras confirmadas antes de soltarlo"""
+    with _REFERENCIAS, persona_repo.db.commit_point():
+        yield
+
+class AvatarStore:
+    """Enlaza personas con imágenes compartidas y borra las que dejan de usarse
+
+    El contador de referencias es el número de filas de personas con esa
+    imagen_url, así que no puede desincronizarse de los datos.
+    """
+
+    def __init__(self, image_service: ImageService, persona_repo: PersonaRepository):
+        self.image_service = image_service
+        self.persona_repo = persona_repo
+
+    def assign(self, persona_id: int, image_url: Optional[str]) -> bool:
+        """Apuntar la persona a la imagen (o a ninguna) y liberar la anterior"""
+        with _referencias(self.persona_repo):
+            return self._assign(persona_id, image_url)
+
+    def assign_stored(self, persona_id: int, image_url: str) -> Optional[bool]:
+        """Reutilizar una imagen ya procesada; None si no está en el almacén"""
+        with _referencias(self.persona_repo):
+            if not self.image_service.exists(image_url):
+                return None
+            return self._assign(persona_id, image_url)
+
+    def _assign(self, persona_id: int, image_url: Optional[str]) -> bool:
+        persona = self.persona_repo.get_by_id(persona_id)
+        if not persona or not self.persona_repo.update_image(persona_id, image_url):
+            return False
+        if persona.imagen_url and persona.imagen_url != image_url:
+            self._release(persona.imagen_url)
+        return True
+
+    def assign_many(self, images: Dict[int, str]) -> Dict[int, bool]:
+        """Asignar imágenes a varias personas en una transacción y liberar las anteriores"""
+        with _referencias(self.persona_repo):
+            anteriores = {p.id: p.imagen_url for p in self.persona_repo.get_by_ids(list(images))}
+            # Solo personas que siguen existiendo y cuyos ficheros siguen en el almacén
+            validas = {pid: url for pid, url in images.items()
+                       if pid in anteriores and self.image_service.exists(url)}
+            if validas:
+                self.persona_repo.update_images(validas)
+            for image_url in {anteriores[pid] for pid in validas} - set(validas.values()):
+                self._release(image_url)
+            return {pid: pid in validas for pid in images}
+
+    def release(self, image_url: Optional[str]) -> bool:
+        """Borrar los ficheros de una imagen si ninguna persona la usa"""
+        with _referencias(self.persona_repo):
+            return self._release(image_url)
+
+    def _release(self, image_url: Optional[str]) -> bool:
+        if not image_url or self.persona_repo.count_image_refs(image_url) > 0:
+            return False
+        return self.image_service.delete_image(image_url)
@@ -0,0 +1,210 @@
+# =================================================================
+# services/community_service.py - Detección de comunidades
+# =================================================================
+
+import random
+import threading
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Dict, List, Any, Optional
+import numpy as np
+from models.persona import PersonaRepository
+from services.graph_engine import GraphEngine, GraphSnapshot
+
+class CommunityService:
+    """Comunidades por Louvain ponderado por fortaleza sobre el snapshot CSR"""
+
+    def __init__(self, engine: GraphEngine, persona_repo: PersonaRepository,
+                 max_levels: int = 10, max_sweeps: int = 20, seed: int = 0, max_workers: int = 1):
+        self.engine = engine
+        self.persona_repo = persona_repo
+        self.max_levels = max_levels
+        self.max_sweeps = max_sweeps
+        self.seed = seed
+        self.max_workers = max_workers
+        self._lock = threading.Lock()
+        self._executor: Optional[ProcessPoolExecutor] = None
+
+    def detect(self) -> Dict[str, Any]:
+        """Proponer una agrupación (sin aplicarla) con su modularidad"""
+        snapshot = self.engine.snapshot()
+        etiquetas, niveles = self._louvain(snapshot)
+        modularidad = self.modularity(snapshot, etiquetas)
+
+        grupos_actuales = {p.id: p.grupo for p in self.persona_repo.get_all()}
+        conectados = snapshot.degrees() > 0
+        nombres = self._name_communities(snapshot, etiquetas, conectados, grupos_actuales)
+
+        asignaciones = []
+        for i in np.flatnonzero(conectados):
+            persona_id = int(snapshot.node_ids[i])
+            asignaciones.append({
+                'id': persona_id,
+                'grupo': nombres[int(etiquetas[i])],
+                'grupo_actual': grupos_actuales.get(persona_id)
+            })
+
+        return {
+            'version': snapshot.version,
+            'algoritmo': 'louvain',
+            'niveles': niveles,
+            'modularity': round(modularidad, 6),
+            'num_comunidades': len(set(nombres[int(e)] for e in etiquetas[conectados])),
+            'asignaciones': asignaciones,
+            'cambios': sum(1 for a in asignaciones if a['grupo'] != a['grupo_actual'])
+        }
+
+    def apply(self, propuesta: Dict[str, Any]) -> int:
+        """Aplicar en una sola transacción las asignaciones que cambian de grupo"""
+        updates = [
+            {'id': a['id'], 'grupo': a['grupo']}
+            for a in propuesta['asignaciones'] if a['grupo'] != a['grupo_actual']
+        ]
+        if not updates:
+            return 0
+        return self.persona_repo.update_groups(updates)
+
+    def _louvain(self, snapshot: GraphSnapshot):
+        """Ejecutar Louvain en un proceso aparte: el hilo del trabajo solo espera, sin retener el GIL"""
+        args = (snapshot.offsets, snapshot.indices, snapshot.weights,
+                self.max_levels, self.max_sweeps, self.seed)
+        try:
+            return self._get_executor().submit(louvain, *args).result()
+        except BrokenProcessPool:
+            # Un proceso murió (p. ej. sin memoria): se recrea el pool una vez
+            with self._lock:
+                self._executor = None
+            return self._get_executor().submit(louvain, *args).result()
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        with self._lock:
+            if self._executor is None:
+                # El proceso se crea con la primera detección, no al arrancar la aplicación
+                self._executor = ProcessPoolExecutor(max_workers=self.max_workers)
+            return self._executor
+
+    def shutdown(self) -> None:
+        """Detener los procesos esperando a la detección en curso"""
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor:
+            executor.shutdown(wait=True)
+
+    @staticmethod
+    def modularity(snapshot: GraphSnapshot, etiquetas: np.ndarray) -> float:
+        """Modularidad ponderada de una partición"""
+        total = snapshot.weights.sum()  # 2W: cada relación aparece dos veces
+        if total == 0:
+            return 0.0
+        src = snapshot.sources()
+        grado = np.bincount(src, weights=snapshot.weights, minlength=snapshot.num_nodes)
+        internas = etiquetas[src] == etiquetas[snapshot.indices]
+        k = int(etiquetas.max()) + 1
+        peso_interno = np.bincount(etiquetas[src][internas], weights=snapshot.weights[internas], minlength=k)
+        grado_comunidad = np.bincount(etiquetas, weights=grado, minlength=k)
+        return float((peso_interno / total - (grado_comunidad / total) ** 2).sum())
+
+    @staticmethod
+    def _name_communities(snapshot: GraphSnapshot, etiquetas: np.ndarray, conectados: np.ndarray,
+                          grupos_actuales: Dict[int, Optional[str]]) -> Dict[int, str]:
+        """Reutilizar el grupo mayoritario de cada comunidad; si ya está cogido, numerarla"""
+        miembros: Dict[int, List[int]] = {}
+        # Las personas sin relaciones no forman comunidad y conservan su grupo
+        for i in np.flatnonzero(conectados):
+            etiqueta = int(etiquetas[i])
+            miembros.setdefault(etiqueta, []).append(int(snapshot.node_ids[i]))
+
+        nombres: Dict[int, str] = {}
+        usados = set()
+        # Las comunidades grandes eligen primero
+        for etiqueta, ids in sorted(miembros.items(), key=lambda item: -len(item[1])):
+            conteo = Counter(grupos_actuales.get(pid) for pid in ids if grupos_actuales.get(pid))
+            nombre = next((g for g, _ in conteo.most_common() if g not in usados), None)
+            if nombre is None:
+                sufijo = len(usados) + 1
+                while f'comunidad_{sufijo}' in usados:
+                    sufijo += 1
+                nombre = f'comunidad_{sufijo}'
+            usados.add(nombre)
+            nombres[etiqueta] = nombre
+        return nombres
+
+def louvain(offsets: np.ndarray, indices: np.ndarray, pesos: np.ndarray,
+            max_levels: int, max_sweeps: int, seed: int):
+    """Louvain: movimiento local y agregación de comunidades hasta que nada mejora
+
+    Función de módulo para poder ejecutarse en un ProcessPoolExecutor.
+    """
+    rng = random.Random(seed)
+    n = len(offsets) - 1
+    pertenencia = np.arange(n, dtype=np.int64)
+    src = np.repeat(np.arange(n, dtype=np.int64), np.diff(offsets))
+    dst = indices.astype(np.int64)
+
+    niveles = 0
+    while niveles < max_levels:
+        comunidad, movido = _local_moving(offsets.tolist(), dst.tolist(), pesos.tolist(), rng, max_sweeps)
+        if not movido:
+            break
+        niveles += 1
+
+        # Renumerar comunidades y colapsar cada una en un supernodo
+        _, comunidad = np.unique(comunidad, return_inverse=True)
+        pertenencia = comunidad[pertenencia]
+        k = int(comunidad.max()) + 1
+        claves, inversa = np.unique(comunidad[src] * k + comunidad[dst], return_inverse=True)
+        pesos = np.bincount(inversa, weights=pesos)
+        src, dst = claves // k, claves % k
+        offsets = np.zeros(k + 1, dtype=np.int64)
+        np.cumsum(np.bincount(src, minlength=k), out=offsets[1:])
+
+    return pertenencia, niveles
+
+def _local_moving(offsets: List[int], indices: List[int], pesos: List[float], rng: random.Random,
+                  max_sweeps: int):
+    """Mover cada nodo a la comunidad vecina con mayor ganancia de modularidad (O(m) por pasada)"""
+    n = len(offsets) - 1
+    grado = [sum(pesos[offsets[u]:offsets[u + 1]]) for u in range(n)]
+    total = sum(grado)
+    comunidad = list(range(n))
+    suma_comunidad = grado[:]
+    orden = list(range(n))
+    movido = False
+
+    for _ in range(max_sweeps):
+        rng.shuffle(orden)
+        movimientos = 0
+        for u in orden:
+            ku = grado[u]
+            if ku == 0:
+                continue
+            hacia: Dict[int, float] = {}
+            for j in range(offsets[u], offsets[u + 1]):
+                v = indices[j]
+                if v != u:
+                    c = comunidad[v]
+                    hacia[c] = hacia.get(c, 0.0) + pesos[j]
+
+            actual = comunidad[u]
+            suma_comunidad[actual] -= ku
+            mejor = actual
+            mejor_ganancia = hacia.get(actual, 0.0) - suma_comunidad[actual] * ku / total
+            for c, peso in hacia.items():
+                ganancia = peso - suma_comunidad[c] * ku / total
+                if ganancia > mejor_ganancia + 1e-12:
+                    mejor, mejor_ganancia = c, ganancia
+            suma_comunidad[mejor] += ku
+
+            if mejor != actual:
+                comunidad[u] = mejor
+                movimientos += 1
+        if not movimientos:
+            break
+        movido = True
+
+    return np.array(comunidad, dtype=np.int64), movido
+
+def get_community_service(app) -> CommunityService:
+    """Obtener el servicio de comunidades de la aplicación"""
+    return app.extensions['communities']
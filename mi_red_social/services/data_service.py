@@ -2,14 +2,20 @@
 # services/data_service.py - Servicio de operaciones de datos
 # =================================================================
 
+import base64
+import json
 from typing import Dict, List, Any, Optional, Tuple
 from models.persona import PersonaRepository, Persona
 from models.relacion import RelacionRepository, Relacion
 from services.image_service import ImageService
+from services.avatar_store import AvatarStore
 
 class DataService:
     """Servicio para operaciones de datos complejas"""
     
+    # Tamaño máximo de página en listados
+    MAX_PAGE_SIZE = 500
+    
     def __init__(self, persona_repo: PersonaRepository, relacion_repo: RelacionRepository, 
                  image_service: ImageService):
         self.persona_repo = persona_repo
@@ -70,36 +76,114 @@ class DataService:
             if not persona:
                 return False, "Persona no encontrada"
             
-            # Eliminar imagen si existe
-            if persona.imagen_url:
-                self.image_service.delete_image(persona.imagen_url)
-            
-            # Eliminar relaciones asociadas
-            self.relacion_repo.delete_by_persona(persona_id)
+            # Relaciones y persona juntas: en la unidad de trabajo de la petición,
+            # un fallo a medias deshace también las relaciones borradas
+            with self.persona_repo.db.transaction():
+                self.relacion_repo.delete_by_persona(persona_id)
+                self.persona_repo.delete(persona_id)
             
-            # Eliminar persona
-            self.persona_repo.delete(persona_id)
+            # Borrar la imagen si ya no la usa nadie más
+            AvatarStore(self.image_service, self.persona_repo).release(persona.imagen_url)
             
             return True, f'Contacto "{persona.nombre}" eliminado exitosamente'
             
         except Exception as e:
             return False, f'Error eliminando persona: {str(e)}'
     
-    def get_admin_data(self) -> Dict[str, Any]:
-        """Obtener todos los datos para el panel de administración"""
+    def get_personas_page(self, cursor: Optional[str] = None, limit: int = 50,
+                          grupo: Optional[str] = None, prefijo: Optional[str] = None) -> Dict[str, Any]:
+        """Obtener una página de personas con el cursor de la siguiente"""
+        limit = self._clamp_limit(limit)
+        after = self.decode_cursor(cursor)
+        if after is not None and not isinstance(after, str):
+            raise ValueError("Cursor inválido")
+        personas = self.persona_repo.get_page(after, limit + 1, grupo, prefijo)
+        
+        # Se pide un elemento extra para saber si hay más páginas
+        has_more = len(personas) > limit
+        personas = personas[:limit]
+        next_cursor = self.encode_cursor(personas[-1].nombre) if has_more else None
+        
         return {
-            'personas': [p.to_dict() for p in self.persona_repo.get_all()],
-            'relaciones': [r.to_dict() for r in self.relacion_repo.get_all_with_names()]
+            'personas': [p.to_dict() for p in personas],
+            'next_cursor': next_cursor
         }
     
-    def get_debug_info(self) -> Dict[str, Any]:
-        """Obtener información de debug"""
-        personas = self.persona_repo.get_all()
-        relaciones = self.relacion_repo.get_all_with_names()
+    def get_relaciones_page(self, cursor: Optional[str] = None, limit: int = 50,
+                            tipo: Optional[str] = None, fortaleza_min: Optional[int] = None,
+                            fortaleza_max: Optional[int] = None) -> Dict[str, Any]:
+        """Obtener una página de relaciones con el cursor de la siguiente"""
+        limit = self._clamp_limit(limit)
+        after = self.decode_cursor(cursor)
+        if after is not None and not self._is_relacion_key(after):
+            raise ValueError("Cursor inválido")
+        relaciones = self.relacion_repo.get_page_with_names(
+            tuple(after) if after else None, limit + 1, tipo, fortaleza_min, fortaleza_max
+        )
+        
+        has_more = len(relaciones) > limit
+        relaciones = relaciones[:limit]
+        next_cursor = None
+        if has_more:
+            ultima = relaciones[-1]
+            next_cursor = self.encode_cursor([ultima.fecha_creacion, ultima.id])
         
         return {
-            'personas_count': len(personas),
-            'relaciones_count': len(relaciones),
-            'personas': [p.to_dict() for p in personas],
-            'relaciones': [r.to_dict() for r in relaciones]
-        }
\ No newline at end of file
+            'relaciones': [r.to_dict() for r in relaciones],
+            'next_cursor': next_cursor
+        }
+    
+    def get_admin_data(self, limit: int = 50) -> Dict[str, Any]:
+        """Obtener la primera página de datos para el panel de administración"""
+        personas_page = self.get_personas_page(limit=limit)
+        relaciones_page = self.get_relaciones_page(limit=limit)
+        
+        return {
+            'personas': personas_page['personas'],
+            'personas_cursor': personas_page['next_cursor'],
+            'personas_total': self.persona_repo.count(),
+            'relaciones': relaciones_page['relaciones'],
+            'relaciones_cursor': relaciones_page['next_cursor'],
+            'relaciones_total': self.relacion_repo.count()
+        }
+    
+    def get_debug_info(self, limit: int = 50) -> Dict[str, Any]:
+        """Obtener información de debug (solo la primera página de cada tabla)"""
+        personas_page = self.get_personas_page(limit=limit)
+        relaciones_page = self.get_relaciones_page(limit=limit)
+        
+        return {
+            'personas_count': self.persona_repo.count(),
+            'relaciones_count': self.relacion_repo.count(),
+            'personas': personas_page['personas'],
+            'relaciones': relaciones_page['relaciones'],
+            'personas_cursor': personas_page['next_cursor'],
+            'relaciones_cursor': relaciones_page['next_cursor']
+        }
+    
+    @staticmethod
+    def _clamp_limit(limit: int) -> int:
+        """Acotar el tamaño de página"""
+        return max(1, min(int(limit), DataService.MAX_PAGE_SIZE))
+    
+    @staticmethod
+    def _is_relacion_key(value: Any) -> bool:
+        """Comprobar que el cursor de relaciones es [fecha_creacion, id]"""
+        return (isinstance(value, list) and len(value) == 2 and isinstance(value[0], str)
+                and isinstance(value[1], int) and not isinstance(value[1], bool))
+    
+    @staticmethod
+    def encode_cursor(value: Any) -> str:
+        """Codificar la clave de la última fila como cursor opaco"""
+        raw = json.dumps(value, ensure_ascii=False).encode('utf-8')
+        return base64.urlsafe_b64encode(raw).decode('ascii')
+    
+    @staticmethod
+    def decode_cursor(cursor: Optional[str]) -> Any:
+        """Decodificar un cursor (ValueError si es inválido)"""
+        if not cursor:
+            return None
+        try:
+            return json.loads(base64.urlsafe_b64decode(cursor.encode('ascii')))
+        except Exception:
+            raise ValueError("Cursor inválido")
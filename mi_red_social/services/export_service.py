@@ -0,0 +1,160 @@
+# =================================================================
+# services/export_service.py - Exportación del grafo en streaming
+# =================================================================
+
+import json
+import threading
+import zlib
+from contextlib import contextmanager
+from typing import Iterator
+from xml.sax.saxutils import escape, quoteattr
+from models.database import DatabaseManager
+from models.persona import PersonaRepository
+from models.relacion import RelacionRepository
+
+FORMATOS = {
+    'ndjson': ('application/x-ndjson', 'ndjson'),
+    'graphml': ('application/graphml+xml', 'graphml'),
+    'edgelist': ('text/plain', 'txt')
+}
+
+# Atributos de persona exportados en GraphML (clave, tipo)
+ATRIBUTOS_PERSONA = [
+    ('nombre', 'string'), ('icono', 'string'), ('grupo', 'string'), ('color', 'string'),
+    ('descripcion', 'string'), ('posicion_x', 'double'), ('posicion_y', 'double'), ('imagen_url', 'string')
+]
+ATRIBUTOS_RELACION = [('tipo', 'string'), ('fortaleza', 'int'), ('contexto', 'string')]
+
+class ExportBusyError(Exception):
+    """Todas las exportaciones simultáneas permitidas están en curso"""
+
+class _Descarga:
+    """Iterador de una exportación que libera su hueco al cerrarse, aunque no llegue a empezar"""
+
+    def __init__(self, bloques: Iterator[bytes], liberar):
+        self._bloques = bloques
+        self._liberar = liberar
+
+    def __iter__(self):
+        return self
+
+    def __next__(self) -> bytes:
+        return next(self._bloques)
+
+    def close(self) -> None:
+        try:
+            self._bloques.close()
+        finally:
+            liberar, self._liberar = self._liberar, None
+            if liberar is not None:
+                liberar()
+
+class ExportService:
+    """Genera el grafo completo fila a fila desde SQLite, con memoria constante
+
+    Cada descarga retiene una conexión del pool y una transacción de lectura
+    mientras dura, así que las simultáneas se limitan por debajo del tamaño
+    del pool para que el resto de peticiones siga teniendo conexiones.
+    """
+
+    def __init__(self, db_manager: DatabaseManager, lote: int = 1000, bloque_bytes: int = 64 * 1024,
+                 max_concurrentes: int = 2):
+        self.db = db_manager
+        self.persona_repo = PersonaRepository(db_manager)
+        self.relacion_repo = RelacionRepository(db_manager)
+        self.lote = lote
+        self.bloque_bytes = bloque_bytes
+        self.max_concurrentes = max(1, min(max_concurrentes, db_manager.pool.max_size - 1))
+        self._slots = threading.BoundedSemaphore(self.max_concurrentes)
+
+    def export(self, formato: str, comprimir: bool = False) -> Iterator[bytes]:
+        """Iterador de bytes del formato pedido (opcionalmente en gzip)
+
+        Lanza ExportBusyError si ya hay max_concurrentes descargas en curso;
+        el hueco se libera al cerrar el iterador.
+        """
+        if not self._slots.acquire(blocking=False):
+            raise ExportBusyError(f'Hay {self.max_concurrentes} exportaciones en curso, inténtalo más tarde')
+        lineas = getattr(self, f'_{formato}')()
+        bloques = self._buffer(lineas)
+        return _Descarga(self._gzip(bloques) if comprimir else bloques, self._slots.release)
+
+    @contextmanager
+    def _snapshot(self):
+        """Conexión con transacción de lectura: personas y relaciones de la misma versión"""
+        with self.db.get_connection() as conn:
+            conn.execute('BEGIN')
+            try:
+                yield conn
+            finally:
+                conn.rollback()
+
+    def _ndjson(self) -> Iterator[str]:
+        """Una línea JSON por persona y por relación, con campo 'type'"""
+        with self._snapshot() as conn:
+            for persona in self.persona_repo.iter_all(conn, self.lote):
+                yield json.dumps({'type': 'persona', **persona.to_dict()}, ensure_ascii=False) + '\n'
+            for relacion in self.relacion_repo.iter_all(conn, self.lote):
+                datos = relacion.to_dict()
+                datos.pop('persona1_nombre')
+                datos.pop('persona2_nombre')
+                yield json.dumps({'type': 'relacion', **datos}, ensure_ascii=False) + '\n'
+
+    def _edgelist(self) -> Iterator[str]:
+        """persona1_id persona2_id fortaleza, separados por tabuladores"""
+        with self._snapshot() as conn:
+            yield '# persona1_id\tpersona2_id\tfortaleza\n'
+            for relacion in self.relacion_repo.iter_all(conn, self.lote):
+                yield f'{relacion.persona1_id}\t{relacion.persona2_id}\t{relacion.fortaleza}\n'
+
+    def _graphml(self) -> Iterator[str]:
+        """Documento GraphML no dirigido, escrito elemento a elemento"""
+        yield '<?xml version="1.0" encoding="UTF-8"?>\n'
+        yield '<graphml xmlns="http://graphml.graphdrawing.org/xmlns">\n'
+        for clave, tipo in ATRIBUTOS_PERSONA:
+            yield f'  <key id="{clave}" for="node" attr.name="{clave}" attr.type="{tipo}"/>\n'
+        for clave, tipo in ATRIBUTOS_RELACION:
+            yield f'  <key id="{clave}" for="edge" attr.name="{clave}" attr.type="{tipo}"/>\n'
+        yield '  <graph id="red_social" edgedefault="undirected">\n'
+
+        with self._snapshot() as conn:
+            for persona in self.persona_repo.iter_all(conn, self.lote):
+                yield f'    <node id="n{persona.id}">{self._data(persona, ATRIBUTOS_PERSONA)}</node>\n'
+            for relacion in self.relacion_repo.iter_all(conn, self.lote):
+                yield (f'    <edge id="e{relacion.id}" source="n{relacion.persona1_id}" '
+                       f'target="n{relacion.persona2_id}">{self._data(relacion, ATRIBUTOS_RELACION)}</edge>\n')
+
+        yield '  </graph>\n</graphml>\n'
+
+    @staticmethod
+    def _data(objeto, atributos) -> str:
+        return ''.join(
+            f'<data key={quoteattr(clave)}>{escape(str(getattr(objeto, clave)))}</data>'
+            for clave, _ in atributos if getattr(objeto, clave) not in (None, '')
+        )
+
+    def _buffer(self, lineas: Iterator[str]) -> Iterator[bytes]:
+        """Agrupar líneas en bloques de tamaño razonable para la transferencia por trozos"""
+        partes, tamano = [], 0
+        for linea in lineas:
+            partes.append(linea)
+            tamano += len(linea)
+            if tamano >= self.bloque_bytes:
+                yield ''.join(partes).encode('utf-8')
+                partes, tamano = [], 0
+        if partes:
+            yield ''.join(partes).encode('utf-8')
+
+    @staticmethod
+    def _gzip(bloques: Iterator[bytes]) -> Iterator[bytes]:
+        """Comprimir en gzip sobre la marcha"""
+        compresor = zlib.compressobj(6, zlib.DEFLATED, 31)
+        for bloque in bloques:
+            comprimido = compresor.compress(bloque)
+            if comprimido:
+                yield comprimido
+        yield compresor.flush()
+
+def get_export_service(app) -> ExportService:
+    """Obtener el servicio de exportación de la aplicación"""
+    return app.extensions['export']
@@ -0,0 +1,83 @@
+# =================================================================
+# services/graph_benchmark.py - Comparativa de los dos caminos de /api/grafo
+# =================================================================
+
+import json
+import math
+import random
+import statistics
+import time
+from typing import Dict, Any, Callable
+from models.database import DatabaseManager
+from models.persona import PersonaRepository
+from models.relacion import RelacionRepository
+from services.graph_service import GraphService
+
+TIPOS = ('profesional', 'amistad', 'companero_trabajo', 'familia', 'mentor')
+GRUPOS = ('centro', 'equipo_directo', 'colaboradores', 'otros_departamentos', 'externos')
+
+def seed_synthetic_graph(db: DatabaseManager, personas: int, relaciones: int, semilla: int = 0) -> None:
+    """Rellenar una base vacía con una red aleatoria reproducible"""
+    rng = random.Random(semilla)
+    with db.transaction() as conn:
+        inicio = conn.execute('SELECT COALESCE(MAX(id), 0) FROM personas').fetchone()[0]
+        conn.executemany(
+            'INSERT INTO personas (nombre, grupo, color, imagen_url, posicion_x, posicion_y, posicion_fija) '
+            'VALUES (?, ?, ?, ?, ?, ?, ?)',
+            [(f'Persona {i:06d}', rng.choice(GRUPOS), f'#{rng.randrange(0x1000000):06x}',
+              f'avatars/{rng.randrange(16 ** 8):08x}.jpg' if rng.random() < 0.3 else None,
+              *((rng.uniform(-2000, 2000), rng.uniform(-2000, 2000)) if rng.random() < 0.5 else (None, None)),
+              int(rng.random() < 0.1))
+             for i in range(personas)]
+        )
+        ids = list(range(inicio + 1, inicio + personas + 1))
+        pares = set()
+        while len(pares) < min(relaciones, personas * (personas - 1) // 2):
+            a, b = rng.sample(ids, 2)
+            pares.add((min(a, b), max(a, b)))
+        conn.executemany(
+            'INSERT INTO relaciones (persona1_id, persona2_id, tipo, fortaleza, contexto) VALUES (?, ?, ?, ?, ?)',
+            [(a, b, rng.choice(TIPOS), rng.randint(1, 10), rng.choice(('', 'Proyecto', None)))
+             for a, b in pares]
+        )
+    # Estadísticas del planificador acordes al tamaño real, para comparar en igualdad
+    db.execute_query('ANALYZE')
+
+def equivalent_payloads(a: Any, b: Any) -> bool:
+    """Mismo JSON salvo redondeo de reales (SQLite los escribe con 15 cifras significativas)"""
+    if isinstance(a, float) or isinstance(b, float):
+        return isinstance(a, (int, float)) and isinstance(b, (int, float)) and math.isclose(a, b, rel_tol=1e-12)
+    if isinstance(a, dict) and isinstance(b, dict):
+        return a.keys() == b.keys() and all(equivalent_payloads(a[k], b[k]) for k in a)
+    if isinstance(a, list) and isinstance(b, list):
+        return len(a) == len(b) and all(equivalent_payloads(x, y) for x, y in zip(a, b))
+    return a == b
+
+def benchmark_graph_payload(db: DatabaseManager, dumps: Callable[[Any], str],
+                            repeticiones: int = 5) -> Dict[str, Any]:
+    """Medir get_graph_data + serialización frente a get_graph_json y comprobar que coinciden"""
+    service = GraphService(PersonaRepository(db), RelacionRepository(db))
+
+    def python() -> bytes:
+        return dumps(service.get_graph_data()).encode('utf-8')
+
+    tiempos: Dict[str, list] = {'python': [], 'sqlite': []}
+    cuerpos = {}
+    for _ in range(repeticiones):
+        for nombre, construir in (('python', python), ('sqlite', service.get_graph_json)):
+            inicio = time.perf_counter()
+            cuerpos[nombre] = construir()
+            tiempos[nombre].append(time.perf_counter() - inicio)
+
+    resultado = {
+        nombre: {'mediana_ms': round(statistics.median(t) * 1000, 1), 'min_ms': round(min(t) * 1000, 1),
+                 'bytes': len(cuerpos[nombre])}
+        for nombre, t in tiempos.items()
+    }
+    datos = json.loads(cuerpos['sqlite'])
+    resultado.update(
+        nodos=len(datos['nodes']), aristas=len(datos['edges']),
+        iguales=equivalent_payloads(datos, json.loads(cuerpos['python'])),
+        aceleracion=round(resultado['python']['mediana_ms'] / max(resultado['sqlite']['mediana_ms'], 0.1), 1)
+    )
+    return resultado
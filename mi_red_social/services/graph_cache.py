@@ -0,0 +1,100 @@
+# =================================================================
+# services/graph_cache.py - Caché versionada del payload del grafo
+# =================================================================
+
+import hashlib
+import threading
+from dataclasses import dataclass
+from typing import Callable, Dict, Any
+
+@dataclass(frozen=True)
+class CachedPayload:
+    """Payload serializado del grafo para una versión concreta"""
+    version: int
+    body: bytes
+    etag: str
+
+class GraphCache:
+    """Caché en proceso del JSON del grafo indexada por versión"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._version = 0
+        # Variantes del payload (p. ej. tamaño de nodo por métrica) de la versión actual
+        self._entries: Dict[str, CachedPayload] = {}
+        self._stats = {'hits': 0, 'misses': 0, 'rebuilds_forzados': 0, 'invalidaciones': 0}
+
+    @property
+    def version(self) -> int:
+        """Versión actual del grafo"""
+        return self._version
+
+    def bump(self) -> int:
+        """Invalidar la caché tras una escritura y devolver la nueva versión"""
+        with self._lock:
+            self._version += 1
+            self._stats['invalidaciones'] += 1
+            return self._version
+
+    def get_or_build(self, builder: Callable[[], bytes], force: bool = False,
+                     variant: str = '') -> CachedPayload:
+        """Devolver el payload cacheado o reconstruirlo si la versión cambió"""
+        with self._lock:
+            version = self._version
+            entry = self._entries.get(variant)
+            if not force and entry is not None and entry.version == version:
+                self._stats['hits'] += 1
+                return entry
+            self._stats['rebuilds_forzados' if force else 'misses'] += 1
+
+        # Construir fuera del lock para no bloquear a otros lectores
+        body = builder()
+        entry = CachedPayload(version=version, body=body,
+                              etag=hashlib.sha1(body).hexdigest())
+
+        with self._lock:
+            # Solo se guarda si nadie escribió mientras se construía
+            if self._version == version:
+                if any(e.version != version for e in self._entries.values()):
+                    self._entries = {}
+                self._entries[variant] = entry
+        return entry
+
+    def stats(self) -> Dict[str, Any]:
+        """Estadísticas de la caché"""
+        with self._lock:
+            return {
+                'version': self._version,
+                'variantes': {k or 'default': e.version for k, e in self._entries.items()},
+                **self._stats
+            }
+
+def get_graph_cache(app) -> GraphCache:
+    """Obtener la caché del grafo de la aplicación"""
+    return app.extensions['graph_cache']
+
+def notify_graph_change(app) -> int:
+    """Registrar una escritura que afecta al grafo, sincronizar el motor y avisar a los clientes SSE"""
+    # Dentro de una unidad de trabajo se avisa tras confirmar: nadie debe ver cambios que aún pueden deshacerse
+    db_manager = app.extensions.get('db_manager')
+    unit = db_manager.current_unit() if db_manager is not None else None
+    if unit is not None:
+        unit.on_commit(notify_graph_change, app)
+        return get_graph_cache(app).version
+    
+    version = get_graph_cache(app).bump()
+    
+    engine = app.extensions.get('graph_engine')
+    if engine is not None:
+        try:
+            engine.sync()
+        except Exception as e:
+            print(f"⚠️ Error sincronizando el motor de grafo: {e}")
+    
+    broker = app.extensions.get('graph_events')
+    if broker is not None:
+        try:
+            broker.pump()
+        except Exception as e:
+            print(f"⚠️ Error difundiendo cambios del grafo: {e}")
+    return version
@@ -0,0 +1,209 @@
+# =================================================================
+# services/graph_engine.py - Motor de grafo en memoria (CSR)
+# =================================================================
+
+import threading
+from dataclasses import dataclass
+from typing import Dict, List, Any, Optional, Tuple
+import numpy as np
+from models.database import DatabaseManager
+from models.cambio import ChangeLogRepository, ENTIDAD_PERSONA, ENTIDAD_RELACION
+
+def _readonly(array: np.ndarray) -> np.ndarray:
+    array.setflags(write=False)
+    return array
+
+@dataclass(frozen=True)
+class GraphSnapshot:
+    """Vista inmutable del grafo en formato CSR no dirigido
+
+    Cada relación aparece dos veces (u→v y v→u). Los vecinos del nodo de
+    índice i son indices[offsets[i]:offsets[i + 1]], con su fortaleza en
+    weights y el id de la relación en edge_ids.
+    """
+    version: int
+    node_ids: np.ndarray   # índice -> persona.id (ordenado)
+    offsets: np.ndarray    # int64, longitud n + 1
+    indices: np.ndarray    # int32, índice del vecino
+    weights: np.ndarray    # float64, fortaleza
+    edge_ids: np.ndarray   # int64, relacion.id
+
+    @property
+    def num_nodes(self) -> int:
+        return len(self.node_ids)
+
+    @property
+    def num_edges(self) -> int:
+        return len(self.indices) // 2
+
+    def index_of(self, persona_id: int) -> Optional[int]:
+        """Índice interno de una persona (None si no existe)"""
+        i = int(np.searchsorted(self.node_ids, persona_id))
+        if i < len(self.node_ids) and self.node_ids[i] == persona_id:
+            return i
+        return None
+
+    def neighbors(self, index: int) -> Tuple[np.ndarray, np.ndarray]:
+        """Índices de vecinos y fortalezas de un nodo"""
+        start, end = self.offsets[index], self.offsets[index + 1]
+        return self.indices[start:end], self.weights[start:end]
+
+    def gather(self, nodos: np.ndarray) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+        """Aplanar las listas de adyacencia de varios nodos: (origen, vecino, fortaleza, relacion_id)"""
+        nodos = np.asarray(nodos, dtype=np.int64)
+        counts = self.offsets[nodos + 1] - self.offsets[nodos]
+        total = int(counts.sum())
+        if total == 0:
+            vacio = np.empty(0, dtype=np.int64)
+            return vacio, vacio, np.empty(0), vacio
+        # Posiciones offsets[nodo] + 0..count-1 de cada nodo sin bucles de Python
+        inicio = np.repeat(self.offsets[nodos] - np.cumsum(counts) + counts, counts)
+        pos = inicio + np.arange(total)
+        return (np.repeat(nodos, counts), self.indices[pos].astype(np.int64),
+                self.weights[pos], self.edge_ids[pos])
+
+    def degrees(self) -> np.ndarray:
+        """Grado de cada nodo"""
+        return np.diff(self.offsets)
+
+    def sources(self) -> np.ndarray:
+        """Índice de origen de cada entrada de adyacencia"""
+        return np.repeat(np.arange(self.num_nodes, dtype=np.int32), self.degrees())
+
+class GraphEngine:
+    """Grafo de la aplicación en memoria, sincronizado con SQLite mediante el log de cambios"""
+
+    def __init__(self, db_manager: DatabaseManager):
+        self.db = db_manager
+        self.changelog = ChangeLogRepository(db_manager)
+        self._lock = threading.RLock()
+        self._nodes: set = set()
+        self._edges: Dict[int, Tuple[int, int, float]] = {}
+        self._version = 0
+        self._snapshot: Optional[GraphSnapshot] = None
+        self._stats = {'cargas_completas': 0, 'sincronizaciones': 0, 'reconstrucciones': 0}
+
+    def load(self) -> None:
+        """Cargar el grafo completo desde la base de datos"""
+        with self._lock:
+            # La versión se lee primero: lo que cambie después llega en la siguiente sync
+            version = self.changelog.latest_version()
+            with self.db.get_connection() as conn:
+                nodes = {row[0] for row in conn.execute('SELECT id FROM personas')}
+                edges = {
+                    row[0]: (row[1], row[2], float(row[3] or 0))
+                    for row in conn.execute('SELECT id, persona1_id, persona2_id, fortaleza FROM relaciones')
+                }
+            self._nodes, self._edges = nodes, edges
+            self._version = version
+            self._snapshot = None
+            self._stats['cargas_completas'] += 1
+
+    def sync(self) -> int:
+        """Aplicar los cambios del log desde la última versión conocida"""
+        with self._lock:
+            latest = self.changelog.latest_version()
+            if latest == self._version:
+                return 0
+            if self.changelog.is_too_old(self._version, latest):
+                self.load()
+                return -1
+
+            cambios = self.changelog.get_changed_ids(self._version, latest)
+            self._apply_personas(cambios[ENTIDAD_PERSONA])
+            self._apply_relaciones(cambios[ENTIDAD_RELACION])
+
+            self._version = latest
+            self._snapshot = None
+            self._stats['sincronizaciones'] += 1
+            return len(cambios[ENTIDAD_PERSONA]) + len(cambios[ENTIDAD_RELACION])
+
+    def _apply_personas(self, persona_ids: List[int]) -> None:
+        existentes = set(self._select_ids('SELECT id FROM personas WHERE id IN ({})', persona_ids))
+        for persona_id in persona_ids:
+            if persona_id in existentes:
+                self._nodes.add(persona_id)
+            else:
+                self._nodes.discard(persona_id)
+
+    def _apply_relaciones(self, relacion_ids: List[int]) -> None:
+        filas = {
+            row[0]: (row[1], row[2], float(row[3] or 0))
+            for row in self._select_rows(
+                'SELECT id, persona1_id, persona2_id, fortaleza FROM relaciones WHERE id IN ({})',
+                relacion_ids
+            )
+        }
+        for relacion_id in relacion_ids:
+            if relacion_id in filas:
+                self._edges[relacion_id] = filas[relacion_id]
+            else:
+                self._edges.pop(relacion_id, None)
+
+    def _select_rows(self, sql: str, ids: List[int], lote: int = 900) -> List[tuple]:
+        rows = []
+        for i in range(0, len(ids), lote):
+            chunk = ids[i:i + lote]
+            rows.extend(tuple(row) for row in self.db.execute_query(sql.format(','.join('?' * len(chunk))), tuple(chunk)))
+        return rows
+
+    def _select_ids(self, sql: str, ids: List[int]) -> List[int]:
+        return [row[0] for row in self._select_rows(sql, ids)]
+
+    def snapshot(self) -> GraphSnapshot:
+        """Obtener una vista CSR consistente (se reconstruye solo si hubo cambios)"""
+        with self._lock:
+            self.sync()
+            if self._snapshot is None:
+                self._snapshot = self._build()
+                self._stats['reconstrucciones'] += 1
+            return self._snapshot
+
+    def _build(self) -> GraphSnapshot:
+        """Empaquetar nodos y aristas en arrays CSR"""
+        node_ids = np.fromiter(sorted(self._nodes), dtype=np.int64, count=len(self._nodes))
+        n = len(node_ids)
+
+        m = len(self._edges)
+        edge_ids = np.fromiter(self._edges.keys(), dtype=np.int64, count=m)
+        u = np.fromiter((e[0] for e in self._edges.values()), dtype=np.int64, count=m)
+        v = np.fromiter((e[1] for e in self._edges.values()), dtype=np.int64, count=m)
+        w = np.fromiter((e[2] for e in self._edges.values()), dtype=np.float64, count=m)
+
+        # Traducir persona.id a índice y descartar aristas con extremos inexistentes
+        ui = np.searchsorted(node_ids, u)
+        vi = np.searchsorted(node_ids, v)
+        valid = (ui < n) & (vi < n)
+        valid[valid] &= (node_ids[ui[valid]] == u[valid]) & (node_ids[vi[valid]] == v[valid])
+        ui, vi, w, edge_ids = ui[valid], vi[valid], w[valid], edge_ids[valid]
+
+        # Ambos sentidos, ordenados por origen
+        src = np.concatenate([ui, vi])
+        dst = np.concatenate([vi, ui])
+        order = np.argsort(src, kind='stable')
+        offsets = np.zeros(n + 1, dtype=np.int64)
+        np.cumsum(np.bincount(src, minlength=n), out=offsets[1:])
+
+        return GraphSnapshot(
+            version=self._version,
+            node_ids=_readonly(node_ids),
+            offsets=_readonly(offsets),
+            indices=_readonly(dst[order].astype(np.int32)),
+            weights=_readonly(np.concatenate([w, w])[order]),
+            edge_ids=_readonly(np.concatenate([edge_ids, edge_ids])[order])
+        )
+
+    def stats(self) -> Dict[str, Any]:
+        """Estadísticas del motor"""
+        with self._lock:
+            return {
+                'version': self._version,
+                'nodos': len(self._nodes),
+                'aristas': len(self._edges),
+                'snapshot_vigente': self._snapshot is not None,
+                **self._stats
+            }
+
+def get_graph_engine(app) -> GraphEngine:
+    """Obtener el motor de grafo de la aplicación"""
+    return app.extensions['graph_engine']
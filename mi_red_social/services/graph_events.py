@@ -0,0 +1,165 @@
+# =================================================================
+# services/graph_events.py - Canal Server-Sent Events del grafo
+# =================================================================
+
+import json
+import queue
+import threading
+from typing import Dict, List, Any, Optional, Iterator
+from models.database import DatabaseManager
+from models.persona import PersonaRepository
+from models.relacion import RelacionRepository
+from services.graph_service import GraphService
+
+class Subscription:
+    """Cliente SSE con cola acotada propia"""
+
+    def __init__(self, maxsize: int):
+        self.queue = queue.Queue(maxsize)
+        self.overflowed = False
+
+    def offer(self, event: Dict[str, Any]) -> None:
+        """Encolar sin bloquear; si la cola está llena el cliente queda desbordado"""
+        try:
+            self.queue.put_nowait(event)
+        except queue.Full:
+            self.overflowed = True
+
+class GraphEventBroker:
+    """Difunde los cambios confirmados en el log a los clientes suscritos"""
+
+    # Entradas del log leídas por consulta
+    LOTE = 500
+
+    def __init__(self, db_manager: DatabaseManager, queue_size: int = 256,
+                 heartbeat_seconds: float = 15.0, max_clients: int = 200, retry_ms: int = 3000):
+        self.db = db_manager
+        self.queue_size = queue_size
+        self.heartbeat_seconds = heartbeat_seconds
+        self.max_clients = max_clients
+        self.retry_ms = retry_ms
+
+        self._subscribers = set()
+        self._lock = threading.Lock()
+        self._pump_lock = threading.Lock()
+        self._last_seq: Optional[int] = None
+        self._stats = {'publicados': 0, 'desbordados': 0, 'rechazados': 0}
+
+    def _graph_service(self) -> GraphService:
+        return GraphService(PersonaRepository(self.db), RelacionRepository(self.db))
+
+    def subscribe(self) -> Optional[Subscription]:
+        """Registrar un cliente (None si se alcanzó el máximo)"""
+        # Fijar el punto de partida antes del primer cliente para no perder eventos
+        if self._last_seq is None:
+            self.pump()
+
+        with self._lock:
+            if len(self._subscribers) >= self.max_clients:
+                self._stats['rechazados'] += 1
+                return None
+            subscription = Subscription(self.queue_size)
+            self._subscribers.add(subscription)
+            return subscription
+
+    def unsubscribe(self, subscription: Subscription) -> None:
+        """Dar de baja un cliente"""
+        with self._lock:
+            self._subscribers.discard(subscription)
+
+    def publish(self, events: List[Dict[str, Any]]) -> None:
+        """Entregar eventos a todos los clientes sin bloquear al escritor"""
+        with self._lock:
+            subscribers = list(self._subscribers)
+            self._stats['publicados'] += len(events)
+
+        for subscription in subscribers:
+            if subscription.overflowed:
+                continue
+            for event in events:
+                subscription.offer(event)
+            if subscription.overflowed:
+                with self._lock:
+                    self._stats['desbordados'] += 1
+
+    def pump(self) -> int:
+        """Leer del log los cambios aún no difundidos y publicarlos"""
+        with self._pump_lock:
+            service = self._graph_service()
+            latest = service.changelog.latest_version()
+
+            if self._last_seq is None or latest < self._last_seq:
+                self._last_seq = latest
+                return 0
+
+            publicados = 0
+            while self._last_seq < latest:
+                events = service.get_change_events(self._last_seq, latest, self.LOTE)
+                if not events:
+                    break
+                self.publish(events)
+                publicados += len(events)
+                self._last_seq = events[-1]['id']
+
+            self._last_seq = latest
+            return publicados
+
+    def stream(self, subscription: Subscription, last_event_id: Optional[int] = None) -> Iterator[str]:
+        """Generador de la respuesta text/event-stream de un cliente"""
+        try:
+            yield f"retry: {self.retry_ms}\n\n"
+            sent = last_event_id
+
+            # Reanudar desde Last-Event-ID leyendo el log
+            if last_event_id is not None:
+                service = self._graph_service()
+                latest = service.changelog.latest_version()
+                if service.changelog.is_too_old(last_event_id, latest):
+                    yield self.format_event({'id': latest, 'event': 'resync', 'data': {'version': latest}})
+                else:
+                    while sent < latest:
+                        events = service.get_change_events(sent, latest, self.LOTE)
+                        if not events:
+                            break
+                        for event in events:
+                            yield self.format_event(event)
+                        sent = events[-1]['id']
+                sent = latest
+
+            while True:
+                # Un cliente lento se desconecta: al reconectar se pone al día con el log
+                if subscription.overflowed:
+                    return
+
+                try:
+                    event = subscription.queue.get(timeout=self.heartbeat_seconds)
+                except queue.Empty:
+                    self.pump()
+                    yield ": heartbeat\n\n"
+                    continue
+
+                if sent is not None and event['id'] <= sent:
+                    continue
+                yield self.format_event(event)
+                sent = event['id']
+        finally:
+            self.unsubscribe(subscription)
+
+    @staticmethod
+    def format_event(event: Dict[str, Any]) -> str:
+        """Serializar un evento en formato SSE"""
+        data = json.dumps(event['data'], ensure_ascii=False, separators=(',', ':'))
+        return f"id: {event['id']}\nevent: {event['event']}\ndata: {data}\n\n"
+
+    def stats(self) -> Dict[str, Any]:
+        """Estadísticas del canal de eventos"""
+        with self._lock:
+            return {
+                'clientes': len(self._subscribers),
+                'ultima_version': self._last_seq,
+                **self._stats
+            }
+
+def get_graph_events(app) -> GraphEventBroker:
+    """Obtener el broker de eventos de la aplicación"""
+    return app.extensions['graph_events']
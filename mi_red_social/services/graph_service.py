@@ -2,81 +2,319 @@
 # services/graph_service.py - Servicio de lógica del grafo
 # =================================================================
 
-from typing import Dict, List, Any
+import json
+from typing import Dict, List, Any, Optional
 from models.persona import PersonaRepository
 from models.relacion import RelacionRepository
+from models.cambio import ChangeLogRepository, ENTIDAD_PERSONA, ENTIDAD_RELACION
+from services.image_service import ImageService
+
+# Mismo formato que _format_node y _format_edge, construido por SQLite con JSON1.
+# Las subconsultas fijan el orden (nombre / fecha) que conserva json_group_array;
+# json_patch sobre '{}' elimina las claves nulas (sin imagen, sin posición).
+# CROSS JOIN y NOT INDEXED fijan el plan (relaciones fuera, búsqueda por rowid
+# dentro) aunque las estadísticas de ANALYZE sean de cuando la red era pequeña.
+# Las etiquetas van con LEFT JOIN: una relación sin tipo sale con etiqueta vacía.
+NODOS_SQL = '''
+    WITH tamanos(id, size) AS (SELECT CAST(key AS INTEGER), value FROM json_each(?)),
+         avatares(url, image) AS (SELECT key, value FROM json_each(?))
+    SELECT json_group_array(json_patch('{}', json_object(
+        'id', id,
+        'label', nombre,
+        'color', IIF(imagen_url IS NULL, color, json_object('border', color, 'background', 'white')),
+        'size', COALESCE(size, IIF(imagen_url IS NULL, IIF(instr(nombre, 'Usuario Principal') > 0, 50, 30), 80)),
+        'grupo', grupo,
+        'shape', IIF(imagen_url IS NULL, 'dot', 'image'),
+        'image', COALESCE(image, imagen_url),
+        'borderWidth', IIF(imagen_url IS NULL, 2, 3),
+        'borderWidthSelected', IIF(imagen_url IS NULL, NULL, 5),
+        'x', IIF(con_posicion, posicion_x * 1.0, NULL),
+        'y', IIF(con_posicion, posicion_y * 1.0, NULL),
+        'physics', json(IIF(con_posicion AND posicion_fija, 'false', 'true'))
+    )))
+    FROM (
+        SELECT p.id, p.nombre, p.color, p.grupo, p.imagen_url, p.posicion_x, p.posicion_y, p.posicion_fija,
+               p.posicion_x IS NOT NULL AND p.posicion_y IS NOT NULL AS con_posicion, t.size, a.image
+        FROM personas p
+        LEFT JOIN tamanos t ON t.id = p.id
+        LEFT JOIN avatares a ON a.url = p.imagen_url
+        ORDER BY p.nombre
+    )
+'''
+
+ARISTAS_SQL = '''
+    WITH etiquetas(tipo, label) AS MATERIALIZED (SELECT key, value FROM json_each(?))
+    SELECT json_group_array(json_object(
+        'id', id,
+        'from', persona1_id,
+        'to', persona2_id,
+        'width', fortaleza,
+        'color', CASE WHEN fortaleza >= 8 THEN '#10b981' WHEN fortaleza >= 6 THEN '#f59e0b' ELSE '#6b7280' END,
+        'label', label,
+        'title', '<b>' || nombre1 || ' ↔ ' || nombre2 || '</b><br>Tipo: ' || label
+                 || '<br>Fortaleza: ' || fortaleza || '/10<br>Contexto: ' || COALESCE(NULLIF(contexto, ''), 'Sin contexto')
+    ))
+    FROM (
+        SELECT r.id, r.persona1_id, r.persona2_id, r.fortaleza, r.contexto, COALESCE(e.label, '') AS label,
+               p1.nombre AS nombre1, p2.nombre AS nombre2
+        FROM relaciones r
+        CROSS JOIN personas p1 NOT INDEXED ON p1.id = r.persona1_id
+        CROSS JOIN personas p2 NOT INDEXED ON p2.id = r.persona2_id
+        LEFT JOIN etiquetas e ON e.tipo = r.tipo
+        ORDER BY r.fecha_creacion DESC
+    )
+'''
 
 class GraphService:
     """Servicio para la lógica del grafo"""
     
-    def __init__(self, persona_repo: PersonaRepository, relacion_repo: RelacionRepository):
+    def __init__(self, persona_repo: PersonaRepository, relacion_repo: RelacionRepository,
+                 image_service: Optional[ImageService] = None, avatar_size: Optional[int] = None):
         self.persona_repo = persona_repo
         self.relacion_repo = relacion_repo
+        self.changelog = ChangeLogRepository(persona_repo.db)
+        # Tamaño de avatar a servir (derivada WebP); None mantiene la imagen de respaldo
+        self.image_service = image_service
+        self.avatar_size = avatar_size
     
-    def get_graph_data(self) -> Dict[str, List[Dict[str, Any]]]:
-        """Obtener datos del grafo para vis.js"""
+    def get_graph_data(self, node_sizes: Optional[Dict[int, float]] = None) -> Dict[str, Any]:
+        """Obtener datos del grafo para vis.js (node_sizes permite fijar el tamaño por nodo)"""
+        # La versión se lee antes que los datos: el feed reenviará lo que cambie entre medias
+        version = self.changelog.latest_version()
         personas = self.persona_repo.get_all()
         relaciones = self.relacion_repo.get_all_with_names()
         
-        # Formatear nodos
+        nodes = [self._format_node(persona) for persona in personas]
+        edges = [self._format_edge(relacion) for relacion in relaciones]
+        
+        if node_sizes:
+            for node_data in nodes:
+                if node_data['id'] in node_sizes:
+                    node_data['size'] = node_sizes[node_data['id']]
+        
+        return {'nodes': nodes, 'edges': edges, 'version': version}
+    
+    def get_graph_json(self, node_sizes: Optional[Dict[int, float]] = None) -> bytes:
+        """Mismo payload que get_graph_data, serializado por SQLite sin pasar por objetos Python"""
+        db = self.persona_repo.db
+        version = self.changelog.latest_version()
+        with db.get_connection() as conn:
+            # Lo que no es SQL sencillo (title() de Python, derivadas en disco) se pasa ya resuelto
+            etiquetas = {row[0]: self._format_tipo(row[0])
+                         for row in conn.execute('SELECT DISTINCT tipo FROM relaciones WHERE tipo IS NOT NULL')}
+            avatares = {}
+            if self.image_service is not None and self.avatar_size:
+                avatares = {row[0]: self._avatar_url(row[0]) for row in conn.execute(
+                    'SELECT DISTINCT imagen_url FROM personas WHERE imagen_url IS NOT NULL'
+                )}
+            nodes = conn.execute(NODOS_SQL, (json.dumps(node_sizes or {}), json.dumps(avatares))).fetchone()[0]
+            edges = conn.execute(ARISTAS_SQL, (json.dumps(etiquetas),)).fetchone()[0]
+        return f'{{"nodes":{nodes},"edges":{edges},"version":{int(version)}}}'.encode('utf-8')
+    
+    def get_viewport_data(self, x1: float, y1: float, x2: float, y2: float) -> Dict[str, Any]:
+        """Obtener solo los nodos dentro del área visible y las aristas que los tocan"""
+        version = self.changelog.latest_version()
+        x1, x2 = min(x1, x2), max(x1, x2)
+        y1, y2 = min(y1, y2), max(y1, y2)
+        
+        personas = self.persona_repo.get_in_bbox(x1, y1, x2, y2)
+        relaciones = self.relacion_repo.get_by_personas_with_names([p.id for p in personas])
+        
+        return {
+            'nodes': [self._format_node(persona) for persona in personas],
+            'edges': [self._format_edge(relacion) for relacion in relaciones],
+            'version': version,
+            'bbox': [x1, y1, x2, y2]
+        }
+    
+    def get_ego_network(self, persona_id: int, depth: int = 1, min_fortaleza: int = 0,
+                        max_nodes: int = 1000) -> Optional[Dict[str, Any]]:
+        """Obtener el subgrafo a k saltos de una persona (BFS por niveles sobre los índices)"""
+        if self.persona_repo.get_by_id(persona_id) is None:
+            return None
+        
+        version = self.changelog.latest_version()
+        niveles = {persona_id: 0}
+        frontera = [persona_id]
+        aristas = set()
+        truncated = False
+        
+        for nivel in range(1, depth + 1):
+            siguiente = []
+            for relacion_id, origen, vecino in self.relacion_repo.get_adjacent(frontera, min_fortaleza):
+                if vecino not in niveles:
+                    if len(niveles) >= max_nodes:
+                        truncated = True
+                        continue
+                    niveles[vecino] = nivel
+                    siguiente.append(vecino)
+                aristas.add(relacion_id)
+            frontera = siguiente
+            if not frontera:
+                break
+        
+        # Aristas entre nodos del borde del último nivel
+        if frontera:
+            for relacion_id, origen, vecino in self.relacion_repo.get_adjacent(frontera, min_fortaleza):
+                if vecino in niveles:
+                    aristas.add(relacion_id)
+        
+        personas = self.persona_repo.get_by_ids(list(niveles))
+        relaciones = [
+            r for r in self.relacion_repo.get_by_ids_with_names(list(aristas))
+            if r.persona1_id in niveles and r.persona2_id in niveles
+        ]
+        
         nodes = []
         for persona in personas:
-            size = 50 if 'Usuario Principal' in persona.nombre else 30
-            
-            node_data = {
-                'id': persona.id,
-                'label': persona.nombre,
-                'color': persona.color,
-                'size': size,
-                'grupo': persona.grupo
-            }
-            
-            # Configurar imagen o forma por defecto
-            if persona.imagen_url:
-                node_data.update({
-                    'shape': 'image',
-                    'image': persona.imagen_url,
-                    'size': 80,
-                    'borderWidth': 3,
-                    'borderWidthSelected': 5,
-                    'color': {
-                        'border': persona.color,
-                        'background': 'white'
-                    }
-                })
-            else:
-                node_data.update({
-                    'shape': 'dot',
-                    'borderWidth': 2
-                })
-            
-            # ✅ Código corregido
-            # Agregar posiciones si existen
-            if hasattr(persona, 'posicion_x') and persona.posicion_x is not None and persona.posicion_y is not None:
-                node_data.update({
-                    'x': float(persona.posicion_x),
-                    'y': float(persona.posicion_y),
-                    'physics': True
-                })
-            else:
-                node_data['physics'] = True
-            
+            node_data = self._format_node(persona)
+            node_data['nivel'] = niveles[persona.id]
             nodes.append(node_data)
         
-        # Formatear aristas
-        edges = []
-        for relacion in relaciones:
-            color = self._get_edge_color(relacion.fortaleza)
-            edges.append({
-                'from': relacion.persona1_id,
-                'to': relacion.persona2_id,
-                'width': relacion.fortaleza,
-                'color': color,
-                'label': relacion.tipo.replace('_', ' ').title(),
-                'title': self._get_edge_tooltip(relacion)
+        return {
+            'nodes': nodes,
+            'edges': [self._format_edge(relacion) for relacion in relaciones],
+            'version': version,
+            'centro': persona_id,
+            'depth': depth,
+            'truncated': truncated
+        }
+    
+    def get_subgraph(self, persona_ids: List[int], relacion_ids: List[int]) -> Dict[str, Any]:
+        """Formatear un subconjunto concreto de nodos y aristas (p. ej. un camino a resaltar)"""
+        orden_p = {pid: i for i, pid in enumerate(persona_ids)}
+        orden_r = {rid: i for i, rid in enumerate(relacion_ids)}
+        personas = sorted(self.persona_repo.get_by_ids(persona_ids), key=lambda p: orden_p[p.id])
+        relaciones = sorted(self.relacion_repo.get_by_ids_with_names(relacion_ids), key=lambda r: orden_r[r.id])
+        
+        return {
+            'nodes': [self._format_node(persona) for persona in personas],
+            'edges': [self._format_edge(relacion) for relacion in relaciones]
+        }
+    
+    def get_changes(self, since: int) -> Dict[str, Any]:
+        """Obtener los nodos y aristas modificados desde una versión"""
+        version = self.changelog.latest_version()
+        if self.changelog.is_too_old(since, version):
+            return {'resync': True, 'version': version}
+        
+        cambios = self.changelog.get_changed_ids(since, version)
+        persona_ids = cambios[ENTIDAD_PERSONA]
+        relacion_ids = cambios[ENTIDAD_RELACION]
+        
+        personas = self.persona_repo.get_by_ids(persona_ids)
+        relaciones = self.relacion_repo.get_by_ids_with_names(relacion_ids)
+        
+        # Lo que ya no existe se comunica como eliminado
+        existentes_p = {p.id for p in personas}
+        existentes_r = {r.id for r in relaciones}
+        
+        return {
+            'resync': False,
+            'since': since,
+            'version': version,
+            'nodes': [self._format_node(persona) for persona in personas],
+            'edges': [self._format_edge(relacion) for relacion in relaciones],
+            'deleted_nodes': [pid for pid in persona_ids if pid not in existentes_p],
+            'deleted_edges': [rid for rid in relacion_ids if rid not in existentes_r]
+        }
+    
+    def get_change_events(self, since: int, until: int, limit: int = 500) -> List[Dict[str, Any]]:
+        """Convertir entradas del log en eventos de nodo/arista/posición/grupo"""
+        entries = self.changelog.get_entries(since, until, limit)
+        
+        persona_ids = list({eid for _, entidad, eid, _ in entries if entidad == ENTIDAD_PERSONA})
+        relacion_ids = list({eid for _, entidad, eid, _ in entries if entidad == ENTIDAD_RELACION})
+        personas = {p.id: p for p in self.persona_repo.get_by_ids(persona_ids)}
+        relaciones = {r.id: r for r in self.relacion_repo.get_by_ids_with_names(relacion_ids)}
+        
+        events = []
+        for seq, entidad, entidad_id, operacion in entries:
+            if entidad == ENTIDAD_PERSONA:
+                persona = personas.get(entidad_id)
+                if persona is None:
+                    event, data = 'node_deleted', {'id': entidad_id}
+                elif operacion == 'posicion':
+                    event, data = 'position', {'id': entidad_id, 'x': persona.posicion_x, 'y': persona.posicion_y}
+                elif operacion == 'grupo':
+                    event, data = 'group', {'id': entidad_id, 'grupo': persona.grupo}
+                else:
+                    event, data = 'node', self._format_node(persona)
+            else:
+                relacion = relaciones.get(entidad_id)
+                if relacion is None:
+                    event, data = 'edge_deleted', {'id': entidad_id}
+                else:
+                    event, data = 'edge', self._format_edge(relacion)
+            events.append({'id': seq, 'event': event, 'data': data})
+        
+        return events
+    
+    def _format_node(self, persona) -> Dict[str, Any]:
+        """Formatear una persona como nodo de vis.js"""
+        size = 50 if 'Usuario Principal' in persona.nombre else 30
+        
+        node_data = {
+            'id': persona.id,
+            'label': persona.nombre,
+            'color': persona.color,
+            'size': size,
+            'grupo': persona.grupo
+        }
+        
+        # Configurar imagen o forma por defecto
+        if persona.imagen_url:
+            node_data.update({
+                'shape': 'image',
+                'image': self._avatar_url(persona.imagen_url),
+                'size': 80,
+                'borderWidth': 3,
+                'borderWidthSelected': 5,
+                'color': {
+                    'border': persona.color,
+                    'background': 'white'
+                }
+            })
+        else:
+            node_data.update({
+                'shape': 'dot',
+                'borderWidth': 2
+            })
+        
+        # ✅ Código corregido
+        # Agregar posiciones si existen
+        if hasattr(persona, 'posicion_x') and persona.posicion_x is not None and persona.posicion_y is not None:
+            node_data.update({
+                'x': float(persona.posicion_x),
+                'y': float(persona.posicion_y),
+                'physics': not persona.posicion_fija
             })
+        else:
+            node_data['physics'] = True
         
-        return {'nodes': nodes, 'edges': edges}
+        return node_data
+    
+    def _avatar_url(self, imagen_url: str) -> str:
+        """Imagen del nodo en el tamaño pedido por el cliente"""
+        if self.image_service is None or not self.avatar_size:
+            return imagen_url
+        return self.image_service.avatar_url(imagen_url, self.avatar_size)
+    
+    def _format_edge(self, relacion) -> Dict[str, Any]:
+        """Formatear una relación como arista de vis.js"""
+        return {
+            'id': relacion.id,
+            'from': relacion.persona1_id,
+            'to': relacion.persona2_id,
+            'width': relacion.fortaleza,
+            'color': self._get_edge_color(relacion.fortaleza),
+            'label': self._format_tipo(relacion.tipo),
+            'title': self._get_edge_tooltip(relacion)
+        }
+    
+    @staticmethod
+    def _format_tipo(tipo: Optional[str]) -> str:
+        return tipo.replace('_', ' ').title() if tipo else ''
     
     def _get_edge_color(self, fortaleza: int) -> str:
         """Obtener color del edge basado en la fortaleza"""
@@ -90,6 +328,20 @@ class GraphService:
     def _get_edge_tooltip(self, relacion) -> str:
         """Generar tooltip para el edge"""
         return (f"<b>{relacion.persona1_nombre} ↔ {relacion.persona2_nombre}</b><br>"
-                f"Tipo: {relacion.tipo.replace('_', ' ').title()}<br>"
+                f"Tipo: {self._format_tipo(relacion.tipo)}<br>"
                 f"Fortaleza: {relacion.fortaleza}/10<br>"
-                f"Contexto: {relacion.contexto or 'Sin contexto'}")
\ No newline at end of file
+                f"Contexto: {relacion.contexto or 'Sin contexto'}")
+    
+    @staticmethod
+    def scale_sizes(values: Dict[int, float], min_size: float = 15, max_size: float = 60) -> Dict[int, float]:
+        """Escalar linealmente los valores de una métrica a tamaños de nodo"""
+        if not values:
+            return {}
+        low, high = min(values.values()), max(values.values())
+        span = high - low
+        if span <= 0:
+            return {node_id: (min_size + max_size) / 2 for node_id in values}
+        return {
+            node_id: round(min_size + (max_size - min_size) * (value - low) / span, 2)
+            for node_id, value in values.items()
+        }
@@ -0,0 +1,207 @@
+# =================================================================
+# services/image_gc.py - Limpieza periódica del directorio de imágenes
+# =================================================================
+
+import hashlib
+import os
+import re
+import shutil
+import threading
+import time
+from pathlib import Path
+from typing import Dict, List, Any, Callable, Iterator, Optional, Set, Tuple
+from PIL import Image
+from models.database import get_db_manager
+from models.persona import PersonaRepository
+from services.image_service import ImageService
+from services.avatar_store import _referencias
+from services.jobs import JobManager
+from services.graph_cache import notify_graph_change
+
+# Solo se tocan ficheros con nombres que crea el almacén: <hash>.<ext> y sus derivadas
+# <hash>_<tamaño>.webp, las antiguas user_<id>_<8 hex>.<ext> y los temporales
+# .<nombre>.<pid>[.<hilo>].tmp de save_variants. Cualquier otro fichero (.gitkeep...) se ignora.
+ALMACEN = re.compile(r'^(?P<clave>[0-9a-f]{32}|(?P<legacy>user_\d+_[0-9a-f]{8}))'
+                     r'(?P<derivada>_\d+\.webp)?(?(derivada)|\.[A-Za-z0-9]+)$')
+TEMPORAL = re.compile(r'^\.(?P<nombre>.+?)\.\d+(?:\.\d+)?\.tmp$')
+LEGACY_URL = 'static/images/users/'
+
+class ImageSweeper:
+    """Cruza el directorio de imágenes con personas.imagen_url
+
+    - Borra ficheros del almacén que ninguna persona usa (con un margen para subidas
+      en curso). Las imágenes antiguas sin usar se conservan: no las creó el almacén
+      actual y pueden ser ejemplos incluidos con la aplicación.
+    - Quita de personas las imágenes cuyo fichero ya no existe.
+    - Mueve las imágenes antiguas (user_<id>_<uuid>.ext) al almacén por hash.
+    """
+
+    def __init__(self, persona_repo: PersonaRepository, image_service: ImageService,
+                 grace_seconds: int = 3600, lote: int = 1000):
+        self.persona_repo = persona_repo
+        self.image_service = image_service
+        self.grace_seconds = grace_seconds
+        self.lote = lote
+
+    def sweep(self, dry_run: bool = False) -> Dict[str, Any]:
+        """Hacer un barrido completo y devolver el informe"""
+        inicio = time.time()
+        informe = {'dry_run': dry_run, 'escaneados': 0, 'huerfanos': 0, 'bytes_liberados': 0,
+                   'referencias_rotas': 0, 'migrados': 0}
+
+        # 1. Referencias a ficheros que no existen
+        existe: Dict[str, bool] = {}
+        rotas: Dict[int, str] = {}
+        legacy: Set[str] = set()
+        for persona_id, imagen_url in self._refs():
+            if imagen_url not in existe:
+                existe[imagen_url] = self.image_service.exists(imagen_url)
+            if not existe[imagen_url]:
+                rotas[persona_id] = imagen_url
+            elif imagen_url.startswith(LEGACY_URL):
+                legacy.add(imagen_url)
+        if rotas and not dry_run:
+            # Con el bloqueo: solo se quita la URL rota si sigue puesta y su fichero sigue sin existir
+            with _referencias(self.persona_repo):
+                rotas = {persona_id: url for persona_id, url in rotas.items()
+                         if not self.image_service.exists(url)}
+                informe['referencias_rotas'] = self.persona_repo.clear_images(rotas) if rotas else 0
+        else:
+            informe['referencias_rotas'] = len(rotas)
+
+        # 2. Imágenes antiguas al almacén por contenido (subdirectorio por prefijo del hash)
+        for imagen_url in sorted(legacy):
+            if not dry_run:
+                self._migrate(imagen_url)
+            informe['migrados'] += 1
+
+        # 3. Ficheros sin referencias
+        limite = time.time() - self.grace_seconds
+        candidatos: List[Tuple[str, Path, int]] = []
+        for clave, ruta, stat in self._scan():
+            informe['escaneados'] += 1
+            if clave is not None and stat.st_mtime < limite:
+                candidatos.append((clave, ruta, stat.st_size))
+        if candidatos:
+            # Se vuelve a leer con el bloqueo tomado: nadie puede enlazar una imagen mientras se borra
+            with _referencias(self.persona_repo):
+                usadas = {self._key_for_url(url) for _, url in self._refs()}
+                for clave, ruta, tamaño in candidatos:
+                    if clave in usadas:
+                        continue
+                    informe['huerfanos'] += 1
+                    informe['bytes_liberados'] += tamaño
+                    if not dry_run:
+                        try:
+                            ruta.unlink()
+                        except FileNotFoundError:
+                            pass
+
+        informe['duracion'] = round(time.time() - inicio, 3)
+        print(f"🧹 Imágenes: {informe['huerfanos']} huérfanas ({informe['bytes_liberados']} bytes), "
+              f"{informe['referencias_rotas']} referencias rotas, {informe['migrados']} migradas")
+        return informe
+
+    def _refs(self) -> Iterator[Tuple[int, str]]:
+        """(id, imagen_url) de todas las personas con imagen, leídas en lotes por id"""
+        ultimo = 0
+        while True:
+            filas = self.persona_repo.get_image_refs(ultimo, self.lote)
+            yield from filas
+            if len(filas) < self.lote:
+                return
+            ultimo = filas[-1][0]
+
+    def _scan(self) -> Iterator[Tuple[Optional[str], Path, os.stat_result]]:
+        """(clave, ruta, stat) de cada fichero del directorio y de sus subdirectorios por hash
+
+        La clave es None para los ficheros que el barrido no debe borrar.
+        """
+        carpeta = self.image_service.images_folder
+        if not carpeta.exists():
+            return
+        with os.scandir(carpeta) as raiz:
+            for entrada in raiz:
+                if entrada.is_dir(follow_symlinks=False) and len(entrada.name) == 2:
+                    with os.scandir(entrada.path) as shard:
+                        for fichero in shard:
+                            if fichero.is_file(follow_symlinks=False):
+                                yield self._key_for_file(fichero.name), Path(fichero.path), fichero.stat()
+                elif entrada.is_file(follow_symlinks=False):
+                    yield self._key_for_file(entrada.name), Path(entrada.path), entrada.stat()
+
+    @staticmethod
+    def _key_for_file(nombre: str) -> Optional[str]:
+        """Imagen a la que pertenece un fichero del almacén (None si no es del almacén o no se borra)"""
+        temporal = TEMPORAL.match(nombre)
+        if temporal:
+            nombre = temporal.group('nombre')
+        partes = ALMACEN.match(nombre)
+        if partes is None:
+            return None
+        # Una imagen antigua sin usar se conserva; sus derivadas y temporales sí se recogen
+        if partes.group('legacy') and not (temporal or partes.group('derivada')):
+            return None
+        return partes.group('clave')
+
+    @staticmethod
+    def _key_for_url(imagen_url: str) -> str:
+        return Path(imagen_url).name.rsplit('.', 1)[0]
+
+    def _migrate(self, imagen_url: str) -> None:
+        """Copiar al almacén con sus derivadas, repuntar las personas y borrar el original (en ese orden)"""
+        origen = self.image_service.file_path(imagen_url)
+        digest = hashlib.sha256()
+        with open(origen, 'rb') as fichero:
+            for bloque in iter(lambda: fichero.read(64 * 1024), b''):
+                digest.update(bloque)
+        nueva_url = self.image_service.content_url(digest.hexdigest(), self.image_service.file_extension(origen.name))
+
+        with _referencias(self.persona_repo):
+            destino = self.image_service.file_path(nueva_url)
+            if not destino.exists():
+                destino.parent.mkdir(parents=True, exist_ok=True)
+                try:
+                    # Las derivadas WebP antiguas se borran con el original: se regeneran aquí
+                    with Image.open(origen) as image:
+                        self.image_service.save_variants(image, nueva_url)
+                except (OSError, ValueError) as e:
+                    print(f"Error regenerando derivadas de {imagen_url}: {e}")
+                    shutil.copy2(origen, destino)
+            self.persona_repo.rename_image(imagen_url, nueva_url)
+            self.image_service.delete_image(imagen_url)
+
+def run_image_sweep(app, dry_run: bool = False) -> Dict[str, Any]:
+    """Barrido con la configuración de la aplicación; avisa a los clientes si cambió alguna persona"""
+    sweeper = ImageSweeper(
+        PersonaRepository(get_db_manager(app)), ImageService(app.config),
+        grace_seconds=app.config['IMAGE_GC_GRACE_SECONDS'], lote=app.config['IMAGE_GC_LOTE']
+    )
+    informe = sweeper.sweep(dry_run)
+    if not dry_run and (informe['referencias_rotas'] or informe['migrados']):
+        notify_graph_change(app)
+    return informe
+
+class SweepScheduler:
+    """Encola el barrido en el JobManager cada intervalo (hilo demonio)"""
+
+    def __init__(self, jobs: JobManager, task: Callable[[], Any], interval_seconds: float):
+        self.jobs = jobs
+        self.task = task
+        self.interval_seconds = interval_seconds
+        self._parar = threading.Event()
+        self._hilo: Optional[threading.Thread] = None
+
+    def start(self) -> None:
+        if self.interval_seconds <= 0 or self._hilo is not None:
+            return
+        self._hilo = threading.Thread(target=self._loop, name='imagenes-gc', daemon=True)
+        self._hilo.start()
+
+    def _loop(self) -> None:
+        # El primer barrido espera un intervalo: no compite con el arranque
+        while not self._parar.wait(self.interval_seconds):
+            self.jobs.submit('imagenes_gc', self.task)
+
+    def stop(self) -> None:
+        self._parar.set()
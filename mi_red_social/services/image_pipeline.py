@@ -0,0 +1,186 @@
+# =================================================================
+# services/image_pipeline.py - Procesado de imágenes en un pool de procesos
+# =================================================================
+
+import os
+import threading
+from concurrent.futures import FIRST_COMPLETED, Future, ProcessPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+from typing import Dict, Any, Optional, Callable, Hashable, Iterable, Iterator, Tuple
+from services.jobs import JobManager, Job
+from services.image_service import ImageService, procesar_imagen, procesar_datos
+
+class PipelineFullError(Exception):
+    """La cola de imágenes pendientes está llena"""
+
+class ImagePipeline:
+    """Decodifica y redimensiona avatares en procesos aparte con una cola acotada
+
+    El trabajo se publica en el JobManager para consultarlo en /api/jobs/<id>;
+    al terminar se llama a on_done en un hilo del proceso principal.
+    """
+
+    # Atributos de Config que necesita ImageService en los procesos hijos
+    CLAVES_CONFIG = ('ALLOWED_EXTENSIONS', 'MAX_FILE_SIZE', 'IMAGE_MAX_PIXELS', 'IMAGE_SIZE',
+                     'IMAGE_SIZES', 'IMAGE_WEBP_QUALITY', 'IMAGES_FOLDER')
+
+    def __init__(self, config: Dict[str, Any], jobs: JobManager, max_workers: int = 2, queue_size: int = 32,
+                 release: Optional[Callable[[str], Any]] = None):
+        self.config = {clave: config[clave] for clave in self.CLAVES_CONFIG}
+        self.jobs = jobs
+        # Qué hacer con una imagen procesada que no llega a usarse (por defecto, borrarla)
+        self.release = release or ImageService(self.config).delete_image
+        self.max_workers = max_workers
+        self.queue_size = queue_size
+        # Hueco por imagen encolada o en proceso; sin hueco libre se rechaza la subida
+        self._slots = threading.BoundedSemaphore(queue_size)
+        self._lock = threading.Lock()
+        self._executor: Optional[ProcessPoolExecutor] = None
+        # Último trabajo por clave (persona): los anteriores que terminen tarde se descartan
+        self._ultimos: Dict[Hashable, str] = {}
+        self._stats = {'encoladas': 0, 'procesadas': 0, 'descartadas': 0, 'errores': 0, 'rechazadas': 0}
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        with self._lock:
+            if self._executor is None:
+                # Los procesos se crean con la primera imagen, no al arrancar la aplicación
+                self._executor = ProcessPoolExecutor(max_workers=self.max_workers)
+            return self._executor
+
+    def submit(self, tipo: str, origen: str, destino: str,
+               on_done: Callable[[str], Any], clave: Optional[Hashable] = None) -> Job:
+        """Encolar el procesado del temporal origen hacia la ruta relativa destino
+
+        Lanza PipelineFullError si ya hay queue_size imágenes pendientes.
+        """
+        if not self._slots.acquire(blocking=False):
+            with self._lock:
+                self._stats['rechazadas'] += 1
+            raise PipelineFullError(f'Hay {self.queue_size} imágenes en cola, inténtalo más tarde')
+
+        job = self.jobs.register(tipo)
+        # Antes de encolar: el resultado podría llegar antes de volver de submit
+        with self._lock:
+            if clave is not None:
+                self._ultimos[clave] = job.id
+        try:
+            future = self._submit_future(procesar_imagen, origen, destino)
+        except Exception as e:
+            self._slots.release()
+            self.jobs.finish(job, error=str(e))
+            raise
+
+        with self._lock:
+            self._stats['encoladas'] += 1
+        future.add_done_callback(lambda f: self._deliver(job, f, origen, destino, on_done, clave))
+        return job
+
+    def _deliver(self, job: Job, future: Future, *args) -> None:
+        """Pasar el resultado a un hilo del JobManager (se ejecuta en el hilo de gestión del pool)
+
+        on_done escribe en la base de datos y avisa a los clientes: si esperase aquí
+        al bloqueo de SQLite, retrasaría la entrega de todas las demás imágenes.
+        """
+        try:
+            self.jobs.run(self._done, job, future, *args)
+        except RuntimeError:
+            # JobManager ya detenido (cierre de la aplicación): se termina aquí mismo
+            self._done(job, future, *args)
+
+    def _submit_future(self, fn: Callable[..., str], *args) -> Future:
+        try:
+            return self._get_executor().submit(fn, self.config, *args)
+        except BrokenProcessPool:
+            # Un proceso murió (p. ej. sin memoria): se recrea el pool una vez
+            with self._lock:
+                self._executor = None
+            return self._get_executor().submit(fn, self.config, *args)
+
+    def process_batch(self, items: Iterable[Tuple[Hashable, bytes, str]]
+                      ) -> Iterator[Tuple[Hashable, Optional[str], Optional[str]]]:
+        """Procesar (clave, datos, destino) en el pool y producir (clave, imagen_url, error)
+
+        Como mucho hay dos imágenes por proceso en vuelo, así que el lote no
+        retiene todo el ZIP en memoria ni deja sin turno a las subidas sueltas.
+        """
+        ventana = self.max_workers * 2
+        pendientes: Dict[Future, Hashable] = {}
+        iterador = iter(items)
+        agotado = False
+        while pendientes or not agotado:
+            while not agotado and len(pendientes) < ventana:
+                siguiente = next(iterador, None)
+                if siguiente is None:
+                    agotado = True
+                    break
+                clave, datos, destino = siguiente
+                pendientes[self._submit_future(procesar_datos, datos, destino)] = clave
+            if not pendientes:
+                break
+            hechos, _ = wait(pendientes, return_when=FIRST_COMPLETED)
+            for future in hechos:
+                clave = pendientes.pop(future)
+                try:
+                    yield clave, future.result(), None
+                except Exception as e:
+                    yield clave, None, f'Error procesando imagen: {e}'
+
+    def _done(self, job: Job, future: Future, origen: str, destino: str,
+              on_done: Callable[[str], Any], clave: Optional[Hashable]) -> None:
+        """Registrar el resultado de una imagen (se ejecuta en un hilo del JobManager)"""
+        self._slots.release()
+        try:
+            imagen_url = future.result()
+        except Exception as e:
+            if os.path.exists(origen):
+                os.remove(origen)
+            with self._lock:
+                self._stats['errores'] += 1
+            self.jobs.finish(job, error=f'Error procesando imagen: {e}')
+            return
+
+        with self._lock:
+            vigente = clave is None or self._ultimos.get(clave) == job.id
+            if vigente and clave is not None:
+                del self._ultimos[clave]
+        if not vigente:
+            # Otra subida posterior para la misma persona manda
+            self.release(destino)
+            with self._lock:
+                self._stats['descartadas'] += 1
+            self.jobs.finish(job, {'imagen_url': None, 'descartada': True})
+            return
+
+        try:
+            resultado = on_done(imagen_url)
+        except Exception as e:
+            self.release(destino)
+            with self._lock:
+                self._stats['errores'] += 1
+            self.jobs.finish(job, error=str(e))
+            return
+        with self._lock:
+            self._stats['procesadas'] += 1
+        self.jobs.finish(job, resultado)
+
+    def stats(self) -> Dict[str, Any]:
+        """Estado de la cola para monitorización"""
+        with self._lock:
+            return {
+                'max_workers': self.max_workers,
+                'queue_size': self.queue_size,
+                'pendientes': self._stats['encoladas'] - self._stats['procesadas']
+                              - self._stats['descartadas'] - self._stats['errores'],
+                **self._stats
+            }
+
+    def shutdown(self) -> None:
+        """Detener los procesos esperando a las imágenes en curso"""
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor:
+            executor.shutdown(wait=True)
+
+def get_image_pipeline(app) -> ImagePipeline:
+    """Obtener el pipeline de imágenes de la aplicación"""
+    return app.extensions['images']
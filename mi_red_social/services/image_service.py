@@ -2,23 +2,41 @@
 # services/image_service.py - Servicio de manejo de imágenes
 # =================================================================
 
+import hashlib
+import io
 import os
-import uuid
+import tempfile
+import threading
 from pathlib import Path
-from typing import Tuple, Optional
+from typing import Tuple, Optional, Dict, Any, Union, IO
 from werkzeug.utils import secure_filename
 from werkzeug.datastructures import FileStorage
 from PIL import Image
-from config import Config
+
+# Margen para las cabeceras multipart sobre MAX_FILE_SIZE
+MULTIPART_OVERHEAD = 64 * 1024
+
+# Prefijo de las URLs de imágenes direccionadas por contenido (api/avatares.py)
+AVATARS_URL = 'avatars/'
 
 class ImageService:
     """Servicio para el manejo de imágenes"""
     
-    def __init__(self, config: Config):
-        self.allowed_extensions = config.ALLOWED_EXTENSIONS
-        self.max_file_size = config.MAX_FILE_SIZE
-        self.image_size = config.IMAGE_SIZE
-        self.images_folder = config.IMAGES_FOLDER
+    def __init__(self, config: Dict[str, Any]):
+        self.allowed_extensions = config['ALLOWED_EXTENSIONS']
+        self.max_file_size = config['MAX_FILE_SIZE']
+        self.image_size = config['IMAGE_SIZE']
+        self.images_folder = config['IMAGES_FOLDER']
+        # Tamaños derivados en WebP (lado del cuadrado, en píxeles)
+        self.image_sizes = tuple(sorted(config.get('IMAGE_SIZES', ())))
+        self.webp_quality = config.get('IMAGE_WEBP_QUALITY', 80)
+        # Límite de píxeles comprobado en la cabecera, antes de decodificar
+        self.max_pixels = config.get('IMAGE_MAX_PIXELS', 40_000_000)
+    
+    @property
+    def max_request_size(self) -> int:
+        """Tamaño máximo de una petición de subida (fichero más cabeceras multipart)"""
+        return self.max_file_size + MULTIPART_OVERHEAD
     
     def is_allowed_file(self, filename: str) -> bool:
         """Verificar si el archivo tiene una extensión permitida"""
@@ -33,18 +51,35 @@ class ImageService:
         if not self.is_allowed_file(file.filename):
             return "Tipo de archivo no permitido"
         
-        # Verificar tamaño
-        file.seek(0, os.SEEK_END)
-        file_size = file.tell()
-        file.seek(0)
-        
-        if file_size > self.max_file_size:
-            return f"Archivo demasiado grande. Máximo {self.max_file_size // (1024*1024)}MB"
-        
+        # El tamaño se comprueba al copiar (stage_upload), sin recorrer el fichero antes
         return None
     
-    def resize_and_crop_image(self, image: Image.Image) -> Image.Image:
-        """Redimensionar y recortar imagen"""
+    def too_large_message(self) -> str:
+        return f"Archivo demasiado grande. Máximo {self.max_file_size // (1024*1024)}MB"
+    
+    def inspect(self, fuente: Union[str, IO[bytes]]) -> Optional[str]:
+        """Leer solo la cabecera: formato reconocible y píxeles dentro del límite"""
+        try:
+            with Image.open(fuente) as image:
+                return self._check_pixels(image)
+        except Image.DecompressionBombError:
+            return "Imagen con demasiados píxeles"
+        except Exception:
+            return "El archivo no es una imagen válida"
+    
+    def _check_pixels(self, image: Image.Image) -> Optional[str]:
+        ancho, alto = image.size
+        if ancho * alto > self.max_pixels:
+            return f"Imagen demasiado grande: {ancho}x{alto} píxeles (máximo {self.max_pixels // 1_000_000} megapíxeles)"
+        return None
+    
+    def resize_and_crop_image(self, image: Image.Image, size: Optional[Tuple[int, int]] = None,
+                              upscale: bool = False) -> Image.Image:
+        """Redimensionar y recortar imagen (por defecto a IMAGE_SIZE; con upscale, ampliando si es menor)"""
+        size = size or self.image_size
+        # JPEG: decodificar directamente a 1/2, 1/4 u 1/8 de escala si sobra resolución
+        if image.format == 'JPEG':
+            image.draft('RGB', size)
         # Convertir a RGB si es necesario
         if image.mode in ('RGBA', 'LA', 'P'):
             background = Image.new('RGB', image.size, (255, 255, 255))
@@ -54,48 +89,165 @@ class ImageService:
             image = background
         
         # Redimensionar manteniendo aspecto
-        image.thumbnail(self.image_size, Image.Resampling.LANCZOS)
+        escala = min(size[0] / image.size[0], size[1] / image.size[1])
+        if upscale and escala > 1:
+            image = image.resize((max(1, round(image.size[0] * escala)), max(1, round(image.size[1] * escala))),
+                                 Image.Resampling.LANCZOS)
+        else:
+            image.thumbnail(size, Image.Resampling.LANCZOS)
         
         # Crear imagen cuadrada con relleno si es necesario
-        if image.size != self.image_size:
-            background = Image.new('RGB', self.image_size, (255, 255, 255))
-            offset = ((self.image_size[0] - image.size[0]) // 2, 
-                     (self.image_size[1] - image.size[1]) // 2)
+        if image.size != size:
+            background = Image.new('RGB', size, (255, 255, 255))
+            offset = ((size[0] - image.size[0]) // 2, 
+                     (size[1] - image.size[1]) // 2)
             background.paste(image, offset)
             image = background
         
         return image
     
-    def save_image(self, file: FileStorage, persona_id: int) -> Tuple[Optional[str], Optional[str]]:
+    def save_image(self, file: FileStorage) -> Tuple[Optional[str], Optional[str]]:
         """Guardar archivo de imagen procesado"""
-        # Validar archivo
-        error = self.validate_file(file)
+        # Validar, copiar (con límite de tamaño) y procesar en esta misma petición
+        temporal, relative_path, error = self.stage_upload(file)
         if error:
             return None, error
         
         try:
-            # Crear directorio si no existe
-            self.images_folder.mkdir(parents=True, exist_ok=True)
-            
-            # Generar nombre único
-            file_extension = secure_filename(file.filename).rsplit('.', 1)[1].lower()
-            filename = f"user_{persona_id}_{uuid.uuid4().hex[:8]}.{file_extension}"
-            filepath = self.images_folder / filename
-            
-            # Procesar imagen
-            image = Image.open(file.stream)
-            processed_image = self.resize_and_crop_image(image)
-            
-            # Guardar imagen procesada
-            processed_image.save(filepath, quality=85, optimize=True)
-            
-            # Retornar ruta relativa
-            relative_path = f"static/images/users/{filename}"
+            if self.exists(relative_path):
+                os.remove(temporal)
+            else:
+                self.process_file(temporal, relative_path)
             return relative_path, None
             
         except Exception as e:
             return None, f"Error procesando imagen: {str(e)}"
     
+    def stage_upload(self, file: FileStorage) -> Tuple[Optional[str], Optional[str], Optional[str]]:
+        """Validar la subida y volcarla a un temporal: (temporal, URL por contenido, error)
+        
+        El hash se calcula mientras se copia; el procesado con Pillow se hace
+        después con process_file, fuera de la petición.
+        """
+        error = self.validate_file(file)
+        if error:
+            return None, None, error
+        
+        file_extension = self.file_extension(file.filename)
+        digest = hashlib.sha256()
+        copiados = 0
+        fd, temporal = tempfile.mkstemp(prefix='subida_', suffix=f'.{file_extension}')
+        with os.fdopen(fd, 'wb') as destino:
+            for bloque in iter(lambda: file.stream.read(64 * 1024), b''):
+                copiados += len(bloque)
+                if copiados > self.max_file_size:
+                    break
+                digest.update(bloque)
+                destino.write(bloque)
+        
+        error = self.too_large_message() if copiados > self.max_file_size else self.inspect(temporal)
+        if error:
+            os.remove(temporal)
+            return None, None, error
+        return temporal, self.content_url(digest.hexdigest(), file_extension), None
+    
+    @staticmethod
+    def file_extension(filename: str) -> str:
+        """Extensión normalizada de un nombre de fichero (jpeg -> jpg)"""
+        extension = secure_filename(filename).rsplit('.', 1)[1].lower()
+        return 'jpg' if extension == 'jpeg' else extension
+    
+    @staticmethod
+    def content_url(digest: str, extension: str) -> str:
+        """URL de una imagen direccionada por contenido (128 bits del SHA-256)"""
+        return f"{AVATARS_URL}{digest[:32]}.{extension}"
+    
+    def file_path(self, image_path: str) -> Path:
+        """Ruta en disco de una imagen a partir de su URL relativa"""
+        if image_path.startswith(AVATARS_URL):
+            # Subdirectorio por prefijo del hash para no tener un directorio gigante
+            nombre = Path(image_path).name
+            return self.images_folder / nombre[:2] / nombre
+        if image_path.startswith('static/images/users/'):
+            return self.images_folder / Path(image_path).name
+        if image_path.startswith('static/'):
+            return Path(__file__).parent.parent / image_path
+        return Path(image_path)
+    
+    def exists(self, image_path: str) -> bool:
+        """Comprobar si la imagen ya está procesada (la de respaldo se escribe la última)"""
+        return self.file_path(image_path).exists()
+    
+    def process_file(self, origen: str, relative_path: str) -> str:
+        """Redimensionar el temporal subido, guardarlo como imagen final y borrar el temporal"""
+        try:
+            return self._process(origen, relative_path)
+        finally:
+            if os.path.exists(origen):
+                os.remove(origen)
+    
+    def process_bytes(self, datos: bytes, relative_path: str) -> str:
+        """Procesar una imagen recibida en memoria (p. ej. una entrada de un ZIP)"""
+        return self._process(io.BytesIO(datos), relative_path)
+    
+    def _process(self, fuente: Union[str, IO[bytes]], relative_path: str) -> str:
+        with Image.open(fuente) as image:
+            error = self._check_pixels(image)
+            if error:
+                raise ValueError(error)
+            self.save_variants(image, relative_path)
+        return relative_path
+    
+    def save_variants(self, image: Image.Image, relative_path: str) -> None:
+        """Guardar la imagen de respaldo (IMAGE_SIZE, formato original) y las derivadas WebP
+        
+        Se decodifica y recorta una sola vez al mayor tamaño; los demás salen de ese cuadrado.
+        Una imagen menor se amplía hasta ese tamaño: si se rellenara sin ampliar, al reducir
+        el cuadrado encogería también la imagen (100x100 quedaría en 50x50 dentro de 150).
+        """
+        lado = max(self.image_sizes + self.image_size)
+        base = self.resize_and_crop_image(image, (lado, lado), upscale=True)
+        destino = self.file_path(relative_path)
+        destino.parent.mkdir(parents=True, exist_ok=True)
+        
+        # Cada fichero se publica de forma atómica: se sirven como inmutables y otra subida
+        # de la misma imagen (o el barrido) puede estar escribiendo los mismos nombres
+        for size in self.image_sizes:
+            derivada = base if size == lado else base.resize((size, size), Image.Resampling.LANCZOS)
+            self._publish(derivada, self.file_path(derivative_path(relative_path, size)),
+                          format='WEBP', quality=self.webp_quality, method=4)
+        
+        # La de respaldo se publica la última: si existe, existen todas
+        fallback = base if base.size == self.image_size else base.resize(self.image_size, Image.Resampling.LANCZOS)
+        self._publish(fallback, destino, format=Image.registered_extensions()[destino.suffix],
+                      quality=85, optimize=True)
+    
+    @staticmethod
+    def _publish(image: Image.Image, destino: Path, **opciones) -> None:
+        """Guardar en un temporal junto al destino y renombrarlo encima (nunca se ve a medias)"""
+        temporal = destino.with_name(f'.{destino.name}.{os.getpid()}.{threading.get_ident()}.tmp')
+        try:
+            image.save(temporal, **opciones)
+            os.replace(temporal, destino)
+        finally:
+            if temporal.exists():
+                temporal.unlink()
+    
+    def pick_size(self, pixels: int) -> Optional[int]:
+        """Menor tamaño derivado que cubre los píxeles pedidos (el mayor si ninguno llega)"""
+        if not self.image_sizes:
+            return None
+        return next((size for size in self.image_sizes if size >= pixels), self.image_sizes[-1])
+    
+    def avatar_url(self, image_path: str, size: Optional[int]) -> str:
+        """URL de la derivada pedida, o la de respaldo si la imagen es anterior a las derivadas"""
+        if not size or not image_path:
+            return image_path
+        derivada = derivative_path(image_path, size)
+        if self.file_path(derivada).exists():
+            return derivada
+        return image_path
+    
     def delete_image(self, image_path: str) -> bool:
         """Eliminar archivo de imagen"""
         if not image_path:
@@ -103,14 +255,27 @@ class ImageService:
         
         try:
             # Construir ruta absoluta desde la ruta relativa
-            if image_path.startswith('static/'):
-                full_path = Path(__file__).parent.parent / image_path
-            else:
-                full_path = Path(image_path)
+            full_path = self.file_path(image_path)
             
             if full_path.exists():
                 full_path.unlink()
+            for size in self.image_sizes:
+                derivada = self.file_path(derivative_path(image_path, size))
+                if derivada.exists():
+                    derivada.unlink()
             return True
         except Exception as e:
             print(f"Error eliminando imagen: {e}")
-            return False
\ No newline at end of file
+            return False
+
+def derivative_path(image_path: str, size: int) -> str:
+    """Ruta de la derivada WebP de una imagen: avatars/<hash>.jpg -> avatars/<hash>_64.webp"""
+    return f"{image_path.rsplit('.', 1)[0]}_{size}.webp"
+
+def procesar_imagen(config: Dict[str, Any], origen: str, relative_path: str) -> str:
+    """Punto de entrada en los procesos del pool de imágenes (debe ser importable)"""
+    return ImageService(config).process_file(origen, relative_path)
+
+def procesar_datos(config: Dict[str, Any], datos: bytes, relative_path: str) -> str:
+    """Como procesar_imagen, pero con la imagen en memoria (subidas por lotes)"""
+    return ImageService(config).process_bytes(datos, relative_path)
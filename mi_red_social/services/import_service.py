@@ -0,0 +1,306 @@
+# =================================================================
+# services/import_service.py - Importación masiva de personas y relaciones
+# =================================================================
+
+import csv
+import io
+import json
+import time
+from itertools import islice
+from typing import Dict, List, Any, Optional, Iterable, Iterator, Tuple, IO
+from models.persona import PersonaRepository, Persona
+from models.relacion import RelacionRepository, Relacion
+
+FORMATOS = ('csv', 'jsonl')
+ENTIDADES = ('personas', 'relaciones')
+
+class ImportService:
+    """Importa CSV/JSONL en streaming, validando fila a fila e insertando por lotes"""
+
+    def __init__(self, persona_repo: PersonaRepository, relacion_repo: RelacionRepository,
+                 chunk_size: int = 2000, max_errors: int = 1000):
+        self.persona_repo = persona_repo
+        self.relacion_repo = relacion_repo
+        self.chunk_size = chunk_size
+        self.max_errors = max_errors
+
+    @staticmethod
+    def detect_format(filename: Optional[str], formato: Optional[str] = None) -> Optional[str]:
+        """Formato explícito o deducido de la extensión del fichero"""
+        if formato:
+            return formato.lower() if formato.lower() in FORMATOS else None
+        extension = (filename or '').rsplit('.', 1)[-1].lower()
+        if extension in ('jsonl', 'ndjson'):
+            return 'jsonl'
+        return 'csv' if extension == 'csv' else None
+
+    def parse(self, stream: IO[bytes], formato: str) -> Iterator[Tuple[int, Optional[Dict[str, Any]], Optional[str]]]:
+        """Leer filas sin cargar el fichero entero: (número de fila, datos, error)"""
+        # Los bytes que no son UTF-8 quedan como sustitutos y solo invalidan su fila
+        texto = io.TextIOWrapper(stream, encoding='utf-8-sig', errors='surrogateescape', newline='')
+        if formato == 'csv':
+            lector = csv.DictReader(texto)
+            # La fila 1 es la cabecera
+            for numero, fila in enumerate(lector, start=2):
+                datos = {k.strip(): (v.strip() if isinstance(v, str) else v) for k, v in fila.items() if k}
+                if not all(self._is_utf8(v) for v in datos.values() if isinstance(v, str)):
+                    yield numero, None, 'La fila no es texto UTF-8 válido'
+                    continue
+                yield numero, datos, None
+        else:
+            for numero, linea in enumerate(texto, start=1):
+                linea = linea.strip()
+                if not linea:
+                    continue
+                if not self._is_utf8(linea):
+                    yield numero, None, 'La línea no es texto UTF-8 válido'
+                    continue
+                try:
+                    datos = json.loads(linea)
+                except ValueError as e:
+                    yield numero, None, f'JSON inválido: {e}'
+                    continue
+                if not isinstance(datos, dict):
+                    yield numero, None, 'Cada línea debe ser un objeto JSON'
+                    continue
+                yield numero, datos, None
+
+    def import_stream(self, entidad: str, stream: IO[bytes], formato: str) -> Dict[str, Any]:
+        """Importar un fichero completo y devolver el informe"""
+        filas = self.parse(stream, formato)
+        if entidad == 'personas':
+            return self.import_personas(filas)
+        return self.import_relaciones(filas)
+
+    def import_personas(self, filas: Iterable[Tuple[int, Optional[Dict[str, Any]], Optional[str]]]) -> Dict[str, Any]:
+        """Importar personas por lotes; los nombres ya existentes se reportan como error"""
+        informe = self._new_report('personas')
+        vistos = set()
+
+        for lote in self._chunks(filas):
+            validas: List[Tuple[int, Persona]] = []
+            for numero, datos, error in lote:
+                informe['procesadas'] += 1
+                if error:
+                    self._add_error(informe, numero, error)
+                    continue
+                persona, error = self._build_persona(datos)
+                if error:
+                    self._add_error(informe, numero, error)
+                elif persona.nombre in vistos:
+                    self._add_error(informe, numero, f'Nombre duplicado en el fichero: "{persona.nombre}"')
+                else:
+                    vistos.add(persona.nombre)
+                    validas.append((numero, persona))
+
+            if not validas:
+                continue
+            existentes = self.persona_repo.get_ids_by_names([p.nombre for _, p in validas])
+            nuevas = []
+            for numero, persona in validas:
+                if persona.nombre in existentes:
+                    self._add_error(informe, numero, f'Ya existe un contacto llamado "{persona.nombre}"')
+                else:
+                    nuevas.append((numero, persona))
+
+            creadas = self.persona_repo.create_many([p for _, p in nuevas]) if nuevas else {}
+            informe['insertadas'] += len(creadas)
+            # Solo puede faltar alguna si otro escritor creó el mismo nombre entre medias
+            for numero, persona in nuevas:
+                if persona.nombre not in creadas:
+                    self._add_error(informe, numero, f'Ya existe un contacto llamado "{persona.nombre}"')
+
+        return self._finish_report(informe)
+
+    def import_relaciones(self, filas: Iterable[Tuple[int, Optional[Dict[str, Any]], Optional[str]]]) -> Dict[str, Any]:
+        """Importar relaciones por lotes resolviendo personas por id o por nombre"""
+        informe = self._new_report('relaciones')
+        ids_por_nombre: Dict[str, Optional[int]] = {}
+        vistos = set()
+
+        for lote in self._chunks(filas):
+            # Resolver de una vez los nombres del lote que aún no conocemos
+            nombres = {
+                datos.get(campo).strip()
+                for _, datos, error in lote if not error
+                for campo in ('persona1', 'persona2') if isinstance(datos.get(campo), str)
+            } - ids_por_nombre.keys()
+            if nombres:
+                resueltos = self.persona_repo.get_ids_by_names(list(nombres))
+                ids_por_nombre.update({nombre: resueltos.get(nombre) for nombre in nombres})
+                existentes_ids = set(resueltos.values())
+            else:
+                existentes_ids = set()
+
+            # Los ids numéricos también deben existir
+            ids_directos = {
+                self._int_value(datos.get(campo))
+                for _, datos, error in lote if not error
+                for campo in ('persona1_id', 'persona2_id')
+            } - {None}
+            ids_validos = existentes_ids | self._existing_persona_ids(ids_directos)
+
+            validas: List[Tuple[int, Relacion]] = []
+            for numero, datos, error in lote:
+                informe['procesadas'] += 1
+                if error:
+                    self._add_error(informe, numero, error)
+                    continue
+                relacion, error = self._build_relacion(datos, ids_por_nombre, ids_validos)
+                if error:
+                    self._add_error(informe, numero, error)
+                    continue
+                par = (relacion.persona1_id, relacion.persona2_id)
+                if par in vistos or par[::-1] in vistos:
+                    self._add_error(informe, numero, 'Relación duplicada en el fichero')
+                    continue
+                vistos.add(par)
+                validas.append((numero, relacion))
+
+            if not validas:
+                continue
+            existentes = self.relacion_repo.get_existing_pairs(
+                [(r.persona1_id, r.persona2_id) for _, r in validas]
+            )
+            nuevas = []
+            for numero, relacion in validas:
+                if (relacion.persona1_id, relacion.persona2_id) in existentes:
+                    self._add_error(informe, numero, 'Ya existe una relación entre estos contactos')
+                else:
+                    nuevas.append(relacion)
+
+            if nuevas:
+                creadas = self.relacion_repo.create_many(nuevas)
+                informe['insertadas'] += creadas
+                informe['omitidas'] += len(nuevas) - creadas
+
+        return self._finish_report(informe)
+
+    def _existing_persona_ids(self, ids: set) -> set:
+        """Filtrar los ids numéricos que corresponden a personas existentes"""
+        return {p.id for p in self.persona_repo.get_by_ids(list(ids))} if ids else set()
+
+    @staticmethod
+    def _is_utf8(texto: str) -> bool:
+        """Falso si el texto arrastra bytes no UTF-8 (decodificados como sustitutos)"""
+        try:
+            texto.encode('utf-8')
+            return True
+        except UnicodeEncodeError:
+            return False
+
+    @staticmethod
+    def _text_value(datos: Dict[str, Any], campo: str, defecto: str) -> Tuple[Optional[str], Optional[str]]:
+        """Texto de un campo (los números valen como texto); error si es lista, objeto o booleano"""
+        valor = datos.get(campo)
+        if valor is None or valor == '':
+            return defecto, None
+        if isinstance(valor, bool) or not isinstance(valor, (str, int, float)):
+            return None, f'{campo} debe ser un texto'
+        return str(valor), None
+
+    @staticmethod
+    def _int_value(valor: Any) -> Optional[int]:
+        """Entero de un valor escalar (número entero o texto numérico); None si no lo es"""
+        if isinstance(valor, bool):
+            return None
+        if isinstance(valor, int):
+            return valor
+        if isinstance(valor, float):
+            return int(valor) if valor.is_integer() else None
+        if isinstance(valor, str):
+            try:
+                return int(valor.strip())
+            except ValueError:
+                return None
+        return None
+
+    @classmethod
+    def _build_persona(cls, datos: Dict[str, Any]) -> Tuple[Optional[Persona], Optional[str]]:
+        """Validar una fila de persona"""
+        campos = {}
+        for campo, defecto in (('nombre', ''), ('icono', 'user'), ('grupo', 'contactos'),
+                               ('color', '#3b82f6'), ('descripcion', '')):
+            campos[campo], error = cls._text_value(datos, campo, defecto)
+            if error:
+                return None, error
+        campos['nombre'] = campos['nombre'].strip()
+        if not campos['nombre']:
+            return None, 'El nombre es requerido'
+        return Persona(**campos), None
+
+    @classmethod
+    def _build_relacion(cls, datos: Dict[str, Any], ids_por_nombre: Dict[str, Optional[int]],
+                        ids_validos: set) -> Tuple[Optional[Relacion], Optional[str]]:
+        """Validar una fila de relación (persona1/persona2 por nombre o persona1_id/persona2_id)"""
+        extremos = []
+        for campo in ('persona1', 'persona2'):
+            valor_id = datos.get(f'{campo}_id')
+            nombre = datos.get(campo)
+            if valor_id not in (None, ''):
+                persona_id = cls._int_value(valor_id)
+                if persona_id is None:
+                    return None, f'{campo}_id no es un número'
+                if persona_id not in ids_validos:
+                    return None, f'No existe la persona con id {persona_id}'
+            elif nombre:
+                if not isinstance(nombre, str):
+                    return None, f'{campo} debe ser un texto'
+                persona_id = ids_por_nombre.get(nombre.strip())
+                if persona_id is None:
+                    return None, f'No existe la persona "{nombre}"'
+            else:
+                return None, f'Falta {campo} o {campo}_id'
+            extremos.append(persona_id)
+
+        if extremos[0] == extremos[1]:
+            return None, 'No puedes crear una relación de un contacto consigo mismo'
+
+        valor = datos.get('fortaleza')
+        fortaleza = 5 if valor in (None, '') else cls._int_value(valor)
+        if fortaleza is None:
+            return None, 'La fortaleza debe ser un número'
+        if not 1 <= fortaleza <= 10:
+            return None, 'La fortaleza debe estar entre 1 y 10'
+
+        tipo, error = cls._text_value(datos, 'tipo', 'profesional')
+        if error:
+            return None, error
+        contexto, error = cls._text_value(datos, 'contexto', '')
+        if error:
+            return None, error
+
+        return Relacion(
+            persona1_id=extremos[0],
+            persona2_id=extremos[1],
+            tipo=tipo,
+            fortaleza=fortaleza,
+            contexto=contexto
+        ), None
+
+    def _chunks(self, filas: Iterable) -> Iterator[List]:
+        iterador = iter(filas)
+        while True:
+            lote = list(islice(iterador, self.chunk_size))
+            if not lote:
+                return
+            yield lote
+
+    @staticmethod
+    def _new_report(entidad: str) -> Dict[str, Any]:
+        return {'entidad': entidad, 'procesadas': 0, 'insertadas': 0, 'omitidas': 0,
+                'num_errores': 0, 'errores': [], 'inicio': time.time()}
+
+    def _add_error(self, informe: Dict[str, Any], fila: int, mensaje: str) -> None:
+        """Anotar un error de fila sin abortar la importación (se guardan los primeros)"""
+        informe['num_errores'] += 1
+        if len(informe['errores']) < self.max_errors:
+            informe['errores'].append({'fila': fila, 'error': mensaje})
+
+    @staticmethod
+    def _finish_report(informe: Dict[str, Any]) -> Dict[str, Any]:
+        duracion = time.time() - informe.pop('inicio')
+        informe['errores'].sort(key=lambda error: error['fila'])
+        informe['duracion'] = round(duracion, 3)
+        informe['filas_por_segundo'] = int(informe['procesadas'] / duracion) if duracion > 0 else None
+        return informe
@@ -0,0 +1,126 @@
+# =================================================================
+# services/jobs.py - Trabajos en segundo plano
+# =================================================================
+
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Any, Optional, Callable
+
+PENDIENTE = 'pendiente'
+EJECUTANDO = 'ejecutando'
+COMPLETADO = 'completado'
+ERROR = 'error'
+
+class Job:
+    """Trabajo encolado con su estado y resultado"""
+
+    def __init__(self, tipo: str):
+        self.id = uuid.uuid4().hex[:12]
+        self.tipo = tipo
+        self.estado = PENDIENTE
+        self.resultado: Any = None
+        self.error: Optional[str] = None
+        self.creado = time.time()
+        self.terminado: Optional[float] = None
+
+    @property
+    def finished(self) -> bool:
+        return self.estado in (COMPLETADO, ERROR)
+
+    def to_dict(self, include_result: bool = True) -> Dict[str, Any]:
+        """Convertir a diccionario"""
+        data = {
+            'id': self.id,
+            'tipo': self.tipo,
+            'estado': self.estado,
+            'error': self.error,
+            'creado': self.creado,
+            'terminado': self.terminado,
+            'duracion': round(self.terminado - self.creado, 3) if self.terminado else None
+        }
+        if include_result:
+            data['resultado'] = self.resultado
+        return data
+
+class JobManager:
+    """Registro de trabajos ejecutados en un pool de hilos fuera de las peticiones"""
+
+    def __init__(self, max_workers: int = 2, retention: int = 100):
+        self.retention = retention
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='job')
+        self._jobs: Dict[str, Job] = {}
+        self._lock = threading.Lock()
+
+    def submit(self, tipo: str, fn: Callable[..., Any], *args, **kwargs) -> Job:
+        """Encolar un trabajo y devolverlo sin esperar a que termine"""
+        job = self.register(tipo)
+        self._executor.submit(self._run, job, fn, args, kwargs)
+        return job
+
+    def register(self, tipo: str) -> Job:
+        """Registrar un trabajo que se ejecuta fuera de este pool (p. ej. en procesos)"""
+        job = Job(tipo)
+        with self._lock:
+            self._jobs[job.id] = job
+            self._prune()
+        return job
+
+    def run(self, fn: Callable[..., Any], *args) -> None:
+        """Ejecutar fn(*args) en el pool de hilos para un trabajo ya registrado (fn lo termina)"""
+        self._executor.submit(fn, *args)
+
+    def finish(self, job: Job, resultado: Any = None, error: Optional[str] = None) -> None:
+        """Marcar un trabajo como terminado con su resultado o su error"""
+        if error is not None:
+            print(f"❌ Error en trabajo {job.tipo} {job.id}: {error}")
+            job.error = error
+            job.estado = ERROR
+        else:
+            job.resultado = resultado
+            job.estado = COMPLETADO
+        job.terminado = time.time()
+
+    def _run(self, job: Job, fn: Callable[..., Any], args: tuple, kwargs: dict) -> None:
+        job.estado = EJECUTANDO
+        try:
+            resultado = fn(*args, **kwargs)
+        except Exception as e:
+            self.finish(job, error=str(e))
+        else:
+            self.finish(job, resultado)
+
+    def _prune(self) -> None:
+        """Olvidar los trabajos terminados más antiguos por encima de la retención"""
+        terminados = [job for job in self._jobs.values() if job.finished]
+        sobrantes = len(self._jobs) - self.retention
+        for job in sorted(terminados, key=lambda j: j.creado)[:max(sobrantes, 0)]:
+            del self._jobs[job.id]
+
+    def get(self, job_id: str) -> Optional[Job]:
+        """Obtener un trabajo por id"""
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def list(self, tipo: Optional[str] = None) -> List[Job]:
+        """Trabajos registrados, del más reciente al más antiguo"""
+        with self._lock:
+            jobs = [job for job in self._jobs.values() if tipo is None or job.tipo == tipo]
+        return sorted(jobs, key=lambda j: j.creado, reverse=True)
+
+    def stats(self) -> Dict[str, Any]:
+        """Recuento de trabajos por estado"""
+        with self._lock:
+            estados: Dict[str, int] = {}
+            for job in self._jobs.values():
+                estados[job.estado] = estados.get(job.estado, 0) + 1
+        return {'trabajos': sum(estados.values()), **estados}
+
+    def shutdown(self) -> None:
+        """Detener el pool esperando a los trabajos en curso"""
+        self._executor.shutdown(wait=True)
+
+def get_job_manager(app) -> JobManager:
+    """Obtener el gestor de trabajos de la aplicación"""
+    return app.extensions['jobs']
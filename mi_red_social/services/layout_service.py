@@ -0,0 +1,255 @@
+# =================================================================
+# services/layout_service.py - Layout del grafo calculado en el servidor
+# =================================================================
+
+import time
+from typing import Dict, Any
+import numpy as np
+from models.persona import PersonaRepository
+from services.graph_engine import GraphEngine, GraphSnapshot
+
+MODOS = ('incremental', 'full')
+
+class LayoutService:
+    """Fruchterman-Reingold vectorizado con repulsión lejana aproximada por rejillas jerárquicas (estilo Barnes-Hut)"""
+
+    # Pares nodo-nodo evaluados a la vez en el campo cercano (acota la memoria por iteración)
+    PARES_POR_LOTE = 1_000_000
+    # Profundidad máxima de la pirámide de rejillas (1024x1024 celdas en el nivel más fino)
+    MAX_NIVELES = 10
+
+    def __init__(self, engine: GraphEngine, persona_repo: PersonaRepository, iterations: int = 100,
+                 distance: float = 150.0, nodes_per_cell: int = 16, seed: int = 0):
+        self.engine = engine
+        self.persona_repo = persona_repo
+        self.iterations = iterations
+        self.distance = distance
+        self.nodes_per_cell = nodes_per_cell
+        self.seed = seed
+
+    def compute(self, modo: str = 'incremental') -> Dict[str, Any]:
+        """Calcular posiciones; en modo incremental solo se colocan los nodos sin posición"""
+        inicio = time.time()
+        snapshot = self.engine.snapshot()
+        n = snapshot.num_nodes
+        rng = np.random.default_rng(self.seed)
+
+        personas = {p.id: p for p in self.persona_repo.get_all()}
+        pos = np.zeros((n, 2))
+        colocado = np.zeros(n, dtype=bool)
+        for i, persona_id in enumerate(snapshot.node_ids.tolist()):
+            persona = personas.get(persona_id)
+            if persona and persona.posicion_x is not None and persona.posicion_y is not None:
+                pos[i] = (persona.posicion_x, persona.posicion_y)
+                colocado[i] = True
+
+        # Sin nada colocado no hay a qué anclar los nodos nuevos
+        if modo == 'incremental' and colocado.any():
+            movibles = ~colocado
+            iteraciones = max(self.iterations // 2, 10)
+            temperatura = self.distance
+        else:
+            modo = 'full'
+            movibles = np.ones(n, dtype=bool)
+            iteraciones = self.iterations
+            temperatura = self.distance * max(np.sqrt(n), 1.0) / 4.0
+
+        if movibles.any():
+            pos = self._place_new(snapshot, pos, colocado, rng)
+            pos = self._fruchterman_reingold(snapshot, pos, movibles, iteraciones, temperatura)
+
+        return {
+            'version': snapshot.version,
+            'modo': modo,
+            'nodos': n,
+            'movidos': int(movibles.sum()),
+            'iteraciones': iteraciones if movibles.any() else 0,
+            'duracion': round(time.time() - inicio, 3),
+            'posiciones': {
+                int(snapshot.node_ids[i]): {'x': round(float(pos[i, 0]), 2), 'y': round(float(pos[i, 1]), 2)}
+                for i in np.flatnonzero(movibles)
+            }
+        }
+
+    def apply(self, resultado: Dict[str, Any]) -> int:
+        """Guardar las posiciones calculadas marcándolas como fijas"""
+        if not resultado['posiciones']:
+            return 0
+        return self.persona_repo.update_positions(resultado['posiciones'], fija=True)
+
+    def _place_new(self, snapshot: GraphSnapshot, pos: np.ndarray, colocado: np.ndarray,
+                   rng: np.random.Generator) -> np.ndarray:
+        """Colocar cada nodo sin posición junto al centro de sus vecinos ya colocados"""
+        pos, colocado = pos.copy(), colocado.copy()
+        src = snapshot.sources()
+        dst = snapshot.indices
+
+        # Avanza en oleadas desde los nodos colocados (BFS sobre todo el grafo a la vez)
+        while not colocado.all():
+            validas = ~colocado[src] & colocado[dst]
+            if not validas.any():
+                break
+            origen, vecino = src[validas], dst[validas]
+            cuenta = np.bincount(origen, minlength=len(pos))
+            nuevos = np.flatnonzero(cuenta)
+            for eje in (0, 1):
+                suma = np.bincount(origen, weights=pos[vecino, eje], minlength=len(pos))
+                pos[nuevos, eje] = suma[nuevos] / cuenta[nuevos]
+            pos[nuevos] += rng.normal(scale=self.distance / 2, size=(len(nuevos), 2))
+            colocado[nuevos] = True
+
+        # Componentes sin ningún nodo colocado: al azar en un disco alrededor del centro
+        resto = np.flatnonzero(~colocado)
+        if len(resto):
+            centro = pos[colocado].mean(axis=0) if colocado.any() else np.zeros(2)
+            radio = self.distance * max(np.sqrt(len(pos)), 1.0) / 2
+            angulo = rng.uniform(0, 2 * np.pi, len(resto))
+            r = radio * np.sqrt(rng.uniform(0, 1, len(resto)))
+            pos[resto] = centro + np.column_stack([r * np.cos(angulo), r * np.sin(angulo)])
+        return pos
+
+    def _fruchterman_reingold(self, snapshot: GraphSnapshot, pos: np.ndarray, movibles: np.ndarray,
+                              iteraciones: int, temperatura: float) -> np.ndarray:
+        """Iteraciones de fuerzas con enfriamiento lineal; solo se desplazan los nodos movibles"""
+        n = len(pos)
+        k = self.distance
+        src = snapshot.sources()
+        dst = snapshot.indices
+        pesos = snapshot.weights / snapshot.weights.mean() if len(snapshot.weights) else snapshot.weights
+
+        pos = pos.copy()
+        for it in range(iteraciones):
+            desplazamiento = self._repulsion(pos, k)
+
+            # Atracción d²/k a lo largo de cada relación, más fuerte cuanto mayor la fortaleza
+            delta = pos[src] - pos[dst]
+            d = np.maximum(np.hypot(delta[:, 0], delta[:, 1]), 0.01)
+            factor = d / k * pesos
+            for eje in (0, 1):
+                desplazamiento[:, eje] -= np.bincount(src, weights=delta[:, eje] * factor, minlength=n)
+
+            # Limitar el paso a la temperatura actual
+            t = temperatura * (1.0 - it / iteraciones)
+            largo = np.maximum(np.hypot(desplazamiento[:, 0], desplazamiento[:, 1]), 1e-9)
+            desplazamiento *= (np.minimum(largo, t) / largo)[:, None]
+            pos[movibles] += desplazamiento[movibles]
+
+        return pos
+
+    def _repulsion(self, pos: np.ndarray, k: float) -> np.ndarray:
+        """Repulsión k²/d: exacta con las celdas vecinas y por centroides en una pirámide de rejillas para el resto"""
+        n = len(pos)
+        niveles = int(np.ceil(np.log2(max(np.sqrt(n / self.nodes_per_cell), 1.0))))
+        if niveles < 2:
+            return self._exact_repulsion(pos, pos, k)
+
+        # Con densidad desigual se subdivide más: el campo cercano exacto es cuadrático por celda
+        minimo = pos.min(axis=0)
+        extension = pos.max(axis=0) - minimo
+        while True:
+            lado = 1 << niveles
+            cxy = np.minimum(((pos - minimo) / (extension / lado + 1e-9)).astype(np.int64), lado - 1)
+            masa = np.bincount(cxy[:, 0] * lado + cxy[:, 1])
+            if niveles >= self.MAX_NIVELES or (masa.astype(np.float64) ** 2).sum() <= 4 * n * self.nodes_per_cell:
+                break
+            niveles += 1
+
+        # Campo lejano: cada nivel aporta las celdas que su madre no pudo aproximar; la celda
+        # lo recibe en su centroide y lo reparte tal cual entre sus nodos (estilo Barnes-Hut)
+        fuerza = np.zeros((n, 2))
+        for nivel in range(2, niveles + 1):
+            fuerza += self._far_field(pos, cxy >> (niveles - nivel), 1 << nivel, k)
+
+        # Campo cercano: exacto entre los nodos de cada celda y los de su vecindario 3x3
+        fuerza += self._near_field(pos, cxy, lado, k)
+        return fuerza
+
+    def _near_field(self, pos: np.ndarray, cxy: np.ndarray, lado: int, k: float) -> np.ndarray:
+        """Repulsión exacta de cada nodo con los de su celda y las 8 vecinas, por lotes de pares acotados"""
+        n = len(pos)
+        celda = cxy[:, 0] * lado + cxy[:, 1]
+        orden = np.argsort(celda, kind='stable')
+        ordenadas = pos[orden]
+        x, y = cxy[orden, 0], cxy[orden, 1]
+        masa = np.bincount(celda, minlength=lado * lado)
+        offsets = np.zeros(lado * lado + 1, dtype=np.int64)
+        np.cumsum(masa, out=offsets[1:])
+
+        fuerza = np.zeros((n, 2))
+        for dx in (-1, 0, 1):
+            for dy in (-1, 0, 1):
+                tx, ty = x + dx, y + dy
+                validas = (tx >= 0) & (tx < lado) & (ty >= 0) & (ty < lado)
+                vecina = np.where(validas, tx * lado + ty, 0)
+                cuenta = np.where(validas, masa[vecina], 0)
+                acumulado = np.cumsum(cuenta)
+                inicio = 0
+                while inicio < n:
+                    # Tantos nodos como quepan en PARES_POR_LOTE pares (al menos uno)
+                    base = acumulado[inicio - 1] if inicio else 0
+                    fin = max(int(np.searchsorted(acumulado, base + self.PARES_POR_LOTE, side='right')), inicio + 1)
+                    c = cuenta[inicio:fin]
+                    total = int(c.sum())
+                    if total:
+                        i = np.repeat(np.arange(inicio, fin), c)
+                        j = np.repeat(offsets[vecina[inicio:fin]] - np.cumsum(c) + c, c) + np.arange(total)
+                        delta = ordenadas[i] - ordenadas[j]
+                        d2 = (delta ** 2).sum(axis=1)
+                        f = k * k / np.maximum(d2, 0.01)
+                        # Un nodo no se repele a sí mismo (distancia exactamente cero)
+                        f[d2 == 0] = 0.0
+                        for eje in (0, 1):
+                            fuerza[inicio:fin, eje] += np.bincount(i - inicio, weights=delta[:, eje] * f,
+                                                                   minlength=fin - inicio)
+                    inicio = fin
+
+        resultado = np.empty_like(fuerza)
+        resultado[orden] = fuerza
+        return resultado
+
+    @staticmethod
+    def _far_field(pos: np.ndarray, cxy: np.ndarray, lado: int, k: float) -> np.ndarray:
+        """Repulsión entre centroides de un nivel: hijas de las vecinas de la madre que no son vecinas
+
+        Son a lo sumo 27 celdas por celda, así que el coste es lineal en celdas ocupadas.
+        """
+        celda = cxy[:, 0] * lado + cxy[:, 1]
+        total_celdas = lado * lado
+        masa = np.bincount(celda, minlength=total_celdas)
+        centroide = np.column_stack([
+            np.bincount(celda, weights=pos[:, eje], minlength=total_celdas) for eje in (0, 1)
+        ]) / np.maximum(masa, 1)[:, None]
+        ocupadas = np.flatnonzero(masa)
+        x, y = ocupadas // lado, ocupadas % lado
+
+        campo = np.zeros((total_celdas, 2))
+        for dx in range(-3, 4):
+            for dy in range(-3, 4):
+                if max(abs(dx), abs(dy)) <= 1:
+                    continue
+                tx, ty = x + dx, y + dy
+                validas = ((tx >= 0) & (tx < lado) & (ty >= 0) & (ty < lado)
+                           & (np.abs((tx >> 1) - (x >> 1)) <= 1) & (np.abs((ty >> 1) - (y >> 1)) <= 1))
+                origen = ocupadas[validas]
+                destino = tx[validas] * lado + ty[validas]
+                con_masa = masa[destino] > 0
+                origen, destino = origen[con_masa], destino[con_masa]
+                delta = centroide[origen] - centroide[destino]
+                d2 = np.maximum((delta ** 2).sum(axis=1), 0.01)
+                # Cada celda aparece una vez por desplazamiento: no hace falta np.add.at
+                campo[origen] += delta * (masa[destino] * k * k / d2)[:, None]
+        return campo[celda]
+
+    @staticmethod
+    def _exact_repulsion(destino: np.ndarray, fuente: np.ndarray, k: float) -> np.ndarray:
+        """Suma de repulsiones de todos los puntos fuente sobre cada punto destino"""
+        delta = destino[:, None, :] - fuente[None, :, :]
+        d2 = (delta ** 2).sum(axis=2)
+        f = k * k / np.maximum(d2, 0.01)
+        # Un nodo no se repele a sí mismo (distancia exactamente cero)
+        f[d2 == 0] = 0.0
+        return (delta * f[:, :, None]).sum(axis=1)
+
+def get_layout_service(app) -> LayoutService:
+    """Obtener el servicio de layout de la aplicación"""
+    return app.extensions['layout']
@@ -0,0 +1,166 @@
+# =================================================================
+# services/path_service.py - Caminos entre personas sobre el motor en memoria
+# =================================================================
+
+import heapq
+from typing import Dict, List, Any, Optional, Tuple
+import numpy as np
+from services.graph_engine import GraphEngine, GraphSnapshot
+
+MODOS = ('hops', 'strength')
+
+class PathService:
+    """Caminos mínimos (saltos) y más fuertes (fortaleza) con búsqueda bidireccional"""
+
+    def __init__(self, engine: GraphEngine):
+        self.engine = engine
+
+    def find_path(self, origen_id: int, destino_id: int, modo: str = 'hops') -> Optional[Dict[str, Any]]:
+        """Buscar un camino entre dos personas (None si alguna no existe)"""
+        snapshot = self.engine.snapshot()
+        origen = snapshot.index_of(origen_id)
+        destino = snapshot.index_of(destino_id)
+        if origen is None or destino is None:
+            return None
+
+        if origen == destino:
+            nodos, aristas, coste = [origen], [], 0.0
+        elif modo == 'strength':
+            nodos, aristas, coste = self._bidirectional_dijkstra(snapshot, origen, destino)
+        else:
+            nodos, aristas, coste = self._bidirectional_bfs(snapshot, origen, destino)
+
+        return {
+            'version': snapshot.version,
+            'mode': modo,
+            'found': bool(nodos),
+            'path': [int(snapshot.node_ids[i]) for i in nodos],
+            'edge_ids': [int(e) for e in aristas],
+            'hops': max(len(nodos) - 1, 0),
+            'cost': coste if nodos else None
+        }
+
+    @staticmethod
+    def edge_cost(fortaleza: float) -> float:
+        """Coste de recorrer una relación: cuanto más fuerte, más barata"""
+        return 1.0 / fortaleza if fortaleza > 0 else float('inf')
+
+    def _bidirectional_bfs(self, snapshot: GraphSnapshot, origen: int, destino: int):
+        """BFS bidireccional por niveles, expandiendo siempre la frontera más pequeña"""
+        n = snapshot.num_nodes
+        # padre[lado][nodo] = nodo anterior (-1 raíz, -2 no visitado) y arista[lado][nodo] = relacion_id
+        padre = [np.full(n, -2, dtype=np.int64), np.full(n, -2, dtype=np.int64)]
+        arista = [np.zeros(n, dtype=np.int64), np.zeros(n, dtype=np.int64)]
+        dist = [np.zeros(n, dtype=np.int64), np.zeros(n, dtype=np.int64)]
+        padre[0][origen] = -1
+        padre[1][destino] = -1
+        fronteras = [np.array([origen], dtype=np.int64), np.array([destino], dtype=np.int64)]
+
+        while len(fronteras[0]) and len(fronteras[1]):
+            lado = 0 if len(fronteras[0]) <= len(fronteras[1]) else 1
+            desde, hacia, _, relaciones = snapshot.gather(fronteras[lado])
+
+            nuevos = padre[lado][hacia] == -2
+            desde, hacia, relaciones = desde[nuevos], hacia[nuevos], relaciones[nuevos]
+            # Con varios padres posibles basta con quedarse con uno
+            hacia, primero = np.unique(hacia, return_index=True)
+            padre[lado][hacia] = desde[primero]
+            arista[lado][hacia] = relaciones[primero]
+            dist[lado][hacia] = dist[lado][desde[primero]] + 1
+
+            encuentro = hacia[padre[1 - lado][hacia] != -2]
+            if len(encuentro):
+                medio = int(encuentro[np.argmin(dist[1 - lado][encuentro])])
+                nodos, aristas = self._join(padre, arista, medio)
+                return nodos, aristas, float(len(nodos) - 1)
+            fronteras[lado] = hacia
+
+        return [], [], 0.0
+
+    def _bidirectional_dijkstra(self, snapshot: GraphSnapshot, origen: int, destino: int):
+        """Dijkstra bidireccional con montículo binario y coste 1/fortaleza"""
+        offsets = snapshot.offsets
+        dist = [{origen: 0.0}, {destino: 0.0}]
+        padre = [{origen: (-1, 0)}, {destino: (-1, 0)}]
+        cerrados = [set(), set()]
+        heaps = [[(0.0, origen)], [(0.0, destino)]]
+        mejor, medio = float('inf'), None
+
+        while heaps[0] and heaps[1]:
+            # Parada: ningún camino por cerrar puede mejorar el mejor encontrado
+            if heaps[0][0][0] + heaps[1][0][0] >= mejor:
+                break
+
+            lado = 0 if heaps[0][0][0] <= heaps[1][0][0] else 1
+            d, u = heapq.heappop(heaps[lado])
+            if u in cerrados[lado] or d > dist[lado].get(u, float('inf')):
+                continue
+            cerrados[lado].add(u)
+
+            start, end = int(offsets[u]), int(offsets[u + 1])
+            vecinos = snapshot.indices[start:end].tolist()
+            pesos = snapshot.weights[start:end].tolist()
+            relaciones = snapshot.edge_ids[start:end].tolist()
+
+            for v, w, rel in zip(vecinos, pesos, relaciones):
+                nd = d + self.edge_cost(w)
+                if nd < dist[lado].get(v, float('inf')):
+                    dist[lado][v] = nd
+                    padre[lado][v] = (u, rel)
+                    heapq.heappush(heaps[lado], (nd, v))
+                if v in dist[1 - lado]:
+                    total = dist[lado][v] + dist[1 - lado][v]
+                    if total < mejor:
+                        mejor, medio = total, v
+
+        if medio is None:
+            return [], [], 0.0
+
+        nodos, aristas = self._join_dicts(padre, medio)
+        return nodos, aristas, round(mejor, 6)
+
+    @staticmethod
+    def _join(padre: List[np.ndarray], arista: List[np.ndarray], medio: int) -> Tuple[List[int], List[int]]:
+        """Unir las dos mitades del camino de la BFS en el nodo de encuentro"""
+        izquierda, aristas_izq = [], []
+        nodo = medio
+        while padre[0][nodo] != -1:
+            izquierda.append(nodo)
+            aristas_izq.append(int(arista[0][nodo]))
+            nodo = int(padre[0][nodo])
+        izquierda.append(nodo)
+
+        derecha, aristas_der = [], []
+        nodo = medio
+        while padre[1][nodo] != -1:
+            aristas_der.append(int(arista[1][nodo]))
+            nodo = int(padre[1][nodo])
+            derecha.append(nodo)
+
+        return izquierda[::-1] + derecha, aristas_izq[::-1] + aristas_der
+
+    @staticmethod
+    def _join_dicts(padre: List[Dict[int, Tuple[int, int]]], medio: int) -> Tuple[List[int], List[int]]:
+        """Unir las dos mitades del camino de Dijkstra en el nodo de encuentro"""
+        izquierda, aristas_izq = [], []
+        nodo = medio
+        while padre[0][nodo][0] != -1:
+            anterior, rel = padre[0][nodo]
+            izquierda.append(nodo)
+            aristas_izq.append(rel)
+            nodo = anterior
+        izquierda.append(nodo)
+
+        derecha, aristas_der = [], []
+        nodo = medio
+        while padre[1][nodo][0] != -1:
+            anterior, rel = padre[1][nodo]
+            aristas_der.append(rel)
+            nodo = anterior
+            derecha.append(nodo)
+
+        return izquierda[::-1] + derecha, aristas_izq[::-1] + aristas_der
+
+def get_path_service(app) -> PathService:
+    """Obtener el servicio de caminos de la aplicación"""
+    return app.extensions['paths']
@@ -0,0 +1,167 @@
+# =================================================================
+# services/sprite_service.py - Atlas de sprites con los avatares del grafo
+# =================================================================
+
+import hashlib
+import io
+import threading
+from typing import Dict, List, Any, Optional, Tuple
+from PIL import Image
+from models.persona import PersonaRepository
+from services.image_service import ImageService, derivative_path
+
+class _Sheet:
+    """Una hoja del atlas: imagen en memoria y su última codificación"""
+
+    def __init__(self, lado: int):
+        self.image = Image.new('RGB', (lado, lado), (255, 255, 255))
+        self.libres: List[int] = []
+        self.ocupadas = 0
+        self.body: Optional[bytes] = None
+        self.etag: Optional[str] = None
+        self.sucia = True
+
+class _Atlas:
+    """Hojas y posiciones de un tamaño de sprite"""
+
+    def __init__(self, size: int, lado: int):
+        self.size = size
+        self.lado = lado
+        self.columnas = lado // size
+        self.por_hoja = self.columnas * self.columnas
+        self.hojas: List[_Sheet] = []
+        # imagen_url -> (hoja, casilla); las personas con la misma imagen comparten casilla
+        self.casillas: Dict[str, Tuple[int, int]] = {}
+
+class SpriteAtlasService:
+    """Empaqueta los avatares en pocas imágenes grandes con un mapa de coordenadas
+
+    Cada refresh solo pega las imágenes nuevas en casillas libres y solo
+    recodifica las hojas que cambiaron; el resto conserva bytes y ETag.
+    """
+
+    def __init__(self, persona_repo: PersonaRepository, image_service: ImageService,
+                 sizes: Tuple[int, ...] = (32, 64), sheet_px: int = 2048, quality: int = 80):
+        self.persona_repo = persona_repo
+        self.image_service = image_service
+        self.sizes = tuple(sizes)
+        self.sheet_px = sheet_px
+        self.quality = quality
+        self._atlas: Dict[int, _Atlas] = {}
+        self._lock = threading.Lock()
+
+    def refresh(self, size: int) -> Dict[str, Any]:
+        """Sincronizar el atlas de un tamaño con las imágenes actuales y devolver su mapa"""
+        with self._lock:
+            atlas = self._atlas.get(size)
+            if atlas is None:
+                atlas = self._atlas[size] = _Atlas(size, self.sheet_px)
+
+            personas = self.persona_repo.get_image_refs()
+            actuales = {imagen_url for _, imagen_url in personas}
+
+            # Liberar las casillas de imágenes que ya nadie usa
+            for imagen_url in list(atlas.casillas.keys() - actuales):
+                hoja, casilla = atlas.casillas.pop(imagen_url)
+                atlas.hojas[hoja].libres.append(casilla)
+                atlas.hojas[hoja].ocupadas -= 1
+                # El hueco se pinta en blanco para que no queden restos en la hoja
+                self._paste(atlas, hoja, casilla, None)
+
+            for imagen_url in sorted(actuales - atlas.casillas.keys()):
+                tile = self._load_tile(imagen_url, size)
+                if tile is None:
+                    continue
+                hoja, casilla = self._allocate(atlas)
+                atlas.casillas[imagen_url] = (hoja, casilla)
+                self._paste(atlas, hoja, casilla, tile)
+
+            for hoja in atlas.hojas:
+                if hoja.sucia:
+                    self._encode(hoja)
+
+            return self._mapa(atlas, personas)
+
+    def get_sheet(self, size: int, numero: int) -> Optional[Tuple[bytes, str]]:
+        """Bytes y ETag de una hoja ya generada"""
+        with self._lock:
+            atlas = self._atlas.get(size)
+            if atlas is None or not 0 <= numero < len(atlas.hojas) or atlas.hojas[numero].body is None:
+                return None
+            hoja = atlas.hojas[numero]
+            return hoja.body, hoja.etag
+
+    def _allocate(self, atlas: _Atlas) -> Tuple[int, int]:
+        """Primera casilla libre (rellenando huecos antes de abrir una hoja nueva)"""
+        for numero, hoja in enumerate(atlas.hojas):
+            if hoja.libres:
+                hoja.ocupadas += 1
+                return numero, hoja.libres.pop()
+            if hoja.ocupadas < atlas.por_hoja:
+                hoja.ocupadas += 1
+                return numero, hoja.ocupadas - 1
+        atlas.hojas.append(_Sheet(atlas.lado))
+        atlas.hojas[-1].ocupadas = 1
+        return len(atlas.hojas) - 1, 0
+
+    def _paste(self, atlas: _Atlas, numero: int, casilla: int, tile: Optional[Image.Image]) -> None:
+        hoja = atlas.hojas[numero]
+        x, y = self._coords(atlas, casilla)
+        if tile is None:
+            tile = Image.new('RGB', (atlas.size, atlas.size), (255, 255, 255))
+        hoja.image.paste(tile, (x, y))
+        hoja.sucia = True
+
+    @staticmethod
+    def _coords(atlas: _Atlas, casilla: int) -> Tuple[int, int]:
+        return (casilla % atlas.columnas) * atlas.size, (casilla // atlas.columnas) * atlas.size
+
+    def _load_tile(self, imagen_url: str, size: int) -> Optional[Image.Image]:
+        """Derivada del tamaño pedido o, para imágenes antiguas, la de respaldo reducida"""
+        for ruta in (self.image_service.file_path(derivative_path(imagen_url, size)),
+                     self.image_service.file_path(imagen_url)):
+            if ruta.exists():
+                try:
+                    with Image.open(ruta) as image:
+                        return self.image_service.resize_and_crop_image(image, (size, size))
+                except Exception as e:
+                    print(f"⚠️ Avatar ilegible para el atlas {imagen_url}: {e}")
+                    return None
+        return None
+
+    def _encode(self, hoja: _Sheet) -> None:
+        buffer = io.BytesIO()
+        hoja.image.save(buffer, 'WEBP', quality=self.quality, method=4)
+        hoja.body = buffer.getvalue()
+        hoja.etag = hashlib.sha1(hoja.body).hexdigest()
+        hoja.sucia = False
+
+    def _mapa(self, atlas: _Atlas, personas: List[Tuple[int, str]]) -> Dict[str, Any]:
+        posiciones = {}
+        for persona_id, imagen_url in personas:
+            if imagen_url in atlas.casillas:
+                hoja, casilla = atlas.casillas[imagen_url]
+                x, y = self._coords(atlas, casilla)
+                posiciones[persona_id] = {'sheet': hoja, 'x': x, 'y': y}
+        return {
+            'size': atlas.size,
+            'sheets': [
+                {'url': f'/api/grafo/sprites/{atlas.size}/{numero}.webp?v={hoja.etag}',
+                 'width': atlas.lado, 'height': atlas.lado}
+                for numero, hoja in enumerate(atlas.hojas)
+            ],
+            'personas': posiciones
+        }
+
+    def stats(self) -> Dict[str, Any]:
+        """Ocupación de los atlas generados"""
+        with self._lock:
+            return {
+                size: {'imagenes': len(atlas.casillas), 'hojas': len(atlas.hojas),
+                       'bytes': sum(len(h.body or b'') for h in atlas.hojas)}
+                for size, atlas in self._atlas.items()
+            }
+
+def get_sprite_service(app) -> SpriteAtlasService:
+    """Obtener el servicio de atlas de la aplicación"""
+    return app.extensions['sprites']
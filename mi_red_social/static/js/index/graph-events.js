@@ -0,0 +1,83 @@
+// static/js/index/graph-events.js
+// Sincronización en vivo del grafo mediante Server-Sent Events
+
+console.log('📡 Cargando canal de eventos del grafo...');
+
+let fuenteEventosGrafo = null;
+
+// Aplicar un evento del servidor sobre los DataSets de vis.js
+function aplicarEventoGrafo(tipo, datos) {
+    if (!nodes || !edges) {
+        return;
+    }
+
+    switch (tipo) {
+        case 'node':
+            nodes.update(datos);
+            break;
+        case 'node_deleted':
+            nodes.remove(datos.id);
+            break;
+        case 'position':
+            if (datos.x !== null && datos.y !== null) {
+                nodes.update({ id: datos.id, x: datos.x, y: datos.y });
+            }
+            break;
+        case 'group':
+            nodes.update({ id: datos.id, grupo: datos.grupo });
+            break;
+        case 'edge':
+            edges.update(datos);
+            break;
+        case 'edge_deleted':
+            edges.remove(datos.id);
+            break;
+    }
+}
+
+// Conectar al canal SSE (EventSource reconecta solo y envía Last-Event-ID)
+function conectarEventosGrafo(version) {
+    if (typeof EventSource === 'undefined') {
+        console.warn('⚠️ EventSource no disponible, sin sincronización en vivo');
+        return;
+    }
+
+    if (fuenteEventosGrafo) {
+        fuenteEventosGrafo.close();
+    }
+
+    const url = '/api/grafo/eventos' + (version !== undefined ? `?last_event_id=${version}` : '');
+    fuenteEventosGrafo = new EventSource(url);
+
+    ['node', 'node_deleted', 'position', 'group', 'edge', 'edge_deleted'].forEach(tipo => {
+        fuenteEventosGrafo.addEventListener(tipo, (evento) => {
+            try {
+                aplicarEventoGrafo(tipo, JSON.parse(evento.data));
+            } catch (error) {
+                console.error('❌ Error aplicando evento del grafo:', error);
+            }
+        });
+    });
+
+    // El servidor pide recarga completa cuando el log ya no cubre nuestra versión
+    fuenteEventosGrafo.addEventListener('resync', () => {
+        console.log('🔄 Resincronizando grafo completo...');
+        fuenteEventosGrafo.close();
+        fuenteEventosGrafo = null;
+        if (typeof cargarDatos === 'function') {
+            cargarDatos(true).then(data => {
+                if (data && nodes && edges) {
+                    nodes.clear();
+                    edges.clear();
+                    nodes.add(data.nodes);
+                    edges.add(data.edges);
+                }
+                conectarEventosGrafo(data ? data.version : undefined);
+            });
+        }
+    });
+
+    fuenteEventosGrafo.onerror = () => {
+        console.warn('⚠️ Canal de eventos interrumpido, reconectando...');
+    };
+}
@@ -209,6 +209,11 @@ async function inicializarRed() {
             configurarPosiciones();
         }
         
+        // Sincronización en vivo desde la versión recibida
+        if (typeof conectarEventosGrafo === 'function') {
+            conectarEventosGrafo(data.version);
+        }
+        
         // Actualizar estadísticas
         actualizarEstadisticas(data);
         
@@ -0,0 +1,52 @@
+# =================================================================
+# tests/conftest.py - Aplicación de pruebas con base de datos temporal y grafos fijos
+# =================================================================
+
+import sys
+from pathlib import Path
+from types import SimpleNamespace
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from app import create_app
+from config import Config
+from services.graph_engine import GraphEngine
+
+
+@pytest.fixture
+def app(tmp_path):
+    """Aplicación con base de datos e imágenes en un directorio temporal"""
+    class ConfigPruebas(Config):
+        TESTING = True
+        DATABASE_PATH = str(tmp_path / 'test.db')
+        IMAGES_FOLDER = tmp_path / 'imagenes'
+        IMAGE_GC_INTERVAL_SECONDS = 0
+
+    return create_app(ConfigPruebas)
+
+
+@pytest.fixture
+def client(app):
+    """Cliente HTTP de Flask"""
+    return app.test_client()
+
+
+class MotorFijo:
+    """Motor de grafo con un grafo fijo, sin base de datos"""
+
+    def __init__(self, nodos, aristas, version=1):
+        # Mismo empaquetado CSR que GraphEngine, a partir de {relacion_id: (persona1, persona2, fortaleza)}
+        estado = SimpleNamespace(_nodes=set(nodos), _version=version,
+                                 _edges={i: (u, v, float(w)) for i, (u, v, w) in enumerate(aristas, start=1)})
+        self._snapshot = GraphEngine._build(estado)
+
+    def snapshot(self):
+        return self._snapshot
+
+
+@pytest.fixture
+def motor():
+    """Fábrica de motores: motor(nodos, [(persona1, persona2, fortaleza), ...])"""
+    return MotorFijo
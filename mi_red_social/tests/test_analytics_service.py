@@ -0,0 +1,89 @@
+# =================================================================
+# tests/test_analytics_service.py - Centralidades frente a implementaciones de referencia
+# =================================================================
+
+import itertools
+import random
+from collections import deque
+
+import numpy as np
+import pytest
+
+from services.analytics_service import AnalyticsService
+
+
+def grafo_aleatorio(n, m, semilla):
+    """Grafo simple con n nodos (ids 1..n), m aristas y algunos nodos aislados"""
+    rng = random.Random(semilla)
+    pares = rng.sample(list(itertools.combinations(range(1, n - 2), 2)), m)
+    return list(range(1, n + 1)), [(u, v, rng.randint(1, 10)) for u, v in pares]
+
+
+def caminos_minimos(vecinos, origen):
+    """BFS de referencia: distancia y número de caminos mínimos desde origen"""
+    dist, sigma = {origen: 0}, {origen: 1}
+    cola = deque([origen])
+    while cola:
+        u = cola.popleft()
+        for v in vecinos[u]:
+            if v not in dist:
+                dist[v], sigma[v] = dist[u] + 1, 0
+                cola.append(v)
+            if dist[v] == dist[u] + 1:
+                sigma[v] += sigma[u]
+    return dist, sigma
+
+
+def betweenness_referencia(nodos, aristas):
+    """Suma sobre pares s < t de la fracción de caminos mínimos s-t que pasan por cada nodo"""
+    vecinos = {n: set() for n in nodos}
+    for u, v, _ in aristas:
+        vecinos[u].add(v)
+        vecinos[v].add(u)
+    desde = {s: caminos_minimos(vecinos, s) for s in nodos}
+    bc = dict.fromkeys(nodos, 0.0)
+    for s, t in itertools.combinations(nodos, 2):
+        dist_s, sigma_s = desde[s]
+        if t not in dist_s:
+            continue
+        dist_t, sigma_t = desde[t]
+        for v in nodos:
+            if v not in (s, t) and v in dist_s and v in dist_t and dist_s[v] + dist_t[v] == dist_s[t]:
+                bc[v] += sigma_s[v] * sigma_t[v] / sigma_s[t]
+    return np.array([bc[n] for n in nodos])
+
+
+def test_pagerank_suma_uno(motor):
+    nodos, aristas = grafo_aleatorio(30, 50, semilla=1)
+    servicio = AnalyticsService(motor(nodos, aristas))
+    rank = servicio.get_metrics(['pagerank'])['metricas']['pagerank']
+
+    assert rank.sum() == pytest.approx(1.0)
+    assert (rank > 0).all()
+    # Los aislados solo reciben el salto aleatorio y la masa colgante
+    assert rank[-1] == pytest.approx(rank[-2])
+
+
+def test_betweenness_con_todos_los_origenes_es_exacta(motor):
+    nodos, aristas = grafo_aleatorio(25, 40, semilla=2)
+    servicio = AnalyticsService(motor(nodos, aristas), betweenness_samples=len(nodos))
+    bc = servicio.get_metrics(['betweenness'])['metricas']['betweenness']
+
+    assert bc == pytest.approx(betweenness_referencia(nodos, aristas))
+
+
+def test_clustering_cuenta_triangulos(motor):
+    nodos, aristas = grafo_aleatorio(20, 45, semilla=3)
+    servicio = AnalyticsService(motor(nodos, aristas))
+    clustering = servicio.get_metrics(['clustering'])['metricas']['clustering']
+
+    vecinos = {n: set() for n in nodos}
+    for u, v, _ in aristas:
+        vecinos[u].add(v)
+        vecinos[v].add(u)
+    esperado = []
+    for n in nodos:
+        k = len(vecinos[n])
+        triangulos = sum(1 for a, b in itertools.combinations(vecinos[n], 2) if b in vecinos[a])
+        esperado.append(2 * triangulos / (k * (k - 1)) if k > 1 else 0.0)
+    assert clustering == pytest.approx(esperado)
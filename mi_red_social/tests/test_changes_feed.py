@@ -0,0 +1,54 @@
+# =================================================================
+# tests/test_changes_feed.py - Feed incremental /api/grafo/changes
+# =================================================================
+
+from models.cambio import ChangeLogRepository
+from models.database import get_db_manager
+
+
+def version_actual(app):
+    return ChangeLogRepository(get_db_manager(app)).latest_version()
+
+
+def crear_persona(client, nombre):
+    client.post('/api/personas', data={'nombre': nombre})
+    personas = client.get(f'/api/personas?prefijo={nombre}').get_json()['personas']
+    return next(p['id'] for p in personas if p['nombre'] == nombre)
+
+
+def test_cambios_desde_una_version(app, client):
+    desde = version_actual(app)
+    persona_id = crear_persona(client, 'Feed Nueva')
+
+    respuesta = client.get(f'/api/grafo/changes?since={desde}')
+    assert respuesta.status_code == 200
+    cambios = respuesta.get_json()
+    assert cambios['resync'] is False and cambios['since'] == desde
+    assert [n['id'] for n in cambios['nodes']] == [persona_id]
+
+    # Desde la última versión no hay nada; un borrado llega como deleted_nodes
+    assert client.get(f"/api/grafo/changes?since={cambios['version']}").get_json()['nodes'] == []
+    client.delete(f'/api/personas/{persona_id}')
+    cambios = client.get(f"/api/grafo/changes?since={cambios['version']}").get_json()
+    assert cambios['deleted_nodes'] == [persona_id]
+
+
+def test_version_compactada_pide_resincronizar(app, client, monkeypatch):
+    monkeypatch.setattr(ChangeLogRepository, 'RETENCION', 2)
+    monkeypatch.setattr(ChangeLogRepository, 'COMPACTAR_CADA', 1)
+    desde = version_actual(app)
+    for i in range(4):
+        crear_persona(client, f'Feed Compactada {i}')
+
+    respuesta = client.get(f'/api/grafo/changes?since={desde}')
+    assert respuesta.status_code == 410
+    assert respuesta.get_json() == {'resync': True, 'version': version_actual(app)}
+
+    # Dentro de la ventana retenida sigue habiendo feed incremental
+    assert client.get(f'/api/grafo/changes?since={version_actual(app) - 1}').status_code == 200
+
+
+def test_versiones_imposibles(app, client):
+    assert client.get('/api/grafo/changes').status_code == 400
+    assert client.get(f'/api/grafo/changes?since={version_actual(app) + 5}').status_code == 410
+    assert client.get('/api/grafo/changes?since=-1').status_code == 410
@@ -0,0 +1,58 @@
+# =================================================================
+# tests/test_community_service.py - Louvain y aplicación de propuestas
+# =================================================================
+
+import itertools
+import time
+from types import SimpleNamespace
+
+from services.community_service import CommunityService, get_community_service
+
+
+def esperar_trabajo(client, job_id, segundos=30):
+    limite = time.time() + segundos
+    while time.time() < limite:
+        job = client.get(f'/api/jobs/{job_id}').get_json()
+        if job['estado'] in ('completado', 'error'):
+            return job
+        time.sleep(0.05)
+    raise AssertionError(f'El trabajo {job_id} no terminó')
+
+
+def test_dos_cliques_dan_dos_comunidades(motor):
+    cliques = [range(1, 6), range(6, 11)]
+    aristas = [(u, v, 8) for clique in cliques for u, v in itertools.combinations(clique, 2)]
+    aristas.append((5, 6, 1))
+    personas = [SimpleNamespace(id=i, grupo='contactos') for i in range(1, 12)]
+    servicio = CommunityService(motor(range(1, 12), aristas), SimpleNamespace(get_all=lambda: personas))
+    try:
+        propuesta = servicio.detect()
+    finally:
+        servicio.shutdown()
+
+    grupos = {a['id']: a['grupo'] for a in propuesta['asignaciones']}
+    assert propuesta['num_comunidades'] == 2
+    assert len({grupos[i] for i in cliques[0]}) == len({grupos[i] for i in cliques[1]}) == 1
+    assert grupos[1] != grupos[6]
+    # La persona sin relaciones no entra en ninguna comunidad
+    assert 11 not in grupos
+    assert propuesta['modularity'] > 0.3
+
+
+def test_aplicar_una_propuesta_desfasada_es_409(app, client):
+    try:
+        respuesta = client.post('/api/analytics/communities')
+        assert respuesta.status_code == 202
+        job = esperar_trabajo(client, respuesta.get_json()['job']['id'])
+        assert job['estado'] == 'completado', job
+    finally:
+        get_community_service(app).shutdown()
+
+    # Cualquier escritura cambia la versión del grafo
+    client.post('/api/personas', data={'nombre': 'Persona Nueva'})
+    respuesta = client.post(f"/api/analytics/communities/{job['id']}/apply")
+    assert respuesta.status_code == 409
+    assert respuesta.get_json()['version'] != job['resultado']['version']
+
+    respuesta = client.post(f"/api/analytics/communities/{job['id']}/apply?force=true")
+    assert respuesta.status_code == 200
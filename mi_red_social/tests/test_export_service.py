@@ -0,0 +1,23 @@
+# =================================================================
+# tests/test_export_service.py - Límite de exportaciones simultáneas
+# =================================================================
+
+from services.export_service import get_export_service
+
+
+def test_exportaciones_limitadas_por_debajo_del_pool(app, client):
+    servicio = get_export_service(app)
+    assert servicio.max_concurrentes < app.extensions['db_manager'].pool.max_size
+
+    abiertas = [servicio.export('edgelist') for _ in range(servicio.max_concurrentes)]
+    next(abiertas[0])
+    respuesta = client.get('/api/grafo/export?format=ndjson')
+    assert respuesta.status_code == 503
+    assert respuesta.headers['Retry-After'] == '5'
+
+    # Cerrar libera el hueco aunque la descarga no haya empezado
+    for descarga in abiertas:
+        descarga.close()
+    respuesta = client.get('/api/grafo/export?format=ndjson')
+    assert respuesta.status_code == 200
+    assert b'"type": "persona"' in respuesta.data
@@ -0,0 +1,39 @@
+# =================================================================
+# tests/test_graph_service.py - Payload del grafo por SQL y por Python
+# =================================================================
+
+from models.database import get_db_manager
+
+
+def pedir_ambos(app, client):
+    """Pedir /api/grafo por el camino JSON1 y por el de Python"""
+    db_manager = get_db_manager(app)
+    assert 'json' in db_manager.features
+
+    rapido = client.get('/api/grafo?cache=false').get_json()
+    db_manager.features.discard('json')
+    lento = client.get('/api/grafo?cache=false').get_json()
+    db_manager.features.add('json')
+    return rapido, lento
+
+
+def test_payload_sql_coincide_con_el_de_python(app, client):
+    rapido, lento = pedir_ambos(app, client)
+
+    assert rapido['nodes'] and rapido['edges']
+    assert rapido == lento
+
+
+def test_relacion_sin_tipo_sale_en_ambos_caminos(app, client):
+    with get_db_manager(app).transaction() as conn:
+        conn.execute('UPDATE relaciones SET tipo = NULL WHERE id = (SELECT MIN(id) FROM relaciones)')
+        relacion_id = conn.execute('SELECT MIN(id) FROM relaciones').fetchone()[0]
+        total = conn.execute('SELECT COUNT(*) FROM relaciones').fetchone()[0]
+
+    rapido, lento = pedir_ambos(app, client)
+
+    assert rapido == lento
+    assert len(rapido['edges']) == total
+    arista = next(e for e in rapido['edges'] if e['id'] == relacion_id)
+    assert arista['label'] == ''
+    assert 'Tipo: <br>' in arista['title']
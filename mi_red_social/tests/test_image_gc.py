@@ -0,0 +1,71 @@
+# =================================================================
+# tests/test_image_gc.py - Barrido de imágenes huérfanas y referencias rotas
+# =================================================================
+
+from PIL import Image
+
+from models.database import get_db_manager
+from models.persona import PersonaRepository
+from services.image_gc import ImageSweeper
+from services.image_service import ImageService, derivative_path
+
+
+def barrendero(app):
+    repo = PersonaRepository(get_db_manager(app))
+    return repo, ImageSweeper(repo, ImageService(app.config), grace_seconds=0)
+
+
+def test_referencia_rota_se_quita(app):
+    repo, sweeper = barrendero(app)
+    persona_id = repo.get_all()[0].id
+    repo.update_images({persona_id: 'avatars/' + 'f' * 32 + '.png'})
+
+    informe = sweeper.sweep()
+    assert informe['referencias_rotas'] == 1
+    assert repo.get_by_id(persona_id).imagen_url is None
+
+
+def test_referencia_cambiada_durante_el_barrido_se_respeta(app):
+    repo, _ = barrendero(app)
+    persona_id = repo.get_all()[0].id
+    rota = 'avatars/' + 'f' * 32 + '.png'
+    repo.update_images({persona_id: 'avatars/' + 'e' * 32 + '.png'})
+
+    # La persona ya no tiene la URL rota que vio el barrido
+    assert repo.clear_images({persona_id: rota}) == 0
+    assert repo.get_by_id(persona_id).imagen_url == 'avatars/' + 'e' * 32 + '.png'
+
+
+def test_migracion_regenera_las_derivadas(app):
+    repo, sweeper = barrendero(app)
+    servicio = ImageService(app.config)
+    persona_id = repo.get_all()[0].id
+    antigua = 'static/images/users/user_1_abc.png'
+    ruta = servicio.file_path(antigua)
+    ruta.parent.mkdir(parents=True, exist_ok=True)
+    Image.new('RGB', (150, 150), (0, 120, 0)).save(ruta)
+    repo.update_images({persona_id: antigua})
+
+    informe = sweeper.sweep()
+    nueva = repo.get_by_id(persona_id).imagen_url
+    assert informe['migrados'] == 1 and nueva.startswith('avatars/')
+    assert not ruta.exists()
+    assert servicio.exists(nueva)
+    for size in app.config['IMAGE_SIZES']:
+        assert servicio.file_path(derivative_path(nueva, size)).exists()
+
+
+def test_solo_se_borran_ficheros_del_almacen(app):
+    _, sweeper = barrendero(app)
+    carpeta = app.config['IMAGES_FOLDER']
+    ajenos = [carpeta / '.gitkeep', carpeta / 'LEEME.txt', carpeta / 'user_2_9b026dbb.png']
+    huerfanos = [carpeta / 'ab' / ('ab' * 16 + '.png'), carpeta / 'ab' / ('ab' * 16 + '_64.webp'),
+                 carpeta / 'user_2_9b026dbb_64.webp', carpeta / ('.' + 'cd' * 16 + '_32.webp.77.tmp')]
+    for ruta in ajenos + huerfanos:
+        ruta.parent.mkdir(parents=True, exist_ok=True)
+        ruta.write_bytes(b'x')
+
+    informe = sweeper.sweep()
+    assert informe['huerfanos'] == len(huerfanos)
+    assert all(ruta.exists() for ruta in ajenos)
+    assert not any(ruta.exists() for ruta in huerfanos)
@@ -0,0 +1,36 @@
+# =================================================================
+# tests/test_image_pipeline.py - Entrega de resultados del pool de imágenes
+# =================================================================
+
+import threading
+import time
+
+from PIL import Image
+
+from services.image_pipeline import get_image_pipeline
+from services.image_service import AVATARS_URL
+from services.jobs import get_job_manager
+
+
+def test_on_done_se_ejecuta_en_un_hilo_del_job_manager(app, tmp_path):
+    origen = tmp_path / 'subida.png'
+    Image.new('RGB', (40, 40), (10, 20, 30)).save(origen)
+    hilos = []
+
+    def on_done(imagen_url):
+        hilos.append(threading.current_thread().name)
+        return {'imagen_url': imagen_url}
+
+    pipeline = get_image_pipeline(app)
+    try:
+        job = pipeline.submit('imagen', str(origen), f'{AVATARS_URL}{"ef" * 16}.png', on_done)
+        limite = time.time() + 30
+        while not job.finished and time.time() < limite:
+            time.sleep(0.05)
+    finally:
+        pipeline.shutdown()
+
+    assert job.estado == 'completado', job.error
+    assert job.resultado == {'imagen_url': f'{AVATARS_URL}{"ef" * 16}.png'}
+    assert hilos and hilos[0].startswith('job')
+    assert get_job_manager(app).get(job.id) is job
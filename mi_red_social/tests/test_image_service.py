@@ -0,0 +1,59 @@
+# =================================================================
+# tests/test_image_service.py - Derivadas WebP de los avatares
+# =================================================================
+
+import os
+from pathlib import Path
+
+from PIL import Image, ImageChops
+
+from services.image_service import AVATARS_URL, ImageService, derivative_path
+
+
+def ocupado(imagen):
+    """Caja del contenido distinto del relleno blanco"""
+    fondo = Image.new('RGB', imagen.size, (255, 255, 255))
+    return ImageChops.difference(imagen.convert('RGB'), fondo).point(lambda v: 255 if v > 32 else 0).getbbox()
+
+
+def test_imagen_pequena_no_encoge_en_las_derivadas(app):
+    servicio = ImageService(app.config)
+    ruta = f'{AVATARS_URL}{"ab" * 16}.png'
+    servicio.save_variants(Image.new('RGB', (100, 100), (200, 0, 0)), ruta)
+
+    with Image.open(servicio.file_path(ruta)) as respaldo:
+        assert respaldo.size == app.config['IMAGE_SIZE']
+        assert ocupado(respaldo) == (0, 0) + app.config['IMAGE_SIZE']
+    for size in app.config['IMAGE_SIZES']:
+        with Image.open(servicio.file_path(derivative_path(ruta, size))) as derivada:
+            assert derivada.size == (size, size)
+            assert ocupado(derivada) == (0, 0, size, size)
+
+
+def test_imagen_apaisada_conserva_el_relleno(app):
+    servicio = ImageService(app.config)
+    ruta = f'{AVATARS_URL}{"cd" * 16}.png'
+    servicio.save_variants(Image.new('RGB', (400, 200), (0, 0, 200)), ruta)
+
+    with Image.open(servicio.file_path(derivative_path(ruta, 64))) as derivada:
+        izquierda, arriba, derecha, abajo = ocupado(derivada)
+        assert (izquierda, derecha) == (0, 64)
+        assert 15 <= arriba <= 17 and 47 <= abajo <= 49
+
+
+def test_cada_fichero_se_publica_con_un_renombrado_atomico(app, monkeypatch):
+    servicio = ImageService(app.config)
+    ruta = f'{AVATARS_URL}{"ef" * 16}.png'
+    publicados = []
+    reemplazar = os.replace
+
+    def registrar(origen, destino):
+        publicados.append(Path(destino).name)
+        reemplazar(origen, destino)
+
+    monkeypatch.setattr(os, 'replace', registrar)
+    servicio.save_variants(Image.new('RGB', (300, 300), (0, 90, 0)), ruta)
+
+    esperados = [Path(derivative_path(ruta, size)).name for size in app.config['IMAGE_SIZES']]
+    assert publicados == esperados + [Path(ruta).name]
+    assert not list(servicio.file_path(ruta).parent.glob('.*.tmp'))
@@ -0,0 +1,63 @@
+# =================================================================
+# tests/test_import_service.py - Importación masiva con filas inválidas
+# =================================================================
+
+import json
+
+
+def importar(client, entidad, cuerpo, formato='jsonl'):
+    """Enviar el cuerpo crudo al endpoint de importación"""
+    respuesta = client.post(f'/api/importar/{entidad}?format={formato}', data=cuerpo,
+                            content_type='application/octet-stream')
+    assert respuesta.status_code == 200, respuesta.get_data(as_text=True)
+    return respuesta.get_json()
+
+
+def jsonl(*filas):
+    return '\n'.join(json.dumps(f) for f in filas).encode('utf-8')
+
+
+def errores_por_fila(informe):
+    return {e['fila']: e['error'] for e in informe['errores']}
+
+
+def test_persona_con_campo_no_escalar_es_error_de_fila(client):
+    informe = importar(client, 'personas', jsonl(
+        {'nombre': 'Prueba Ana', 'grupo': {'a': 1}},
+        {'nombre': 'Prueba Luis', 'icono': ['x']},
+        {'nombre': 'Prueba Eva', 'grupo': 'familia', 'descripcion': 7},
+    ))
+    assert informe['insertadas'] == 1
+    assert errores_por_fila(informe) == {1: 'grupo debe ser un texto', 2: 'icono debe ser un texto'}
+
+
+def test_relacion_con_id_no_escalar_es_error_de_fila(client):
+    importar(client, 'personas', jsonl({'nombre': 'Prueba Ana'}, {'nombre': 'Prueba Luis'}, {'nombre': 'Prueba Eva'}))
+    informe = importar(client, 'relaciones', jsonl(
+        {'persona1_id': 1, 'persona2_id': [3]},
+        {'persona1_id': True, 'persona2_id': 2},
+        {'persona1': {'n': 'Prueba Ana'}, 'persona2': 'Prueba Luis'},
+        {'persona1': 'Prueba Ana', 'persona2': 'Prueba Luis', 'tipo': ['x']},
+        {'persona1': 'Prueba Ana', 'persona2': 'Prueba Eva', 'fortaleza': '7'},
+    ))
+    assert informe['insertadas'] == 1
+    assert errores_por_fila(informe) == {
+        1: 'persona2_id no es un número',
+        2: 'persona1_id no es un número',
+        3: 'persona1 debe ser un texto',
+        4: 'tipo debe ser un texto',
+    }
+
+
+def test_linea_jsonl_no_utf8_es_error_de_fila(client):
+    cuerpo = jsonl({'nombre': 'Prueba Ana'}) + b'\n{"nombre": "Prueba Jos\xe9"}\n' + jsonl({'nombre': 'Prueba Luis'})
+    informe = importar(client, 'personas', cuerpo)
+    assert informe['insertadas'] == 2
+    assert list(errores_por_fila(informe)) == [2]
+
+
+def test_fila_csv_no_utf8_es_error_de_fila(client):
+    cuerpo = b'nombre,grupo\nPrueba Ana,familia\nPrueba Jos\xe9,amigos\nPrueba Luis,\n'
+    informe = importar(client, 'personas', cuerpo, formato='csv')
+    assert informe['insertadas'] == 2
+    assert list(errores_por_fila(informe)) == [3]
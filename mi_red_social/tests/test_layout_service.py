@@ -0,0 +1,63 @@
+# =================================================================
+# tests/test_layout_service.py - Layout de fuerzas en el servidor
+# =================================================================
+
+import random
+from types import SimpleNamespace
+
+import numpy as np
+
+from services.layout_service import LayoutService
+
+
+def red(n, m, semilla):
+    rng = random.Random(semilla)
+    aristas = {tuple(sorted(rng.sample(range(1, n + 1), 2))) for _ in range(m)}
+    return list(range(1, n + 1)), [(u, v, rng.randint(1, 10)) for u, v in sorted(aristas)]
+
+
+def servicio(motor, nodos, aristas, posiciones=None, **opciones):
+    posiciones = posiciones or {}
+    personas = [SimpleNamespace(id=i, posicion_x=posiciones.get(i, (None, None))[0],
+                                posicion_y=posiciones.get(i, (None, None))[1]) for i in nodos]
+    return LayoutService(motor(nodos, aristas), SimpleNamespace(get_all=lambda: personas), **opciones)
+
+
+def test_incremental_solo_mueve_los_nodos_sin_posicion(motor):
+    nodos, aristas = red(60, 120, semilla=4)
+    fijas = {i: (float(i * 10), float(-i * 5)) for i in nodos[:30]}
+    resultado = servicio(motor, nodos, aristas, fijas, iterations=20).compute('incremental')
+
+    assert resultado['modo'] == 'incremental'
+    assert set(resultado['posiciones']) == set(nodos[30:])
+    assert all(np.isfinite([p['x'], p['y']]).all() for p in resultado['posiciones'].values())
+
+
+def test_los_nodos_no_movibles_quedan_en_su_sitio(motor):
+    nodos, aristas = red(40, 80, semilla=5)
+    layout = servicio(motor, nodos, aristas)
+    snapshot = layout.engine.snapshot()
+    pos = np.random.default_rng(0).uniform(-500, 500, (len(nodos), 2))
+    movibles = np.arange(len(nodos)) % 2 == 0
+
+    nuevas = layout._fruchterman_reingold(snapshot, pos, movibles, iteraciones=15, temperatura=200.0)
+
+    assert np.array_equal(nuevas[~movibles], pos[~movibles])
+    assert not np.array_equal(nuevas[movibles], pos[movibles])
+    assert np.isfinite(nuevas).all()
+
+
+def test_layout_completo_grande_es_finito(motor):
+    nodos, aristas = red(3000, 4000, semilla=6)
+    resultado = servicio(motor, nodos, aristas, iterations=10, nodes_per_cell=4).compute('full')
+
+    assert resultado['modo'] == 'full' and resultado['movidos'] == len(nodos)
+    xy = np.array([(p['x'], p['y']) for p in resultado['posiciones'].values()])
+    assert np.isfinite(xy).all()
+
+
+def test_repulsion_con_nodos_superpuestos_es_finita(motor):
+    layout = servicio(motor, [1], [])
+    pos = np.zeros((500, 2))
+    pos[250:] = (1000.0, 1000.0)
+    assert np.isfinite(layout._repulsion(pos, 150.0)).all()
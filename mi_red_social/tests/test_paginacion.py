@@ -0,0 +1,54 @@
+# =================================================================
+# tests/test_paginacion.py - Paginación por cursor de personas y relaciones
+# =================================================================
+
+import pytest
+
+from models.database import get_db_manager
+from models.persona import PersonaRepository
+from models.relacion import RelacionRepository
+from services.data_service import DataService
+
+
+def recorrer(client, url, clave):
+    """Seguir next_cursor hasta el final y devolver los ids en orden"""
+    ids, cursor = [], None
+    while True:
+        consulta = f'{url}?limit=2' + (f'&cursor={cursor}' if cursor else '')
+        respuesta = client.get(consulta)
+        assert respuesta.status_code == 200
+        pagina = respuesta.get_json()
+        assert len(pagina[clave]) <= 2
+        ids.extend(item['id'] for item in pagina[clave])
+        cursor = pagina['next_cursor']
+        if cursor is None:
+            return ids
+
+
+def test_personas_se_recorren_sin_huecos(app, client):
+    total = PersonaRepository(get_db_manager(app)).count()
+    ids = recorrer(client, '/api/personas', 'personas')
+    assert len(ids) == len(set(ids)) == total > 2
+
+
+def test_relaciones_se_recorren_sin_huecos(app, client):
+    total = RelacionRepository(get_db_manager(app)).count()
+    ids = recorrer(client, '/api/relaciones', 'relaciones')
+    assert len(ids) == len(set(ids)) == total > 2
+
+
+@pytest.mark.parametrize('url, clave', [
+    ('/api/personas', ['2024-01-01', 1]),
+    ('/api/relaciones', 'Ana'),
+    ('/api/relaciones', [1, '2024-01-01']),
+    ('/api/relaciones', ['2024-01-01', True]),
+])
+def test_cursor_con_otra_forma_se_rechaza(client, url, clave):
+    respuesta = client.get(f'{url}?cursor={DataService.encode_cursor(clave)}')
+    assert respuesta.status_code == 400
+    assert respuesta.get_json() == {'error': 'Cursor inválido'}
+
+
+@pytest.mark.parametrize('url', ['/api/personas', '/api/relaciones'])
+def test_cursor_corrupto_se_rechaza(client, url):
+    assert client.get(f'{url}?cursor=no-es-base64!').status_code == 400
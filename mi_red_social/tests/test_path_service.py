@@ -0,0 +1,80 @@
+# =================================================================
+# tests/test_path_service.py - Caminos bidireccionales frente a búsquedas de referencia
+# =================================================================
+
+import heapq
+import random
+from collections import deque
+
+import pytest
+
+from services.path_service import PathService
+
+
+def grafo_aleatorio(semilla):
+    """40 nodos (ids 10..49) con 70 relaciones y una componente separada"""
+    rng = random.Random(semilla)
+    nodos = list(range(10, 50))
+    aristas = set()
+    while len(aristas) < 70:
+        u, v = rng.sample(nodos[:35], 2)
+        aristas.add((min(u, v), max(u, v)))
+    aristas = [(u, v, rng.randint(1, 10)) for u, v in sorted(aristas)]
+    aristas += [(45, 46, 5), (46, 47, 5)]
+    return nodos, aristas
+
+
+def referencia(nodos, aristas, origen, coste):
+    """Dijkstra simple desde origen (con coste 1 equivale a una BFS)"""
+    vecinos = {n: [] for n in nodos}
+    for u, v, w in aristas:
+        vecinos[u].append((v, w))
+        vecinos[v].append((u, w))
+    dist = {origen: 0.0}
+    heap = [(0.0, origen)]
+    while heap:
+        d, u = heapq.heappop(heap)
+        if d > dist[u]:
+            continue
+        for v, w in vecinos[u]:
+            nd = d + coste(w)
+            if nd < dist.get(v, float('inf')):
+                dist[v] = nd
+                heapq.heappush(heap, (nd, v))
+    return dist
+
+
+def comprobar_camino(resultado, aristas, coste):
+    """El camino devuelto es continuo, usa las relaciones indicadas y cuesta lo que dice"""
+    por_id = {i: (u, v, w) for i, (u, v, w) in enumerate(aristas, start=1)}
+    camino, total = resultado['path'], 0.0
+    assert len(resultado['edge_ids']) == len(camino) - 1 == resultado['hops']
+    for a, b, relacion_id in zip(camino, camino[1:], resultado['edge_ids']):
+        u, v, w = por_id[relacion_id]
+        assert {a, b} == {u, v}
+        total += coste(w)
+    return total
+
+
+@pytest.mark.parametrize('modo', ['hops', 'strength'])
+def test_caminos_coinciden_con_la_referencia(motor, modo):
+    nodos, aristas = grafo_aleatorio(semilla=7)
+    servicio = PathService(motor(nodos, aristas))
+    coste = (lambda w: 1.0) if modo == 'hops' else PathService.edge_cost
+
+    for origen in nodos[::4]:
+        dist = referencia(nodos, aristas, origen, coste)
+        for destino in nodos[1::3]:
+            resultado = servicio.find_path(origen, destino, modo)
+            if destino not in dist:
+                assert not resultado['found'] and resultado['path'] == []
+                continue
+            assert resultado['found']
+            assert resultado['path'][0] == origen and resultado['path'][-1] == destino
+            assert comprobar_camino(resultado, aristas, coste) == pytest.approx(dist[destino])
+            assert resultado['cost'] == pytest.approx(dist[destino], abs=1e-6)
+
+
+def test_persona_inexistente(motor):
+    nodos, aristas = grafo_aleatorio(semilla=7)
+    assert PathService(motor(nodos, aristas)).find_path(10, 999) is None
@@ -0,0 +1,63 @@
+# =================================================================
+# tests/test_subida_imagen.py - Límite de tamaño de la subida de avatares
+# =================================================================
+
+import io
+
+from werkzeug.test import EnvironBuilder, run_wsgi_app
+
+from services.image_service import ImageService
+
+
+class CuerpoContado(io.RawIOBase):
+    """Cuerpo multipart enorme que cuenta los bytes que llegan a leerse"""
+
+    def __init__(self, tamano):
+        cabecera = (b'\r\n--limite\r\nContent-Disposition: form-data; name="imagen"; filename="a.png"\r\n'
+                    b'Content-Type: image/png\r\n\r\n')
+        self.partes = [cabecera, tamano]
+        self.leidos = 0
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        if self.partes and isinstance(self.partes[0], bytes):
+            datos = self.partes.pop(0)
+        elif self.partes and self.partes[0] > 0:
+            datos = (b'x' * 1023 + b'\n') * (min(len(buffer), self.partes[0]) // 1024)
+            self.partes[0] -= len(datos)
+        else:
+            return 0
+        datos = datos[:len(buffer)]
+        buffer[:len(datos)] = datos
+        self.leidos += len(datos)
+        return len(datos)
+
+
+def test_subida_por_trozos_se_corta_en_el_limite(app):
+    limite = ImageService(app.config).max_request_size
+    cuerpo = CuerpoContado(10 * app.config['MAX_FILE_SIZE'])
+    environ = EnvironBuilder('/api/personas/1/imagen', method='POST').get_environ()
+    # Sin Content-Length: el servidor entrega el cuerpo por trozos hasta el final
+    environ.pop('CONTENT_LENGTH', None)
+    environ.update({'CONTENT_TYPE': 'multipart/form-data; boundary=limite',
+                    'HTTP_TRANSFER_ENCODING': 'chunked', 'wsgi.input_terminated': True,
+                    'wsgi.input': io.BufferedReader(cuerpo)})
+    _, estado, _ = run_wsgi_app(app, environ, buffered=True)
+    assert estado.startswith('413')
+    assert cuerpo.leidos <= limite + 64 * 1024
+
+
+def test_subida_con_content_length_excesivo_es_413(app, client):
+    tamano = app.config['MAX_FILE_SIZE'] + 1024 * 1024
+    respuesta = client.post('/api/personas/1/imagen',
+                            data={'imagen': (io.BytesIO(b'x' * tamano), 'a.png')})
+    assert respuesta.status_code == 413
+
+
+def test_fichero_justo_por_encima_del_maximo_es_413(app, client):
+    # Cabe en la petición (margen multipart) pero no en MAX_FILE_SIZE
+    respuesta = client.post('/api/personas/1/imagen',
+                            data={'imagen': (io.BytesIO(b'x' * (app.config['MAX_FILE_SIZE'] + 10)), 'a.png')})
+    assert respuesta.status_code == 413
@@ -0,0 +1,104 @@
+# =================================================================
+# tests/test_unit_of_work.py - Unidad de trabajo: confirmación, deshacer y SAVEPOINTs
+# =================================================================
+
+import sqlite3
+from types import SimpleNamespace
+
+import pytest
+
+from models.database import DatabaseManager
+
+
+@pytest.fixture
+def db(tmp_path):
+    """Gestor con un ámbito de unidad controlado por la prueba"""
+    manager = DatabaseManager(str(tmp_path / 'uow.db'), busy_timeout_ms=100)
+    manager.execute_update('CREATE TABLE t (v INTEGER)')
+    manager.ambito = SimpleNamespace()
+    manager.unit_scope = lambda: manager.ambito
+    yield manager
+    manager.finish_unit(commit=False)
+    manager.close()
+
+
+def valores(db):
+    """Valores confirmados, leídos fuera de la unidad"""
+    return [row[0] for row in db.detached().execute_query('SELECT v FROM t ORDER BY v')]
+
+
+def test_la_unidad_confirma_todo_al_final(db):
+    db.execute_insert('INSERT INTO t VALUES (1)')
+    db.execute_insert('INSERT INTO t VALUES (2)')
+    assert valores(db) == []
+
+    unit = db.finish_unit(commit=True)
+    assert unit.statements == 2
+    assert valores(db) == [1, 2]
+
+
+def test_la_unidad_deshace_todo_si_falla(db):
+    db.execute_insert('INSERT INTO t VALUES (1)')
+    db.finish_unit(commit=False)
+    assert valores(db) == []
+
+
+def test_un_bloque_fallido_solo_deshace_su_savepoint(db):
+    with db.transaction() as conn:
+        conn.execute('INSERT INTO t VALUES (1)')
+    with pytest.raises(ValueError):
+        with db.transaction() as conn:
+            conn.execute('INSERT INTO t VALUES (2)')
+            raise ValueError('fallo')
+    with db.transaction() as conn:
+        conn.execute('INSERT INTO t VALUES (3)')
+        with pytest.raises(ValueError):
+            with db.transaction() as interna:
+                interna.execute('INSERT INTO t VALUES (4)')
+                raise ValueError('fallo interno')
+
+    db.finish_unit(commit=True)
+    assert valores(db) == [1, 3]
+
+
+def test_on_commit_solo_tras_confirmar(db):
+    avisos = []
+    db.execute_insert('INSERT INTO t VALUES (1)')
+    db.current_unit().on_commit(avisos.append, 'a')
+    db.current_unit().on_commit(avisos.append, 'a')
+    assert avisos == []
+    db.finish_unit(commit=True)
+    assert avisos == ['a']
+
+    db.ambito = SimpleNamespace()
+    db.execute_insert('INSERT INTO t VALUES (2)')
+    db.current_unit().on_commit(avisos.append, 'b')
+    db.finish_unit(commit=False)
+    assert avisos == ['a']
+
+
+def test_las_lecturas_no_bloquean_a_otros_escritores(db):
+    db.execute_query('SELECT * FROM t')
+    assert not db.current_unit().writing
+
+    # Otro escritor puede confirmar mientras la unidad solo ha leído
+    otro = db.detached()
+    otro.execute_insert('INSERT INTO t VALUES (1)')
+
+    # La primera escritura toma el bloqueo con una instantánea nueva
+    with db.transaction() as conn:
+        assert conn.execute('SELECT COUNT(*) FROM t').fetchone()[0] == 1
+        conn.execute('INSERT INTO t VALUES (2)')
+    assert db.current_unit().writing
+    with pytest.raises(sqlite3.OperationalError):
+        otro.execute_insert('INSERT INTO t VALUES (3)')
+
+    db.finish_unit(commit=True)
+    assert valores(db) == [1, 2]
+
+
+def test_sin_ambito_cada_sentencia_se_confirma(db):
+    db.unit_scope = None
+    db.execute_insert('INSERT INTO t VALUES (1)')
+    assert db.current_unit() is None
+    assert valores(db) == [1]